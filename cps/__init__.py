@@ -25,7 +25,7 @@ from .dep_check import dependency_check
 from .updater import Updater
 from . import config_sql
 from . import cache_buster
-from . import ub, db, magic_shelf
+from . import ub, db, magic_shelf, shelf_cache, library_changes
 
 try:
     from flask_limiter import Limiter
@@ -122,6 +122,7 @@ def create_app():
     cli_param.init()
 
     ub.init_db(cli_param.settings_path)
+    shelf_cache.check_tables(ub.session.bind)
     # pylint: disable=no-member
     encrypt_key, error = config_sql.get_encryption_key(os.path.dirname(cli_param.settings_path))
 
@@ -169,6 +170,7 @@ def create_app():
     from .calibre_init import init_calibre_db_from_config
     init_calibre_db_from_config(config, cli_param.settings_path)
     calibre_db.init_db()
+    library_changes.start_poller()
 
     updater_thread.init_updater(config, web_server)
     # Perform dry run of updater and exit afterward
@@ -247,7 +249,6 @@ def create_app():
     def _cwa_ensure_db_session():
         from flask import g, request
         from .cw_login import current_user
-        from sqlalchemy import or_
         import time
 
         if config.config_allow_reverse_proxy_header_login:
@@ -269,74 +270,11 @@ def create_app():
 
         if current_user.is_authenticated:
             try:
-                # Verify required tables exist before querying
-                from sqlalchemy import inspect
-                inspector = inspect(ub.session.bind)
-                required_tables = ['magic_shelf', 'hidden_magic_shelf_templates']
-                existing_tables = inspector.get_table_names()
-                
-                missing_tables = [t for t in required_tables if t not in existing_tables]
-                if missing_tables:
-                    log.error(f"Magic shelf tables missing from database: {missing_tables}. Run migration to create them.")
+                if shelf_cache.missing_tables:
                     g.magic_shelves_access = []
                     return
-                
-                # Get hidden items for this user (both system templates and custom shelves)
-                hidden_items = ub.session.query(
-                    ub.HiddenMagicShelfTemplate.template_key,
-                    ub.HiddenMagicShelfTemplate.shelf_id
-                ).filter(
-                    ub.HiddenMagicShelfTemplate.user_id == current_user.id
-                ).all()
-                
-                hidden_template_keys = {item.template_key for item in hidden_items if item.template_key}
-                hidden_shelf_ids = {item.shelf_id for item in hidden_items if item.shelf_id}
-                
-                # Get user's own shelves + public shelves (will filter hidden ones below)
-                g.magic_shelves_access = ub.session.query(ub.MagicShelf).filter(
-                    or_(
-                        ub.MagicShelf.is_public == 1,
-                        ub.MagicShelf.user_id == current_user.id
-                    )
-                ).all()
-                
-                log.debug(f"Found {len(g.magic_shelves_access)} total magic shelves for user {current_user.id} before filtering")
-                
-                # Filter out hidden items
-                from . import magic_shelf
-                filtered_shelves = []
-                for shelf in g.magic_shelves_access:
-                    # Skip hidden system templates
-                    if shelf.is_system and shelf.user_id == current_user.id:
-                        # Find template key for this system shelf
-                        template_key = None
-                        for key, template in magic_shelf.SYSTEM_SHELF_TEMPLATES.items():
-                            if template['name'] == shelf.name:
-                                template_key = key
-                                break
-                        
-                        # If template_key not found, this is an orphaned/deprecated system shelf
-                        if template_key is None:
-                            log.warning(f"System shelf '{shelf.name}' (ID: {shelf.id}) doesn't match any current template - may need migration")
-                            # Show it anyway - migration should clean it up on next restart
-                            filtered_shelves.append(shelf)
-                            continue
-                        
-                        # Skip if hidden
-                        if template_key in hidden_template_keys:
-                            log.debug(f"Hiding system shelf template '{template_key}' for user {current_user.id}")
-                            continue
-                    
-                    # Skip hidden custom public shelves (not owned by user)
-                    if shelf.is_public == 1 and shelf.user_id != current_user.id:
-                        if shelf.id in hidden_shelf_ids:
-                            log.debug(f"Hiding public shelf '{shelf.name}' (ID: {shelf.id}) for user {current_user.id}")
-                            continue
-                    
-                    filtered_shelves.append(shelf)
-                
-                g.magic_shelves_access = filtered_shelves
-                log.debug(f"Filtered to {len(filtered_shelves)} visible magic shelves for user {current_user.id}")
+
+                g.magic_shelves_access = shelf_cache.magic_shelves_for_user(current_user.id)
 
                 # Magic Shelf Count Caching
                 if 'magic_shelf_counts' not in session:
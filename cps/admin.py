@@ -205,6 +205,16 @@ def queue_metadata_backup():
     return json.dumps(show_text)
 
 
+@admi.route("/repair_library_permissions", methods=["POST"])
+@user_login_required
+@admin_required
+def queue_repair_library_permissions():
+    """Full recursive ownership sweep; ingest only fixes the folders it writes to"""
+    from .tasks.ops import TaskRepairLibraryPermissions
+    WorkerThread.add(current_user.name, TaskRepairLibraryPermissions(), hidden=False)
+    return json.dumps({'text': _('Success! Library permissions repair queued, please check Tasks for result')})
+
+
 @admi.route("/hardcover_auto_fetch", methods=["POST"])
 @user_login_required
 @admin_required
@@ -2579,6 +2589,7 @@ def _delete_user(content):
             ub.session.query(ub.ArchivedBook).filter(ub.ArchivedBook.user_id == content.id).delete()
             ub.session.query(ub.RemoteAuthToken).filter(ub.RemoteAuthToken.user_id == content.id).delete()
             ub.session.query(ub.User_Sessions).filter(ub.User_Sessions.user_id == content.id).delete()
+            ub.forget_user_sessions(content.id)
             ub.session.query(ub.KoboSyncedBooks).filter(ub.KoboSyncedBooks.user_id == content.id).delete()
             # delete KoboReadingState and all it's children
             kobo_entries = ub.session.query(ub.KoboReadingState).filter(ub.KoboReadingState.user_id == content.id).all()
@@ -0,0 +1,111 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Cache of the aggregated category lists (authors, series, tags, ... with book counts).
+
+Entries are keyed by list, the user's visibility (restrictions and archived books), the
+locale and the library generation from library_changes, so any change to the library
+makes them miss. Results are stored as detached copies: rows become CachedRow, mapped
+objects a SimpleNamespace of their loaded attributes.
+"""
+
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from flask_babel import get_locale
+from sqlalchemy import func
+from sqlalchemy.engine import Row
+
+from . import config, logger, ub, library_changes
+from .cw_login import current_user
+
+
+log = logger.create()
+
+MAX_ENTRIES = 512
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_generation = None
+
+
+class CachedRow:
+    """Detached copy of a result row, indexable and with its labels as attributes like Row"""
+
+    __slots__ = ("_values", "_fields")
+
+    def __init__(self, values, fields):
+        self._values = tuple(values)
+        self._fields = tuple(fields)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[self._fields.index(name)]
+        except ValueError:
+            raise AttributeError(name)
+
+
+def _detach(value):
+    if isinstance(value, Row):
+        return CachedRow((_detach(item) for item in value), value._fields)
+    if isinstance(value, list):
+        return [_detach(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_detach(item) for item in value)
+    if hasattr(value, "_sa_instance_state"):
+        return SimpleNamespace(**{key: item for key, item in vars(value).items() if not key.startswith("_")})
+    return value
+
+
+def _visibility_key():
+    archived = (ub.session.query(func.count(ub.ArchivedBook.id), func.max(ub.ArchivedBook.last_modified))
+                .filter(ub.ArchivedBook.user_id == int(current_user.id)).one())
+    return (int(current_user.id), current_user.filter_language(),
+            tuple(current_user.list_allowed_tags()), tuple(current_user.list_denied_tags()),
+            config.config_restricted_column, current_user.allowed_column_value,
+            current_user.denied_column_value, archived[0], str(archived[1]))
+
+
+def get(name, build):
+    """Result of build() for list name, from the cache when the library did not change since"""
+    global _generation
+    generation = library_changes.generation()
+    if generation is None:
+        return build()
+    try:
+        key = (name, str(get_locale()), _visibility_key())
+    except Exception as ex:
+        log.debug("Category list %s not cached: %s", name, ex)
+        return build()
+    with _lock:
+        if generation != _generation:
+            _entries.clear()
+            _generation = generation
+        if key in _entries:
+            _entries.move_to_end(key)
+            return _entries[key]
+    value = _detach(build())
+    with _lock:
+        if generation == _generation:
+            _entries[key] = value
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+    return value
+
+
+def clear():
+    with _lock:
+        _entries.clear()
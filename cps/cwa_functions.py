@@ -235,12 +235,18 @@ def _coerce_book_ids(raw_book_ids):
     return list(dict.fromkeys(book_ids))
 
 def get_ingest_queue_size():
-    """Get the number of files in the retry queue"""
+    """Get the number of files waiting in the retry queue and the ingest job queue"""
+    size = 0
     try:
         with open('/config/cwa_ingest_retry_queue', 'r') as f:
-            return len([line for line in f if line.strip()])
+            size += len([line for line in f if line.strip()])
     except (FileNotFoundError, IOError):
-        return 0
+        pass
+    try:
+        size += CWA_DB().ingest_job_counts().get('queued', 0)
+    except Exception:
+        pass
+    return size
 
 def refresh_library(app):
     with app.app_context():  # Create app context for session
@@ -646,6 +652,7 @@ def cwa_internal_schedule_epub_fixer():
 def cwa_internal_reconnect_db():
     """Enqueue a database reconnect task in the web process.
 
+    The task only reconnects when metadata.db changed, unless the payload asks for {force: true}.
     Security: Only accepts localhost callers.
     """
     remote = request.headers.get('X-Forwarded-For', request.remote_addr)
@@ -653,13 +660,38 @@ def cwa_internal_reconnect_db():
         abort(403)
 
     try:
-        task = TaskReconnectDatabase()
+        payload = request.get_json(silent=True) or {}
+        task = TaskReconnectDatabase(force=bool(payload.get('force', False)))
         WorkerThread.add(None, task, hidden=True)
         return jsonify({"status": "enqueued"}), 200
     except Exception as e:
         log.exception("Internal reconnect-db failed")
         return jsonify({"error": str(e)}), 500
 
+@csrf.exempt
+@cwa_internal.route('/cwa-internal/enrich-batch', methods=["POST"])
+def cwa_internal_enrich_batch():
+    """Enqueue the post-ingest enrichment pass for the books of one ingest batch.
+
+    Security: Only accepts localhost callers.
+    Payload JSON: {book_ids:[int]}
+    """
+    remote = request.headers.get('X-Forwarded-For', request.remote_addr)
+    if remote not in (None, '127.0.0.1', '::1'):
+        abort(403)
+
+    try:
+        data = request.get_json(force=True, silent=True) or {}
+        book_ids = _coerce_book_ids(data.get('book_ids'))
+        if not book_ids:
+            return jsonify({"status": "skipped", "reason": "no_book_ids"}), 200
+        from .tasks.enrich_batch import TaskEnrichBatch
+        WorkerThread.add(None, TaskEnrichBatch(book_ids), hidden=True)
+        return jsonify({"status": "enqueued", "books": len(book_ids)}), 200
+    except Exception as e:
+        log.exception("Internal enrich-batch failed")
+        return jsonify({"error": str(e)}), 500
+
 @csrf.exempt
 @cwa_stats.route('/cwa-scheduled/cancel', methods=["POST"])
 @login_required_if_no_ano
@@ -730,7 +762,7 @@ def set_cwa_settings():
     boolean_settings = []
     string_settings = []
     list_settings = []
-    integer_settings = ['ingest_timeout_minutes', 'ingest_stale_temp_minutes', 'ingest_stale_temp_interval', 'auto_send_delay_minutes', 'hardcover_auto_fetch_batch_size', 'hardcover_auto_fetch_schedule_hour', 'duplicate_scan_hour', 'duplicate_scan_chunk_size', 'duplicate_scan_debounce_seconds', 'duplicate_auto_resolve_cooldown_minutes', 'archived_cleanup_schedule_hour', 'cover_download_max_mb']  # Special handling for integer settings
+    integer_settings = ['ingest_timeout_minutes', 'ingest_stale_temp_minutes', 'ingest_stale_temp_interval', 'ingest_conversion_workers', 'conversion_cache_max_mb', 'auto_send_delay_minutes', 'hardcover_auto_fetch_batch_size', 'hardcover_auto_fetch_schedule_hour', 'duplicate_scan_hour', 'duplicate_scan_chunk_size', 'duplicate_scan_debounce_seconds', 'duplicate_auto_resolve_cooldown_minutes', 'archived_cleanup_schedule_hour', 'cover_download_max_mb']  # Special handling for integer settings
     float_settings = ['hardcover_auto_fetch_min_confidence', 'hardcover_auto_fetch_rate_limit']  # Special handling for float settings
     json_settings = ['metadata_provider_hierarchy', 'metadata_providers_enabled', 'duplicate_format_priority']  # Special handling for JSON settings
     skip_settings = ['auto_convert_ignored_formats', 'auto_ingest_ignored_formats', 'auto_convert_retained_formats']  # Handled through individual format checkboxes
@@ -820,6 +852,10 @@ def set_cwa_settings():
                             int_value = max(0, min(10080, int_value))  # Clamp between 0 and 10080 minutes (7 days)
                         elif setting == 'ingest_stale_temp_interval':
                             int_value = max(0, min(86400, int_value))  # Clamp between 0 and 86400 seconds (24 hours)
+                        elif setting == 'ingest_conversion_workers':
+                            int_value = max(0, min(32, int_value))  # 0 = one per CPU core
+                        elif setting == 'conversion_cache_max_mb':
+                            int_value = max(0, min(102400, int_value))  # 0 = cache disabled
                         elif setting == 'auto_send_delay_minutes':
                             int_value = max(1, min(60, int_value))  # Clamp between 1 and 60 minutes
                         elif setting == 'hardcover_auto_fetch_batch_size':
@@ -845,6 +881,10 @@ def set_cwa_settings():
                             result[setting] = cwa_db.cwa_settings.get(setting, 120)  # Default to 120 minutes
                         elif setting == 'ingest_stale_temp_interval':
                             result[setting] = cwa_db.cwa_settings.get(setting, 600)  # Default to 600 seconds
+                        elif setting == 'ingest_conversion_workers':
+                            result[setting] = cwa_db.cwa_settings.get(setting, 0)  # Default to one per CPU core
+                        elif setting == 'conversion_cache_max_mb':
+                            result[setting] = cwa_db.cwa_settings.get(setting, 1024)  # Default to 1 GB
                         elif setting == 'auto_send_delay_minutes':
                             result[setting] = cwa_db.cwa_settings.get(setting, 5)  # Default to 5 minutes
                         elif setting == 'hardcover_auto_fetch_batch_size':
@@ -864,6 +904,10 @@ def set_cwa_settings():
                         result[setting] = cwa_db.cwa_settings.get(setting, 120)  # Default to 120 minutes
                     elif setting == 'ingest_stale_temp_interval':
                         result[setting] = cwa_db.cwa_settings.get(setting, 600)  # Default to 600 seconds
+                    elif setting == 'ingest_conversion_workers':
+                        result[setting] = cwa_db.cwa_settings.get(setting, 0)  # Default to one per CPU core
+                    elif setting == 'conversion_cache_max_mb':
+                        result[setting] = cwa_db.cwa_settings.get(setting, 1024)  # Default to 1 GB
                     elif setting == 'auto_send_delay_minutes':
                         result[setting] = cwa_db.cwa_settings.get(setting, 5)  # Default to 5 minutes
                     elif setting == 'hardcover_auto_fetch_batch_size':
@@ -1002,7 +1046,7 @@ def set_cwa_settings():
                     from .progress_syncing.settings import is_koreader_sync_enabled
                     if is_koreader_sync_enabled():
                         try:
-                            with calibre_db.engine.connect() as conn:
+                            with calibre_db.writer_engine.connect() as conn:
                                 ensure_calibre_db_tables(conn)
                         except Exception as e:
                             log.error(f"Failed to initialize KOReader checksum tables: {e}")
@@ -1253,6 +1297,12 @@ def cwa_stats_show():
         library_formats = cwa_db.get_library_formats(days=days)
         conversion_stats = cwa_db.get_conversion_success_rate(days=days)
         books_added_stats = cwa_db.get_books_added_count(days=days)
+
+    # Ingest throughput and per-stage timings (for System tab)
+    if start_date and end_date:
+        ingest_performance = cwa_db.get_ingest_performance(start_date=start_date, end_date=end_date)
+    else:
+        ingest_performance = cwa_db.get_ingest_performance(days=days)
     
     # Get additional library stats (not time-dependent)
     series_completion = cwa_db.get_series_completion_stats(limit=10)
@@ -1361,6 +1411,7 @@ def cwa_stats_show():
                                 selected_user_id=user_id,
                                 cwa_stats=get_cwa_stats(),
                                 hardcover_stats=hardcover_stats,
+                                ingest_performance=ingest_performance,
                                 data_enforcement=data_enforcement, headers_enforcement=headers["enforcement"]["no_paths"], 
                                 data_enforcement_with_paths=data_enforcement_with_paths, headers_enforcement_with_paths=headers["enforcement"]["with_paths"], 
                                 data_imports=data_imports, headers_import=headers["imports"],
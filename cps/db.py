@@ -7,6 +7,7 @@
 
 import os
 import re
+import sys
 import json
 import time
 import threading
@@ -18,10 +19,10 @@ from uuid import uuid4
 
 from sqlite3 import OperationalError as sqliteOperationalError
 import sqlite3
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy import Table, Column, ForeignKey, CheckConstraint
 from sqlalchemy import String, Integer, Boolean, TIMESTAMP, Float
-from sqlalchemy.orm import relationship, sessionmaker, scoped_session, joinedload, object_session
+from sqlalchemy.orm import relationship, sessionmaker, scoped_session, joinedload, object_session, Session
 from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.ext.declarative import DeclarativeMeta
 from sqlalchemy.exc import OperationalError
@@ -30,15 +31,15 @@ try:
     from sqlalchemy.orm import declarative_base
 except ImportError:
     from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.pool import StaticPool
-from sqlalchemy.sql.expression import and_, true, false, text, func, or_
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.sql.expression import and_, true, false, text, func, or_, select, distinct, Insert, Update, Delete, TextClause
 from sqlalchemy.ext.associationproxy import association_proxy
 from .cw_login import current_user
 from flask_babel import gettext as _
 from flask_babel import get_locale
-from flask import flash
+from flask import flash, g, has_request_context
 
-from . import logger, ub, isoLanguages
+from . import logger, ub, isoLanguages, search_index, library_changes
 from .pagination import Pagination
 from .string_helper import strip_whitespaces
 
@@ -562,15 +563,149 @@ class AlchemyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
 
+# Connections to metadata.db/app.db kept per engine. Each thread (request handler,
+# worker task) checks out its own connection, so reads no longer queue on one shared handle.
+CALIBRE_DB_POOL_SIZE = max(1, int(os.environ.get('CWA_CALIBRE_DB_POOL_SIZE', '8') or 8))
+_WRITER_TIMEOUT = 30
+
+
+class _SerializedWriter:
+    """Hands the writer connection of the Calibre databases to one thread at a time.
+
+    The wait blocks, on the gevent loop too: a greenlet that yielded while waiting would let
+    the other greenlets use the session it is flushing. Gives up with an OperationalError after
+    the timeout, or at once when the calling thread already holds the writer (another greenlet
+    of the same thread could never give it back while we wait), rather than letting a write
+    run unserialized. May be released from any thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._owner = None
+
+    def acquire(self, timeout=None):
+        timeout = _WRITER_TIMEOUT if timeout is None else timeout
+        me = threading.get_ident()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._owner is not None:
+                if self._owner == me:
+                    raise OperationalError("checkout of the Calibre database writer", None, sqliteOperationalError(
+                        "the writer connection is already held by this thread, commit its transaction first"))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OperationalError("checkout of the Calibre database writer", None, sqliteOperationalError(
+                        "database is locked: timed out after {}s waiting for the writer connection"
+                        .format(timeout)))
+                self._cond.wait(remaining)
+            self._owner = me
+
+    def release(self):
+        with self._cond:
+            self._owner = None
+            self._cond.notify_all()
+
+
+class _WriterPool(QueuePool):
+    """Pool holding the one writable connection to the Calibre databases.
+
+    Callers queue in a _SerializedWriter before the checkout, so concurrent writers never
+    meet as SQLITE_BUSY, and the connection is passed on when it is checked in again.
+    """
+
+    def __init__(self, creator, **kw):
+        kw.update(pool_size=1, max_overflow=0)
+        super().__init__(creator, **kw)
+        self._writer = _SerializedWriter()
+
+    def _do_get(self):
+        self._writer.acquire()
+        try:
+            return super()._do_get()
+        except BaseException:
+            self._writer.release()
+            raise
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._writer.release()
+
+
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+
+def _is_write(clause):
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    return isinstance(clause, TextClause) and clause.text.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS)
+
+
+class _CalibreSession(Session):
+    """Reads through the read-only connection pool, writes through the writer connection.
+
+    Once a transaction wrote, its later statements go to the writer as well so they see the
+    transaction's own changes. The writer is given back when the transaction ends.
+    """
+
+    def __init__(self, *args, writer=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer = writer
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.writer is not None and (self.info.get('cwa_writing') or self._flushing or _is_write(clause)):
+            self.info['cwa_writing'] = True
+            return self.writer
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+@event.listens_for(_CalibreSession, 'after_transaction_end')
+def _end_writing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('cwa_writing', None)
+
+
+def _register_functions(dbapi_connection, get_config=None):
+    """Register the SQL functions Calibre's schema and our queries rely on.
+
+    get_config returns the config whose title regex title_sort uses, looked up on each call.
+    """
+    if get_config:
+        def _title_sort(title):
+            # calibre sort stuff
+            config = get_config()
+            if config is None:
+                return strip_whitespaces(title)
+            title_pat = re.compile(config.config_title_regex, re.IGNORECASE)
+            match = title_pat.search(title)
+            if match:
+                prep = match.group(1)
+                title = title[len(prep):] + ', ' + prep
+            return strip_whitespaces(title)
+
+    try:
+        if get_config:
+            dbapi_connection.create_function("title_sort", 1, _title_sort)
+        dbapi_connection.create_function('uuid4', 0, lambda: str(uuid4()))
+        dbapi_connection.create_function("lower", 1, lcase)
+    except sqliteOperationalError:
+        pass
+
+
 class CalibreDB:
     _init = False
     engine = None
+    # The one writable connection; sessions route their writes to it (see _CalibreSession)
+    writer_engine = None
     config = None
     session_factory = None
     # This is a WeakSet so that references here don't keep other CalibreDB
     # instances alive once they reach the end of their respective scopes
     instances = WeakSet()
     _reconnect_lock = threading.RLock()  # Reentrant lock to prevent concurrent reconnect operations
+    # (path, device, inode, schema cookie) of metadata.db as of the last setup_db
+    _library_stamp = None
 
     def __init__(self, expire_on_commit=True, init=False):
         """ Initialize a new CalibreDB session
@@ -762,6 +897,36 @@ class CalibreDB:
     def update_config(cls, config):
         cls.config = config
 
+    @classmethod
+    def _create_engine(cls, dbpath, app_db_path, writer=False):
+        """Engine whose connections carry the ATTACHes and SQL functions.
+
+        By default a pool of read-only (query_only) per-thread connections; with writer=True the
+        single writable connection, handed to one caller at a time by _WriterPool.
+        """
+        pool_args = {'poolclass': _WriterPool} if writer else {
+            'poolclass': QueuePool,
+            'pool_size': CALIBRE_DB_POOL_SIZE,
+            'max_overflow': CALIBRE_DB_POOL_SIZE * 2,
+        }
+        engine = create_engine('sqlite://',
+                               echo=False,
+                               isolation_level="SERIALIZABLE",
+                               connect_args={'check_same_thread': False, 'timeout': 30},
+                               pool_timeout=30,
+                               **pool_args)
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, _connection_record):
+            dbapi_connection.execute("attach database ? as calibre", (dbpath,))
+            dbapi_connection.execute("attach database ? as app_settings", (app_db_path,))
+            search_index.attach(dbapi_connection, app_db_path)
+            _register_functions(dbapi_connection, lambda: cls.config)
+            if not writer:
+                dbapi_connection.execute("PRAGMA query_only = ON")
+
+        return engine
+
     @classmethod
     def setup_db(cls, config_calibre_dir, app_db_path):
         # Wrap entire method in lock to ensure atomic setup operation
@@ -787,14 +952,9 @@ class CalibreDB:
             db_writable = os.access(dbpath, os.W_OK)
 
             try:
-                cls.engine = create_engine('sqlite://',
-                                           echo=False,
-                                           isolation_level="SERIALIZABLE",
-                                           connect_args={'check_same_thread': False, 'timeout': 30},
-                                           poolclass=StaticPool)
-                with cls.engine.begin() as connection:
-                    connection.execute(text("attach database '{}' as calibre;".format(dbpath)))
-                    connection.execute(text("attach database '{}' as app_settings;".format(app_db_path)))
+                cls.engine = cls._create_engine(dbpath, app_db_path)
+                cls.writer_engine = cls._create_engine(dbpath, app_db_path, writer=True)
+                with cls.writer_engine.begin() as connection:
                     # Try enabling WAL to improve concurrency unless running on a network share
                     # Controlled by env var NETWORK_SHARE_MODE (default False)
                     try:
@@ -817,42 +977,54 @@ class CalibreDB:
                         cls.config.invalidate(ex)
                 return None
 
-            if cls.config:
-                cls.config.db_configured = True
-
-            if not cc_classes:
-                try:
-                    cc = conn.execute(text("SELECT id, datatype FROM custom_columns"))
-                    cls.setup_db_cc_classes(cc)
-                except OperationalError as e:
-                    log.error_or_exception(e)
-                    if cls.config:
-                        if hasattr(cls.config, "invalidate"):
-                            cls.config.invalidate(e)
-                    return None
-
+            # The setup connection goes back to the pool once the schema checks are done
             try:
-                cols = conn.execute(text("PRAGMA calibre.table_info(books)")).fetchall()
-                Books._has_isbn_column = any(row[1] == "isbn" for row in cols)
-            except Exception:
-                Books._has_isbn_column = False
+                if cls.config:
+                    cls.config.db_configured = True
 
-            cls.session_factory = scoped_session(sessionmaker(autocommit=False,
-                                                              autoflush=True,
-                                                              bind=cls.engine, future=True))
-            for inst in cls.instances:
-                inst.init_session()
-
-            # Ensure progress syncing tables exist in metadata.db (book checksums)
-            from .progress_syncing.models import ensure_calibre_db_tables
-            from .progress_syncing.settings import is_koreader_sync_enabled
-            if (
-                db_writable
-                and not os.getenv('NETWORK_SHARE_MODE', 'False').lower() in ('1', 'true', 'yes', 'on')
-                and is_koreader_sync_enabled()
-            ):
-                ensure_calibre_db_tables(conn)
+                if not cc_classes:
+                    try:
+                        cc = conn.execute(text("SELECT id, datatype FROM custom_columns"))
+                        cls.setup_db_cc_classes(cc)
+                    except OperationalError as e:
+                        log.error_or_exception(e)
+                        if cls.config:
+                            if hasattr(cls.config, "invalidate"):
+                                cls.config.invalidate(e)
+                        return None
+
+                try:
+                    cols = conn.execute(text("PRAGMA calibre.table_info(books)")).fetchall()
+                    Books._has_isbn_column = any(row[1] == "isbn" for row in cols)
+                except Exception:
+                    Books._has_isbn_column = False
 
+                cls.session_factory = scoped_session(sessionmaker(class_=_CalibreSession,
+                                                                  autocommit=False,
+                                                                  autoflush=True,
+                                                                  bind=cls.engine,
+                                                                  writer=cls.writer_engine,
+                                                                  future=True))
+                for inst in cls.instances:
+                    inst.init_session()
+
+                # Ensure progress syncing tables exist in metadata.db (book checksums)
+                from .progress_syncing.models import ensure_calibre_db_tables
+                from .progress_syncing.settings import is_koreader_sync_enabled
+                if (
+                    db_writable
+                    and not os.getenv('NETWORK_SHARE_MODE', 'False').lower() in ('1', 'true', 'yes', 'on')
+                    and is_koreader_sync_enabled()
+                ):
+                    with cls.writer_engine.connect() as writer_conn:
+                        ensure_calibre_db_tables(writer_conn)
+            finally:
+                conn.close()
+
+            # The sidecar tables are created once per setup, the change poller follows the new engines
+            search_index.ensure_schema(cls.writer_engine)
+            library_changes.watch(cls.engine, cls.writer_engine)
+            cls._library_stamp = cls._read_library_stamp(config_calibre_dir)
             cls._init = True
         # End of with cls._reconnect_lock
 
@@ -941,19 +1113,20 @@ class CalibreDB:
     # Language and content filters for displaying in the UI
     def common_filters(self, allow_show_archived=False, return_all_languages=False, viewing_tag_id=None):
         if not allow_show_archived:
-            archived_books = (ub.session.query(ub.ArchivedBook)
-                              .filter(ub.ArchivedBook.user_id==int(current_user.id))
-                              .filter(ub.ArchivedBook.is_archived==True)
-                              .all())
-            archived_book_ids = [archived_book.book_id for archived_book in archived_books]
-            archived_filter = Books.id.notin_(archived_book_ids)
+            archived_filter = Books.id.notin_(select(ub.ArchivedBook.book_id)
+                                              .where(ub.ArchivedBook.user_id == int(current_user.id),
+                                                     ub.ArchivedBook.is_archived == True,
+                                                     ub.ArchivedBook.book_id.isnot(None))
+                                              .correlate(None))
         else:
             archived_filter = true()
 
         if current_user.filter_language() == "all" or return_all_languages:
+            filter_language = "all"
             lang_filter = true()
         else:
-            lang_filter = Books.languages.any(Languages.lang_code == current_user.filter_language())
+            filter_language = current_user.filter_language()
+            lang_filter = Books.languages.any(Languages.lang_code == filter_language)
         negtags_list = current_user.list_denied_tags()
         postags_list = current_user.list_allowed_tags()
         neg_content_tags_filter = false() if negtags_list == [''] else Books.tags.any(Tags.name.in_(negtags_list))
@@ -967,6 +1140,7 @@ class CalibreDB:
                 postags_list = postags_list + [viewing_tag.name]
         
         pos_content_tags_filter = true() if postags_list == [''] else Books.tags.any(Tags.name.in_(postags_list))
+        pos_cc_list = neg_cc_list = ['']
         if self.config.config_restricted_column:
             try:
                 pos_cc_list = current_user.allowed_column_value.split(',')
@@ -980,6 +1154,7 @@ class CalibreDB:
             except (KeyError, AttributeError, IndexError):
                 pos_content_cc_filter = false()
                 neg_content_cc_filter = true()
+                pos_cc_list = neg_cc_list = None
                 log.error("Custom Column No.{} does not exist in calibre database".format(
                     self.config.config_restricted_column))
                 flash(_("Custom Column No.%(column)d does not exist in calibre database",
@@ -989,8 +1164,51 @@ class CalibreDB:
         else:
             pos_content_cc_filter = true()
             neg_content_cc_filter = false()
-        return and_(lang_filter, pos_content_tags_filter, ~neg_content_tags_filter,
-                    pos_content_cc_filter, ~neg_content_cc_filter, archived_filter)
+        visibility_filter = and_(lang_filter, pos_content_tags_filter, ~neg_content_tags_filter,
+                                 pos_content_cc_filter, ~neg_content_cc_filter)
+        # A missing restricted column (lists set to None) hides everything, nothing to store then
+        if pos_cc_list is not None and (filter_language != "all" or postags_list != [''] or negtags_list != ['']
+                                        or pos_cc_list != [''] or neg_cc_list != ['']):
+            signature = [filter_language, sorted(postags_list), sorted(negtags_list),
+                         self.config.config_restricted_column or 0, sorted(pos_cc_list), sorted(neg_cc_list)]
+            visibility_filter = self._visible_books_filter(signature, visibility_filter)
+        return and_(visibility_filter, archived_filter)
+
+    def _library_fingerprint(self):
+        """Cheap summary of the books, tags, languages and restricted column, once per request.
+
+        Includes the library_changes generation, so renamed tags and values are noticed too.
+        """
+        if has_request_context() and getattr(g, 'cwa_library_fingerprint', None) is not None:
+            return g.cwa_library_fingerprint
+        statement = ("SELECT (SELECT count(*) FROM calibre.books), (SELECT max(last_modified) FROM calibre.books), "
+                     "(SELECT count(*) FROM calibre.books_tags_link), (SELECT total(length(name)) FROM calibre.tags), "
+                     "(SELECT count(*) FROM calibre.books_languages_link), "
+                     "(SELECT coalesce(max(generation), 0) FROM search_index.library_changes)")
+        restricted_column = self.config.config_restricted_column
+        if restricted_column:
+            statement += (", (SELECT count(*) FROM calibre.books_custom_column_{0}_link), "
+                          "(SELECT total(length(value)) FROM calibre.custom_column_{0})").format(int(restricted_column))
+        try:
+            with self.engine.connect() as conn:
+                fingerprint = json.dumps(list(conn.exec_driver_sql(statement).one()), default=str)
+        except Exception as ex:
+            log.debug("Library fingerprint not available: %s", ex)
+            return None
+        if has_request_context():
+            g.cwa_library_fingerprint = fingerprint
+        return fingerprint
+
+    def _visible_books_filter(self, signature, visibility_filter):
+        """Replace the restriction filter by a join on its stored set of visible books where possible"""
+        fingerprint = self._library_fingerprint()
+        if fingerprint is None:
+            return visibility_filter
+        set_key = search_index.visible_set_key(signature)
+        if not search_index.materialize_visible_books(self.engine, self.writer_engine, set_key, fingerprint,
+                                                      select(Books.id).where(visibility_filter)):
+            return visibility_filter
+        return Books.id.in_(search_index.visible_book_ids(set_key))
 
     def generate_linked_query(self, config_read_column, database):
         # Safety: session can be briefly None during DB reconnects
@@ -1156,7 +1374,7 @@ class CalibreDB:
         self.create_functions()
         # self.session.connection().connection.connection.create_function("lower", 1, lcase)
         entries = self.session.query(database).filter(tag_filter). \
-            filter(func.lower(database.name).ilike("%" + query + "%")).all()
+            filter(self.name_filter(database, query)).all()
         # json_dumps = json.dumps([dict(name=escape(r.name.replace(*replace))) for r in entries])
         json_dumps = json.dumps([dict(name=r.name.replace(*replace)) for r in entries])
         return json_dumps
@@ -1168,11 +1386,17 @@ class CalibreDB:
         q = list()
         author_terms = re.split(r'\s*&\s*', authr)
         for author_term in author_terms:
-            q.append(Books.authors.any(func.lower(Authors.name).ilike("%" + author_term + "%")))
+            q.append(Books.authors.any(self.name_filter(Authors, author_term)))
 
         return self.session.query(Books) \
             .filter(and_(Books.authors.any(and_(*q)), func.lower(Books.title).ilike("%" + title + "%"))).first()
 
+    def name_filter(self, database, term):
+        """Filter for Authors, Tags, Series or Publishers rows whose name contains term"""
+        if search_index.refresh_names(self.engine, self.writer_engine, normalize_name):
+            return database.id.in_(search_index.matching_name_ids(database.__tablename__, normalize_name(term)))
+        return func.lower(database.name).ilike("%" + term + "%")
+
     def search_query(self, term, config, *join):
         self.ensure_session()
         strip_whitespaces(term).lower()
@@ -1193,6 +1417,13 @@ class CalibreDB:
             query = query.outerjoin(join[0])
 
         cc = self.get_cc_columns(config, filter_config_custom_read=True)
+        # Eagerly load the data relationship to prevent session errors
+        query = query.options(joinedload(Books.data)).filter(self.common_filters(True))
+        match_query = search_index.build_match_query(term, lcase)
+        if match_query and search_index.refresh(self.engine, self.writer_engine,
+                                                [(c.id, c.datatype) for c in cc]):
+            return query.filter(Books.id.in_(search_index.matching_book_ids(match_query)))
+
         filter_expression = [Books.tags.any(func.lower(Tags.name).ilike("%" + term + "%")),
                              Books.series.any(func.lower(Series.name).ilike("%" + term + "%")),
                              Books.authors.any(and_(*q)),
@@ -1204,9 +1435,7 @@ class CalibreDB:
                     getattr(Books,
                             'custom_column_' + str(c.id)).any(
                         func.lower(cc_classes[c.id].value).ilike("%" + term + "%")))
-        # Eagerly load the data relationship to prevent session errors
-        query = query.options(joinedload(Books.data))
-        return query.filter(self.common_filters(True)).filter(or_(*filter_expression))
+        return query.filter(or_(*filter_expression))
 
     def get_cc_columns(self, config, filter_config_custom_read=False):
         self.ensure_session()
@@ -1230,18 +1459,17 @@ class CalibreDB:
         self.ensure_session()
         order = order[0] if order else [Books.sort]
         pagination = None
-        result = self.search_query(term, config, *join).order_by(*order).all()
-        result_count = len(result)
+        query = self.search_query(term, config, *join).order_by(*order)
+        # Joined tags, authors or series can repeat a book, so the count and the stored ids are distinct.
+        # All hit ids are kept for adding the search result to a shelf
+        result_count = query.with_entities(func.count(distinct(Books.id))).order_by(None).scalar()
+        ub.store_ids(query.with_entities(Books.id).distinct())
         if offset is not None and limit is not None:
             offset = int(offset)
-            limit_all = offset + int(limit)
             pagination = Pagination((offset / (int(limit)) + 1), limit, result_count)
-        else:
-            offset = 0
-            limit_all = result_count
+            query = query.offset(offset).limit(int(limit))
 
-        ub.store_combo_ids(result)
-        entries = self.order_authors(result[offset:limit_all], list_return=True, combined=True)
+        entries = self.order_authors(query.all(), list_return=True, combined=True)
 
         return entries, result_count, pagination
 
@@ -1286,30 +1514,14 @@ class CalibreDB:
             log.error("create_functions: Cannot create functions because session is None")
             return
         
-        # user defined sort function for calibre databases (Series, etc.)
-        if config:
-            def _title_sort(title):
-                # calibre sort stuff
-                title_pat = re.compile(config.config_title_regex, re.IGNORECASE)
-                match = title_pat.search(title)
-                if match:
-                    prep = match.group(1)
-                    title = title[len(prep):] + ', ' + prep
-                return strip_whitespaces(title)
-
         try:
             # sqlalchemy <1.4.24 and sqlalchemy 2.0
             conn = self.session.connection().connection.driver_connection
         except AttributeError:
             # sqlalchemy >1.4.24
             conn = self.session.connection().connection.connection
-        try:
-            if config:
-                conn.create_function("title_sort", 1, _title_sort)
-            conn.create_function('uuid4', 0, lambda: str(uuid4()))
-            conn.create_function("lower", 1, lcase)
-        except sqliteOperationalError:
-            pass
+        # Pooled connections already have these from connect, kept for callers passing their own config
+        _register_functions(conn, (lambda: config) if config else None)
 
     @classmethod
     def dispose(cls):
@@ -1330,6 +1542,11 @@ class CalibreDB:
                         except Exception:
                             pass
 
+            library_changes.watch(None, None)
+            if cls.writer_engine is not None:
+                cls.writer_engine.dispose()
+                cls.writer_engine = None
+
             for attr in list(Books.__dict__.keys()):
                 if attr.startswith("custom_column_"):
                     setattr(Books, attr, None)
@@ -1344,6 +1561,49 @@ class CalibreDB:
                 if table is not None:
                     Base.metadata.remove(table)
 
+    @classmethod
+    def _read_library_stamp(cls, config_calibre_dir):
+        """What a reconnect depends on: the metadata.db file itself, its schema and the library it holds.
+
+        Row changes are left out on purpose, every request's session sees them without a reconnect.
+        Schema and library uuid are read from the file at the path, not through the pool, which
+        still has the old file open after a replacement. The uuid catches a replacement that got
+        the old inode number back; a copy of the same library restored that way goes unnoticed.
+        """
+        dbpath = os.path.abspath(os.path.join(config_calibre_dir or "", "metadata.db"))
+        try:
+            stat = os.stat(dbpath)
+        except OSError:
+            return None
+        schema_version = library_uuid = None
+        try:
+            conn = sqlite3.connect("file:{}?mode=ro".format(quote(dbpath)), uri=True)
+            try:
+                schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+                library_uuid = conn.execute("SELECT uuid FROM library_id").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as ex:
+            log.debug("Cannot read schema version and library id of %s: %s", dbpath, ex)
+        if library_uuid is not None:
+            library_uuid = library_uuid[0]
+        return dbpath, stat.st_dev, stat.st_ino, schema_version, library_uuid
+
+    def library_changed(self, config):
+        """True when metadata.db was replaced, moved or had its schema changed since the last setup_db"""
+        if not self._init or self.engine is None or self._library_stamp is None:
+            return True
+        return self._read_library_stamp(config.config_calibre_dir) != self._library_stamp
+
+    def reconnect_db_if_changed(self, config, app_db_path):
+        """reconnect_db only when library_changed, returns whether it reconnected"""
+        with self._reconnect_lock:
+            if not self.library_changed(config):
+                return False
+            log.info("Calibre library changed, reconnecting database")
+            self.reconnect_db(config, app_db_path)
+            return True
+
     def reconnect_db(self, config, app_db_path):
         # Use lock to ensure atomic reconnect operation
         with self._reconnect_lock:
@@ -1376,6 +1636,10 @@ def lcase(s):
         return s.lower()
 
 
+def normalize_name(s):
+    return " ".join(lcase(s or "").split())
+
+
 class Category:
     name = None
     id = None
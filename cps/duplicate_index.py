@@ -219,7 +219,11 @@ def _chunks(values, size):
         yield values[start:start + size]
 
 
-def upsert_book_keys(book_ids: Iterable[int], settings):
+def upsert_book_keys(book_ids: Iterable[int], settings, books=None):
+    """Index duplicate keys for the given books in one cwa.db transaction.
+
+    books may hold the already loaded Books rows (see _book_query) to avoid loading them again.
+    """
     book_ids = {int(book_id) for book_id in book_ids if book_id is not None}
     if len(book_ids) > MAX_INCREMENTAL_BOOK_IDS:
         raise ValueError(f"Incremental duplicate index update exceeds {MAX_INCREMENTAL_BOOK_IDS} books")
@@ -227,7 +231,10 @@ def upsert_book_keys(book_ids: Iterable[int], settings):
         return {"updated": 0, "missing": 0, "missing_ids": [], "fingerprint": get_criteria_fingerprint(settings)}
 
     fingerprint = get_criteria_fingerprint(settings)
-    books = _load_books_by_ids(book_ids)
+    if books is None:
+        books = _load_books_by_ids(book_ids)
+    else:
+        books = [book for book in books if int(book.id) in book_ids]
     loaded_book_ids = {int(book.id) for book in books}
     cwa_db = CWA_DB()
     updated = 0
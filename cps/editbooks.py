@@ -147,6 +147,7 @@ def upload():
 
                 # Now that manifest is written, perform the atomic rename to trigger ingest
                 os.replace(tmp_path, final_path)
+                _queue_upload_for_ingest(final_path)
 
                 # Queue a task entry for UX feedback
                 upload_text = N_("Upload done, processing, please wait...")
@@ -176,6 +177,7 @@ def upload():
                 final_path = _get_ingest_path(requested_file, prefix_parts=["new", current_user.id])
                 tmp_path, final_path = _save_to_ingest_atomic_rename(requested_file, final_path)
                 os.replace(tmp_path, final_path) # No manifest needed, just rename
+                _queue_upload_for_ingest(final_path)
                 upload_text = N_("Upload done, processing, please wait...")
                 WorkerThread.add(current_user.name, TaskUpload(upload_text, escape(requested_file.filename)))
             except Exception as e:
@@ -409,6 +411,28 @@ def _get_ingest_path(uploaded_file, prefix_parts=None):
     final_path = os.path.join(ingest_dir, final_name)
     return final_path
 
+# Web uploads run ahead of files dropped into the ingest folder
+INGEST_UPLOAD_PRIORITY = 10
+
+
+def _queue_upload_for_ingest(final_path):
+    """Put an uploaded file at the front of the ingest daemon's job queue.
+
+    Only done while the daemon is running; otherwise the folder watcher picks the
+    file up as before.
+    """
+    port_file = os.environ.get("CWA_INGEST_DAEMON_PORT_FILE", "/tmp/cwa_ingest_daemon.port")
+    if not os.path.exists(port_file):
+        return
+    try:
+        if '/app/calibre-web-automated/scripts/' not in sys.path:
+            sys.path.insert(1, '/app/calibre-web-automated/scripts/')
+        from cwa_db import CWA_DB
+        CWA_DB().ingest_job_enqueue(final_path, priority=INGEST_UPLOAD_PRIORITY, source='upload')
+    except Exception as e:
+        log.warning("Could not queue upload %s for ingest, leaving it to the folder watcher: %s", final_path, e)
+
+
 # Helper to save file to a temporary path, then atomically rename to final path
 def _save_to_ingest_atomic_rename(uploaded_file, final_path):
     tmp_path = final_path + ".uploading"
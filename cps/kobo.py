@@ -180,7 +180,7 @@ def HandleSyncRequest():
     new_archived_last_modified = datetime.min
     sync_results = []
 
-    calibre_db.reconnect_db(config, ub.app_DB_path)
+    calibre_db.reconnect_db_if_changed(config, ub.app_DB_path)
 
 
     # Two-Way-Sync Deletion Logic
@@ -0,0 +1,311 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Change feed of the Calibre library, kept in the search index sidecar.
+
+poll() compares ``calibre.books`` with a mirror of (id, last_modified) and appends one
+row per added, modified or deleted book to ``library_changes``. The author, tag, series
+and publisher names are mirrored too: a rename reports the books linked to the name as
+modified, and any change of these names adds a KIND_NAMES row. The row id is the
+library generation, it only ever grows. Consumers remember the generation they built
+their state for and ask changes_since() what happened after it, or subscribe() to be
+called with the changes each poll finds.
+
+Polls run in a background thread started with the app, on the engines CalibreDB.setup_db
+hands to watch(); request paths only read the generation of the last poll. Every
+POLL_INTERVAL seconds the thread reads ``PRAGMA data_version`` on a read-only connection it
+keeps, and only when metadata.db was written since does it compare the library with the
+mirror. The writer connection is taken only when there are rows to record.
+
+metadata.db is shared with Calibre and calibredb, so changes are found by polling
+instead of triggers written into Calibre's database.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from . import logger, search_index
+
+
+log = logger.create()
+
+KIND_ADDED = "added"
+KIND_MODIFIED = "modified"
+KIND_DELETED = "deleted"
+# Written when the history starts over (first poll, other library); book_id is NULL
+KIND_RESET = "reset"
+# Written when author, tag, series or publisher names were added, renamed or removed; book_id is NULL
+KIND_NAMES = "names"
+
+# Name table -> (link table, link column)
+_NAME_LINKS = {
+    "authors": ("books_authors_link", "author"),
+    "tags": ("books_tags_link", "tag"),
+    "series": ("books_series_link", "series"),
+    "publishers": ("books_publishers_link", "publisher"),
+}
+
+RETAINED_CHANGES = 50000
+POLL_INTERVAL = 2.0
+
+LibraryChange = namedtuple("LibraryChange", ["generation", "book_id", "kind", "changed_at"])
+
+_lock = threading.Lock()
+_subscribers = []
+_generation = None
+_poller_lock = threading.Lock()
+_poller = None
+# (read-only engine, writer engine) the poller works on
+_engines = None
+
+
+def subscribe(callback):
+    """Call callback(changes) with the LibraryChange list of every poll that finds changes"""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def _state(conn):
+    return dict(conn.exec_driver_sql(
+        "SELECT key, value FROM search_index.index_state WHERE key LIKE 'changes_%'").fetchall())
+
+
+def _write_state(conn, state):
+    conn.exec_driver_sql(
+        "INSERT OR REPLACE INTO search_index.index_state (key, value) VALUES (?, ?)",
+        [(key, str(value)) for key, value in state.items()])
+
+
+def _record(conn, rows, changed_at):
+    conn.exec_driver_sql(
+        "INSERT INTO search_index.library_changes (book_id, kind, changed_at) VALUES (?, ?, ?)",
+        [(book_id, kind, changed_at) for book_id, kind in rows])
+
+
+def _has_changes(conn):
+    """Whether _poll would record anything, checked without writing"""
+    library = conn.exec_driver_sql("SELECT uuid FROM calibre.library_id").scalar() or ""
+    if _state(conn).get("changes_library") != library:
+        return True
+    checks = ["SELECT 1 FROM calibre.books b LEFT JOIN search_index.library_books m ON m.book_id = b.id "
+              "WHERE m.book_id IS NULL OR m.last_modified IS NOT b.last_modified",
+              "SELECT 1 FROM search_index.library_books WHERE book_id NOT IN (SELECT id FROM calibre.books)"]
+    for kind in _NAME_LINKS:
+        checks.append("SELECT 1 FROM calibre.{0} c LEFT JOIN search_index.library_names m "
+                      "ON m.kind = '{0}' AND m.id = c.id WHERE m.name IS NOT c.name".format(kind))
+        checks.append("SELECT 1 FROM search_index.library_names WHERE kind = '{0}' "
+                      "AND id NOT IN (SELECT id FROM calibre.{0})".format(kind))
+    return conn.exec_driver_sql(" UNION ALL ".join(checks) + " LIMIT 1").first() is not None
+
+
+def _diff_names(conn):
+    """Apply the differences between the name tables and their mirror.
+
+    Returns the ids of the books linked to renamed names, and whether any name changed at all.
+    """
+    books = set()
+    names_changed = False
+    for kind, (link_table, link_column) in _NAME_LINKS.items():
+        changed = conn.exec_driver_sql(
+            "SELECT c.id, c.name, m.id IS NOT NULL FROM calibre.{0} c LEFT JOIN search_index.library_names m "
+            "ON m.kind = ? AND m.id = c.id WHERE m.name IS NOT c.name".format(kind), (kind,)).fetchall()
+        removed = conn.exec_driver_sql(
+            "DELETE FROM search_index.library_names WHERE kind = ? AND id NOT IN (SELECT id FROM calibre.{0})"
+            .format(kind), (kind,)).rowcount
+        if changed:
+            conn.exec_driver_sql(
+                "INSERT OR REPLACE INTO search_index.library_names (kind, id, name) VALUES (?, ?, ?)",
+                [(kind, name_id, name) for name_id, name, __ in changed])
+            renamed = [name_id for name_id, __, mirrored in changed if mirrored]
+            for start in range(0, len(renamed), search_index.REINDEX_CHUNK_SIZE):
+                chunk = renamed[start:start + search_index.REINDEX_CHUNK_SIZE]
+                books.update(row[0] for row in conn.exec_driver_sql(
+                    "SELECT book FROM calibre.{} WHERE {} IN ({})".format(
+                        link_table, link_column, ",".join("?" * len(chunk))), tuple(chunk)).fetchall())
+        names_changed = names_changed or bool(changed) or removed > 0
+    return books, names_changed
+
+
+def _mirror_names(conn):
+    conn.exec_driver_sql("DELETE FROM search_index.library_names")
+    for kind in _NAME_LINKS:
+        conn.exec_driver_sql("INSERT INTO search_index.library_names (kind, id, name) "
+                             "SELECT ?, id, name FROM calibre.{}".format(kind), (kind,))
+
+
+def _diff(conn, changed_at):
+    """Apply the differences between calibre.books and the mirror, returns the (book_id, kind) recorded"""
+    added = conn.exec_driver_sql(
+        "SELECT b.id, b.last_modified FROM calibre.books b "
+        "LEFT JOIN search_index.library_books m ON m.book_id = b.id WHERE m.book_id IS NULL").fetchall()
+    modified = conn.exec_driver_sql(
+        "SELECT b.id, b.last_modified FROM calibre.books b "
+        "JOIN search_index.library_books m ON m.book_id = b.id "
+        "WHERE m.last_modified IS NOT b.last_modified").fetchall()
+    deleted = [row[0] for row in conn.exec_driver_sql(
+        "SELECT book_id FROM search_index.library_books "
+        "WHERE book_id NOT IN (SELECT id FROM calibre.books)").fetchall()]
+
+    if added or modified:
+        conn.exec_driver_sql(
+            "INSERT OR REPLACE INTO search_index.library_books (book_id, last_modified) VALUES (?, ?)",
+            [tuple(row) for row in added + modified])
+    if deleted:
+        conn.exec_driver_sql(
+            "DELETE FROM search_index.library_books WHERE book_id IN ({})".format(",".join("?" * len(deleted))),
+            tuple(deleted))
+    rows = ([(row[0], KIND_ADDED) for row in added] + [(row[0], KIND_MODIFIED) for row in modified]
+            + [(book_id, KIND_DELETED) for book_id in deleted])
+    renamed_books, names_changed = _diff_names(conn)
+    recorded = {book_id for book_id, __ in rows}
+    rows += [(book_id, KIND_MODIFIED) for book_id in sorted(renamed_books - recorded)]
+    if names_changed:
+        rows.append((None, KIND_NAMES))
+    if rows:
+        _record(conn, rows, changed_at)
+    return rows
+
+
+def _poll(conn):
+    """One poll on conn, returns (generation, new LibraryChange list)"""
+    state = _state(conn)
+    library = conn.exec_driver_sql("SELECT uuid FROM calibre.library_id").scalar() or ""
+    generation = search_index.library_generation(conn)
+    changed_at = datetime.now(timezone.utc).isoformat()
+    if state.get("changes_library") != library:
+        # New history: fill the mirror without reporting every book as added
+        conn.exec_driver_sql("DELETE FROM search_index.library_books")
+        conn.exec_driver_sql("INSERT INTO search_index.library_books (book_id, last_modified) "
+                             "SELECT id, last_modified FROM calibre.books")
+        _mirror_names(conn)
+        _record(conn, [(None, KIND_RESET)], changed_at)
+        generation = search_index.library_generation(conn)
+        _write_state(conn, {"changes_library": library, "changes_reset_generation": generation})
+        return generation, [LibraryChange(generation, None, KIND_RESET, changed_at)]
+
+    first = generation + 1
+    _diff(conn, changed_at)
+    generation = search_index.library_generation(conn)
+    if generation > RETAINED_CHANGES:
+        trimmed = generation - RETAINED_CHANGES
+        if trimmed > int(state.get("changes_trimmed_generation") or 0):
+            conn.exec_driver_sql("DELETE FROM search_index.library_changes WHERE generation <= ?", (trimmed,))
+            _write_state(conn, {"changes_trimmed_generation": trimmed})
+    changes = [LibraryChange(*row) for row in conn.exec_driver_sql(
+        "SELECT generation, book_id, kind, changed_at FROM search_index.library_changes "
+        "WHERE generation >= ? ORDER BY generation", (first,)).fetchall()]
+    return generation, changes
+
+
+def poll(engine, writer_engine):
+    """Record what changed in the library since the last poll, returns the current generation.
+
+    The comparison runs on a connection of the read-only engine, the writer is only taken when
+    it found something. None when the sidecar is unusable.
+    """
+    global _generation
+    if not search_index.ensure_schema(writer_engine):
+        return None
+    changes = []
+    with _lock:
+        try:
+            with engine.connect() as conn:
+                pending = _has_changes(conn)
+                generation = search_index.library_generation(conn)
+            if pending:
+                with writer_engine.connect() as conn:
+                    generation, changes = _poll(conn)
+                    conn.commit()
+        except Exception as ex:
+            log.error("Library change poll failed: %s", ex)
+            return None
+        _generation = generation
+    if changes:
+        log.debug("Library generation %s, %s changes", generation, len(changes))
+        for callback in list(_subscribers):
+            try:
+                callback(changes)
+            except Exception as ex:
+                log.error("Library change subscriber %r failed: %s", callback, ex)
+    return generation
+
+
+def _poll_loop():
+    watched = conn = data_version = None
+    while True:
+        engines = _engines
+        try:
+            if engines is not watched:
+                if conn is not None:
+                    conn.close()
+                conn = data_version = None
+                watched = engines
+            if engines is not None:
+                if conn is None:
+                    conn = engines[0].connect()
+                # Moves with every commit to metadata.db by another connection, our writer included
+                version = conn.exec_driver_sql("PRAGMA calibre.data_version").scalar()
+                conn.rollback()
+                if version != data_version and poll(*engines) is not None:
+                    data_version = version
+        except Exception as ex:
+            log.error("Library change poller failed: %s", ex)
+            if conn is not None:
+                conn.close()
+            conn = None
+        time.sleep(POLL_INTERVAL)
+
+
+def watch(engine, writer_engine):
+    """Point the poller at the engines of a (re)connected library, None for both when disconnected"""
+    global _engines, _generation
+    with _poller_lock:
+        _engines = (engine, writer_engine) if engine is not None and writer_engine is not None else None
+        _generation = None
+
+
+def start_poller():
+    """Start the background thread polling the engines given to watch()"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = threading.Thread(target=_poll_loop, name="library-changes", daemon=True)
+            _poller.start()
+
+
+def generation():
+    """Library generation of the last background poll, None until the first poll finished"""
+    return _generation
+
+
+def changes_since(engine, since, limit=None):
+    """LibraryChange list after generation since, oldest first, as far as the poller recorded them.
+
+    None when the history does not reach back that far (library switched, trimmed or unusable sidecar);
+    the caller has to rebuild from scratch then.
+    """
+    try:
+        with engine.connect() as conn:
+            state = _state(conn)
+            oldest = max(int(state.get("changes_reset_generation") or 0),
+                         int(state.get("changes_trimmed_generation") or 0))
+            if since is None or since < oldest:
+                return None
+            statement = ("SELECT generation, book_id, kind, changed_at FROM search_index.library_changes "
+                         "WHERE generation > ? ORDER BY generation")
+            if limit:
+                statement += " LIMIT {:d}".format(int(limit))
+            return [LibraryChange(*row) for row in conn.exec_driver_sql(statement, (since,)).fetchall()]
+    except Exception as ex:
+        log.error("Reading library changes failed: %s", ex)
+        return None
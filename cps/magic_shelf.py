@@ -5,7 +5,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 # See CONTRIBUTORS for full list of authors.
 
-from . import db, ub, logger
+from . import db, ub, logger, library_changes
 from .cw_login import current_user
 from sqlalchemy import and_, or_, not_
 from sqlalchemy.sql.expression import func
@@ -562,6 +562,8 @@ def get_books_for_magic_shelf(shelf_id, page=1, page_size=None, sort_order=None,
             log.warning(f"Magic shelf with ID {shelf_id} not found")
             return [], 0
 
+        library_generation = library_changes.generation()
+
         # 1. Check Cache
         if not bypass_cache and current_user.is_authenticated:
             cache = ub.session.query(ub.MagicShelfCache).filter_by(
@@ -578,6 +580,9 @@ def get_books_for_magic_shelf(shelf_id, page=1, page_size=None, sort_order=None,
                     created_at = created_at.replace(tzinfo=timezone.utc)
                 
                 is_expired = (datetime.now(timezone.utc) - created_at) > timedelta(minutes=30)
+                # Books added, changed or removed since the cache was built
+                if library_generation is not None and cache.library_generation != library_generation:
+                    is_expired = True
                 
                 if not is_expired:
                     all_ids = cache.book_ids
@@ -666,7 +671,8 @@ def get_books_for_magic_shelf(shelf_id, page=1, page_size=None, sort_order=None,
                     user_id=current_user.id,
                     sort_param=sort_param,
                     book_ids=all_ids,
-                    total_count=total_count
+                    total_count=total_count,
+                    library_generation=library_generation
                 )
                 ub.session.add(new_cache)
                 ub.session.commit()
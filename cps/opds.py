@@ -17,7 +17,7 @@ from flask_babel import gettext as _
 from sqlalchemy.sql.expression import func, text, or_, and_, true
 from sqlalchemy.exc import InvalidRequestError, OperationalError
 
-from . import logger, config, db, calibre_db, ub, isoLanguages, constants, magic_shelf
+from . import logger, config, db, calibre_db, ub, isoLanguages, constants, magic_shelf, category_cache
 from .usermanagement import requires_basic_auth_if_no_ano, auth
 from .helper import get_download_link, get_book_cover
 from .pagination import Pagination
@@ -468,13 +468,13 @@ def feed_ratingindex():
     if not auth.current_user().check_visibility(constants.SIDEBAR_RATING):
         abort(404)
     off = request.args.get("offset") or 0
-    entries = calibre_db.session.query(db.Ratings, func.count('books_ratings_link.book').label('count'),
-                                       (db.Ratings.rating / 2).label('name')) \
-        .join(db.books_ratings_link)\
-        .join(db.Books)\
-        .filter(calibre_db.common_filters()) \
-        .group_by(text('books_ratings_link.rating'))\
-        .order_by(db.Ratings.rating).all()
+    entries = category_cache.get('opds_ratings', lambda: calibre_db.session.query(
+        db.Ratings, func.count('books_ratings_link.book').label('count'), (db.Ratings.rating / 2).label('name'))
+        .join(db.books_ratings_link)
+        .join(db.Books)
+        .filter(calibre_db.common_filters())
+        .group_by(text('books_ratings_link.rating'))
+        .order_by(db.Ratings.rating).all())
 
     pagination = Pagination((int(off) / (int(config.config_books_per_page)) + 1), config.config_books_per_page,
                             len(entries))
@@ -496,10 +496,10 @@ def feed_formatindex():
     if not auth.current_user().check_visibility(constants.SIDEBAR_FORMAT):
         abort(404)
     off = request.args.get("offset") or 0
-    entries = calibre_db.session.query(db.Data).join(db.Books)\
-        .filter(calibre_db.common_filters()) \
-        .group_by(db.Data.format)\
-        .order_by(db.Data.format).all()
+    entries = category_cache.get('opds_formats', lambda: calibre_db.session.query(db.Data).join(db.Books)
+                                 .filter(calibre_db.common_filters())
+                                 .group_by(db.Data.format)
+                                 .order_by(db.Data.format).all())
     pagination = Pagination((int(off) / (int(config.config_books_per_page)) + 1), config.config_books_per_page,
                             len(entries))
     element = list()
@@ -794,11 +794,15 @@ def render_xml_dataset(data_table, book_id):
 def render_element_index(database_column, linked_table, folder):
     shift = 0
     off = int(request.args.get("offset") or 0)
-    entries = calibre_db.session.query(func.upper(func.substr(database_column, 1, 1)).label('id'), None, None)
-    # query = calibre_db.generate_linked_query(config.config_read_column, db.Books)
-    if linked_table is not None:
-        entries = entries.join(linked_table).join(db.Books)
-    entries = entries.filter(calibre_db.common_filters()).group_by(func.upper(func.substr(database_column, 1, 1))).all()
+
+    def letters():
+        query = calibre_db.session.query(func.upper(func.substr(database_column, 1, 1)).label('id'), None, None)
+        # query = calibre_db.generate_linked_query(config.config_read_column, db.Books)
+        if linked_table is not None:
+            query = query.join(linked_table).join(db.Books)
+        return query.filter(calibre_db.common_filters()).group_by(func.upper(func.substr(database_column, 1, 1))).all()
+
+    entries = category_cache.get(('opds_letters', str(database_column)), letters)
     elements = []
     if off == 0 and entries:
         elements.append({'id': "00", 'name': _("All")})
@@ -22,7 +22,7 @@ Version History:
 
 import hashlib
 import os
-from typing import Optional
+from typing import BinaryIO, Optional
 
 from ... import logger
 
@@ -65,53 +65,59 @@ def calculate_koreader_partial_md5(filepath: str) -> Optional[str]:
         return None
 
     try:
-        md5_hash = hashlib.md5()  # nosec - MD5 is used for identification, not security
-        step = 1024
-        sample_size = 1024
-
         with open(filepath, 'rb') as f:
-            # Sample at positions: 0, 1K, 4K, 16K, 64K, 256K, 1M, 4M, 16M, 64M, 256M, 1G
-            # Formula: lshift(step, 2*i) where i ranges from -1 to 10
-            for i in range(-1, 11):
-                # Calculate position using same algorithm as KOReader
-                # KOReader uses: bit.lshift(step, 2*i)
-                # LuaJIT's bit.lshift only uses lower 5 bits of shift count
-                # So lshift(1024, -2) becomes lshift(1024, 30) = 0 (overflow)
-                #
-                # For i = -1: shift_count = -2, masked = 30, result = 0
-                #  0: shift_count = 0, result = 1024
-                #  1: shift_count = 2, result = 4096
-                #  2: shift_count = 4, result = 16384
-                #  3: shift_count = 6, result = 65536
-                # etc.
-                shift_count = 2 * i
-                masked_shift = shift_count & 0x1F  # LuaJIT: only lower 5 bits used
-
-                # Perform the shift (may overflow to 0)
-                result = step << masked_shift
-                # Mask to 32-bit unsigned range like LuaJIT does
-                position = result & 0xFFFFFFFF
-
-                try:
-                    f.seek(position)
-                    sample = f.read(sample_size)
-
-                    if sample:
-                        md5_hash.update(sample)
-                    else:
-                        # Reached end of file
-                        break
-
-                except (IOError, OSError):
-                    # Seeking beyond file end - stop sampling
-                    break
-
-        result = md5_hash.hexdigest()
-        return result
-
+            return calculate_koreader_partial_md5_from_file(f)
     except (IOError, OSError, PermissionError) as e:
         log.error(f"calculate_koreader_partial_md5: Error reading file {filepath}: {e}")
         return None
     except Exception as e:
         log.error(f"calculate_koreader_partial_md5: Unexpected error for {filepath}: {e}")
         return None
+
+
+def calculate_koreader_partial_md5_from_file(f: BinaryIO) -> str:
+    """
+    Same digest as calculate_koreader_partial_md5, computed from an already open
+    binary file object so callers doing other work on the file can share the handle.
+    """
+    md5_hash = hashlib.md5()  # nosec - MD5 is used for identification, not security
+    step = 1024
+    sample_size = 1024
+
+    # Sample at positions: 0, 1K, 4K, 16K, 64K, 256K, 1M, 4M, 16M, 64M, 256M, 1G
+    # Formula: lshift(step, 2*i) where i ranges from -1 to 10
+    for i in range(-1, 11):
+        # Calculate position using same algorithm as KOReader
+        # KOReader uses: bit.lshift(step, 2*i)
+        # LuaJIT's bit.lshift only uses lower 5 bits of shift count
+        # So lshift(1024, -2) becomes lshift(1024, 30) = 0 (overflow)
+        #
+        # For i = -1: shift_count = -2, masked = 30, result = 0
+        #  0: shift_count = 0, result = 1024
+        #  1: shift_count = 2, result = 4096
+        #  2: shift_count = 4, result = 16384
+        #  3: shift_count = 6, result = 65536
+        # etc.
+        shift_count = 2 * i
+        masked_shift = shift_count & 0x1F  # LuaJIT: only lower 5 bits used
+
+        # Perform the shift (may overflow to 0)
+        result = step << masked_shift
+        # Mask to 32-bit unsigned range like LuaJIT does
+        position = result & 0xFFFFFFFF
+
+        try:
+            f.seek(position)
+            sample = f.read(sample_size)
+
+            if sample:
+                md5_hash.update(sample)
+            else:
+                # Reached end of file
+                break
+
+        except (IOError, OSError):
+            # Seeking beyond file end - stop sampling
+            break
+
+    return md5_hash.hexdigest()
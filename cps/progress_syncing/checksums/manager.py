@@ -36,7 +36,8 @@ def store_checksum(
     book_format: str,
     checksum: str,
     version: str = CHECKSUM_VERSION,
-    db_connection=None
+    db_connection=None,
+    commit: bool = True
 ) -> bool:
     """
     Store a checksum in the database with history tracking.
@@ -50,6 +51,8 @@ def store_checksum(
         checksum: MD5 checksum string
         version: Algorithm version identifier
         db_connection: Optional SQLAlchemy connection (uses calibre_db if None)
+        commit: Commit right away; pass False to store several checksums in one
+            transaction on a caller-provided connection and commit once
 
     Returns:
         True if successful, False otherwise
@@ -63,7 +66,7 @@ def store_checksum(
         from sqlalchemy import text
 
         if db_connection is None:
-            db_connection = calibre_db.engine.connect()
+            db_connection = calibre_db.writer_engine.connect()
             should_close = True
         else:
             should_close = False
@@ -117,7 +120,8 @@ def store_checksum(
                     VALUES (?, ?, ?, ?, ?)
                 ''', (book_id, book_format.upper(), checksum, version, timestamp))
 
-            db_connection.commit()
+            if commit or should_close:
+                db_connection.commit()
             return True
 
         finally:
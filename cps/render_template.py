@@ -11,14 +11,14 @@ from flask_babel import get_locale
 import polib
 from werkzeug.local import LocalProxy
 from .cw_login import current_user
-from sqlalchemy.sql.expression import or_
 
-from . import config, constants, logger, ub
+from . import config, constants, logger, ub, library_changes, shelf_cache
 from .ub import User
 
 # CWA specific imports
 from datetime import datetime
 import os.path
+import threading
 
 import sys
 sys.path.insert(1, '/app/calibre-web-automated/scripts/')
@@ -27,6 +27,67 @@ from cwa_db import CWA_DB
 
 log = logger.create()
 
+CWA_UPDATE_NOTICE = '/app/cwa_update_notice'
+
+# Notification state kept per process, so rendering a page costs a few dict lookups: untranslated
+# string counts per locale, the dates the once per day notices were last shown and the duplicate
+# scan results, reloaded when the duplicate cache or the library generation changes
+_notification_lock = threading.Lock()
+_translation_gaps = {}
+_notice_dates = {}
+_duplicate_state = {}
+
+
+def _notice_date(notice_file):
+    """Date a once per day notice was last shown, None if never; the file is only read the first time"""
+    with _notification_lock:
+        if notice_file in _notice_dates:
+            return _notice_dates[notice_file]
+    try:
+        with open(notice_file, 'r') as f:
+            last_notification = f.read().strip()
+    except OSError:
+        last_notification = None
+    with _notification_lock:
+        _notice_dates[notice_file] = last_notification
+    return last_notification
+
+
+def _set_notice_date(notice_file, date):
+    with _notification_lock:
+        _notice_dates[notice_file] = date
+    with open(notice_file, 'w') as f:
+        f.write(date)
+
+
+def _cached_duplicate_cache(cwa_db):
+    """Duplicate scan results of cwa_db, only deserialized again after the cache was written"""
+    marker = cwa_db.get_duplicate_cache_marker()
+    with _notification_lock:
+        entry = _duplicate_state.get('cache')
+        if marker is not None and entry is not None and entry[0] == marker:
+            return entry[1]
+    cache_data = cwa_db.get_duplicate_cache()
+    with _notification_lock:
+        _duplicate_state['cache'] = (marker, cache_data)
+    return cache_data
+
+
+def _duplicate_setup_scan_needed(settings, cwa_db):
+    from cps.duplicate_index import duplicate_index_needs_manual_full_scan, get_criteria_fingerprint, \
+        library_has_books
+
+    generation = library_changes.generation()
+    key = (generation, cwa_db.get_duplicate_cache_marker(), get_criteria_fingerprint(settings))
+    with _notification_lock:
+        entry = _duplicate_state.get('setup')
+        if generation is not None and entry is not None and entry[0] == key:
+            return entry[1]
+    needed = library_has_books() and duplicate_index_needs_manual_full_scan(settings)
+    with _notification_lock:
+        _duplicate_state['setup'] = (key, needed)
+    return needed
+
 
 def _duplicate_setup_notice_dismissed():
     notice_file = f"/config/cwa_duplicate_index_setup_notice_{getattr(current_user, 'id', 'unknown')}"
@@ -39,11 +100,7 @@ def duplicate_index_setup_notification(settings, cwa_db=None):
         return False
 
     try:
-        from cps.duplicate_index import duplicate_index_needs_manual_full_scan, library_has_books
-
-        if not library_has_books():
-            return False
-        if not duplicate_index_needs_manual_full_scan(settings):
+        if not _duplicate_setup_scan_needed(settings, cwa_db or CWA_DB()):
             return False
     except Exception as e:
         log.debug("[cwa-duplicates] Failed to check duplicate setup notification state: %s", str(e))
@@ -138,8 +195,7 @@ def get_sidebar_config(kwargs=None):
             {"glyph": "glyphicon-copy", "text": _('Duplicates'), "link": 'duplicates.show_duplicates', "id": "duplicates",
              "visibility": constants.SIDEBAR_DUPLICATES, 'public': (not current_user.is_anonymous), "page": "duplicates",
              "show_text": _('Show Duplicate Books'), "config_show": content})
-    g.shelves_access = ub.session.query(ub.Shelf).filter(
-        or_(ub.Shelf.is_public == 1, ub.Shelf.user_id == current_user.id)).order_by(ub.Shelf.name).all()
+    g.shelves_access = shelf_cache.shelves_for_user(current_user.id)
 
     return sidebar, simple
 
@@ -165,21 +221,18 @@ def cwa_update_available() -> tuple[bool, str, str]:
 
 # Gets the date the last cwa update notification was displayed
 def get_cwa_last_notification() -> str:
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    if not os.path.isfile('/app/cwa_update_notice'):
-        with open('/app/cwa_update_notice', 'w') as f:
-            f.write(current_date)
+    last_notification = _notice_date(CWA_UPDATE_NOTICE)
+    if last_notification is None:
+        _set_notice_date(CWA_UPDATE_NOTICE, datetime.now().strftime("%Y-%m-%d"))
         return "0001-01-01"
-    else:
-        with open('/app/cwa_update_notice', 'r') as f:
-            last_notification = f.read()
     return last_notification
 
 # Displays a notification to the user that an update for CWA is available, no matter which page they're on
 # Currently set to only display once per calender day
-def cwa_update_notification() -> None:
-    db = CWA_DB()
-    if db.cwa_settings['cwa_update_notifications']:
+def cwa_update_notification(settings=None) -> None:
+    if settings is None:
+        settings = CWA_DB().cwa_settings
+    if settings['cwa_update_notifications']:
         current_date = datetime.now().strftime("%Y-%m-%d")
         cwa_last_notification = get_cwa_last_notification()
         
@@ -192,8 +245,7 @@ def cwa_update_notification() -> None:
             flash(_(message), category="cwa_update")
             print(f"[cwa-update-notification-service] {message}", flush=True)
 
-        with open('/app/cwa_update_notice', 'w') as f:
-            f.write(current_date)
+        _set_notice_date(CWA_UPDATE_NOTICE, current_date)
         return
     else:
         return
@@ -204,14 +256,8 @@ def theme_migration_notification() -> None:
     current_date = datetime.now().strftime("%Y-%m-%d")
     
     # Check if notification already shown today
-    if os.path.isfile(notice_file):
-        try:
-            with open(notice_file, 'r') as f:
-                last_notification = f.read().strip()
-                if last_notification == current_date:
-                    return
-        except Exception:
-            pass
+    if _notice_date(notice_file) == current_date:
+        return
     
     # Show notification
     message = _("ℹ️ Your theme has been updated to caliBlur (Dark). Theme switching is temporarily disabled while we develop a new frontend for v5.0.0.")
@@ -219,44 +265,50 @@ def theme_migration_notification() -> None:
     
     # Mark as shown today
     try:
-        with open(notice_file, 'w') as f:
-            f.write(current_date)
+        _set_notice_date(notice_file, current_date)
     except Exception as e:
         print(f"[theme-migration-notification] Error writing notice file: {e}", flush=True)
 
 
+# Number of untranslated strings for a language, the messages.po is only parsed once per process
+def translation_gap_count(lang) -> int:
+    with _notification_lock:
+        if lang in _translation_gaps:
+            return _translation_gaps[lang]
+    po_path = f"cps/translations/{lang}/LC_MESSAGES/messages.po"
+    missing_count = 0
+    if os.path.isfile(po_path):
+        try:
+            po = polib.pofile(po_path)
+            missing_count = sum(1 for entry in po if not entry.msgstr.strip())
+        except Exception as e:
+            print(f"[translation-notification-service] Error reading {po_path}: {e}", flush=True)
+    with _notification_lock:
+        _translation_gaps[lang] = missing_count
+    return missing_count
+
 # Checks if translations are missing for the current language
-def translations_missing_notification() -> None:
-    db = CWA_DB()
-    if db.cwa_settings['contribute_translations_notifications']:
+def translations_missing_notification(settings=None) -> None:
+    if settings is None:
+        settings = CWA_DB().cwa_settings
+    if settings['contribute_translations_notifications']:
         lang = str(get_locale())
         # Skip English as it is the default language
         if lang == 'en':
             return
-        po_path = f"cps/translations/{lang}/LC_MESSAGES/messages.po"
         current_date = datetime.now().strftime("%Y-%m-%d")
         notice_file = f"/app/cwa_translation_notice_{lang}"
-        missing_count = 0
-        if os.path.isfile(po_path):
-            try:
-                po = polib.pofile(po_path)
-                missing_count = sum(1 for entry in po if not entry.msgstr.strip())
-            except Exception as e:
-                print(f"[translation-notification-service] Error reading {po_path}: {e}", flush=True)
+        missing_count = translation_gap_count(lang)
         if missing_count > 0:
-            if not os.path.isfile(notice_file):
-                with open(notice_file, 'w') as f:
-                    f.write(current_date)
+            last_notification = _notice_date(notice_file)
+            if last_notification is None:
+                _set_notice_date(notice_file, current_date)
                 last_notification = "0001-01-01"
-            else:
-                with open(notice_file, 'r') as f:
-                    last_notification = f.read().strip()
             if last_notification != current_date:
                 message = _(f"🌐 Help improve CWA's {constants.LANGUAGE_NAMES.get(lang, lang)} translations! {missing_count} strings in your language need translation. ")
                 flash(message, category="translation_missing")
                 print(f"[translation-notification-service] {message}", flush=True)
-                with open(notice_file, 'w') as f:
-                    f.write(current_date)
+                _set_notice_date(notice_file, current_date)
         return
     else:
         return
@@ -271,9 +323,10 @@ def render_title_template(*args, **kwargs):
         }
     except Exception:
         magic_shelf_routes = {"render": False, "create": False}
+    cwa_db = CWA_DB()
     if current_user.role_admin():
         try:
-            cwa_update_notification()
+            cwa_update_notification(cwa_db.cwa_settings)
         except Exception as e:
             print(f"[cwa-update-notification-service] The following error occurred when checking for available updates:\n{e}", flush=True)
     # Notify users about theme migration (once per day)
@@ -283,7 +336,7 @@ def render_title_template(*args, **kwargs):
         print(f"[theme-migration-notification] Error showing theme migration notification: {e}", flush=True)
     # Notify any user if translations are missing for their language
     try:
-        translations_missing_notification()
+        translations_missing_notification(cwa_db.cwa_settings)
     except Exception as e:
         print(f"[translation-notification-service] The following error occurred when checking for missing translations:\n{e}", flush=True)
     duplicate_notification = {
@@ -295,11 +348,10 @@ def render_title_template(*args, **kwargs):
     }
     try:
         if current_user.is_authenticated and (current_user.role_admin() or current_user.role_edit()):
-            cwa_db = CWA_DB()
             detection_enabled = cwa_db.cwa_settings.get('duplicate_detection_enabled', 1)
             notifications_enabled = bool(cwa_db.cwa_settings.get('duplicate_notifications_enabled', 1))
             if detection_enabled:
-                cache_data = cwa_db.get_duplicate_cache()
+                cache_data = _cached_duplicate_cache(cwa_db)
                 duplicate_setup_notice_dismissed = _duplicate_setup_notice_dismissed()
                 duplicate_setup_notice_shown = False
                 if not duplicate_setup_notice_dismissed:
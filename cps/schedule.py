@@ -16,6 +16,7 @@ from .tasks.thumbnail_migration import check_and_migrate_thumbnails
 from .services.worker import WorkerThread
 from .tasks.metadata_backup import TaskBackupMetadata
 from .tasks.auto_hardcover_id import TaskAutoHardcoverID
+from .tasks.content_index import TaskIndexBookContent
 
 def get_scheduled_tasks(reconnect=True):
     tasks = list()
@@ -39,9 +40,24 @@ def get_scheduled_tasks(reconnect=True):
     if config.schedule_generate_series_covers:
         tasks.append([lambda: TaskGenerateSeriesThumbnails(), 'generate book covers', False])
 
+    # Index the text of new and changed books for content search
+    if _content_index_enabled():
+        tasks.append([lambda: TaskIndexBookContent(), 'index book content', False])
+
     return tasks
 
 
+def _content_index_enabled():
+    try:
+        import sys as _sys
+        if '/app/calibre-web-automated/scripts/' not in _sys.path:
+            _sys.path.insert(1, '/app/calibre-web-automated/scripts/')
+        from cwa_db import CWA_DB
+        return bool(CWA_DB().cwa_settings.get('content_index_enabled', False))
+    except Exception:
+        return False
+
+
 def end_scheduled_tasks():
     worker = WorkerThread.get_instance()
     for __, __, __, task, __ in worker.tasks:
@@ -12,10 +12,10 @@ from flask import session as flask_session
 from .cw_login import current_user
 from flask_babel import format_date
 from flask_babel import gettext as _
-from sqlalchemy.sql.expression import func, not_, and_, or_, text, true
+from sqlalchemy.sql.expression import func, not_, and_, or_, text, true, distinct
 from sqlalchemy.sql.functions import coalesce
 
-from . import logger, db, calibre_db, config, ub
+from . import logger, db, calibre_db, config, ub, search_index
 from .string_helper import strip_whitespaces
 from .usermanagement import login_required_if_no_ano
 from .render_template import render_title_template
@@ -325,7 +325,7 @@ def render_adv_search_results(term, offset=None, order=None, limit=None):
                                                              rating_low,
                                                              read_status)
         if author_name:
-            q = q.filter(db.Books.authors.any(func.lower(db.Authors.name).ilike("%" + author_name + "%")))
+            q = q.filter(db.Books.authors.any(calibre_db.name_filter(db.Authors, author_name)))
         if book_title:
             q = q.filter(func.lower(db.Books.title).ilike("%" + book_title + "%"))
         if pub_start:
@@ -335,7 +335,7 @@ def render_adv_search_results(term, offset=None, order=None, limit=None):
         if read_status != "Any":
             q = q.filter(adv_search_read_status(read_status))
         if publisher:
-            q = q.filter(db.Books.publishers.any(func.lower(db.Publishers.name).ilike("%" + publisher + "%")))
+            q = q.filter(db.Books.publishers.any(calibre_db.name_filter(db.Publishers, publisher)))
         q = adv_search_tag(q, tags['include_tag'], tags['exclude_tag'])
         q = adv_search_serie(q, tags['include_serie'], tags['exclude_serie'])
         q = adv_search_shelf(q, tags['include_shelf'], tags['exclude_shelf'])
@@ -356,8 +356,9 @@ def render_adv_search_results(term, offset=None, order=None, limit=None):
     q = q.order_by(*sort)
     flask_session['query'] = json.dumps(term)
 
-    # Perform a count query for pagination, which is much faster than fetching all results.
-    result_count = q.count()
+    # Counted in SQL; only the ids of all hits are loaded, for adding the result to a shelf
+    result_count = q.with_entities(func.count(distinct(db.Books.id))).order_by(None).scalar()
+    ub.store_ids(q.with_entities(db.Books.id).distinct())
 
     if offset is not None and limit is not None:
         offset = int(offset)
@@ -370,11 +371,6 @@ def render_adv_search_results(term, offset=None, order=None, limit=None):
         pagination = Pagination(page=1, per_page=limit, total_count=result_count)
         results = q.all()
 
-    # Note: store_combo_ids will now only contain the IDs of the currently visible page.
-    # This improves performance drastically for large search results, but affects
-    # functionality that relies on having all search result IDs (e.g., "download all").
-    ub.store_combo_ids(results)
-
     entries = calibre_db.order_authors(results, list_return=True, combined=True)
     return render_title_template('search.html',
                                  adv_searchterm=search_term,
@@ -416,8 +412,42 @@ def render_prepare_search_form(cc):
                                  series=series,shelves=shelves, title=_("Advanced Search"), cc=cc, page="advsearch")
 
 
-def render_search_results(term, offset=None, order=None, limit=None):
-    if term:
+def content_search_enabled():
+    try:
+        from scripts.cwa_db import CWA_DB
+        return bool(CWA_DB().cwa_settings.get('content_index_enabled', False))
+    except Exception as e:
+        log.debug(f"Cannot read content index setting: {e}")
+        return False
+
+
+def get_content_search_results(term, offset=0, limit=None):
+    """Books whose indexed text matches term, best match first, with a highlighted snippet each"""
+    match_query = search_index.build_content_match_query(term)
+    if not match_query or not search_index.ensure_schema(calibre_db.writer_engine):
+        return list(), 0, None, dict()
+    hits = search_index.content_hits(match_query)
+    query = (calibre_db.generate_linked_query(config.config_read_column, db.Books)
+             .join(hits, hits.c.book_id == db.Books.id)
+             .filter(calibre_db.common_filters(True)))
+    result_count = query.count()
+    offset = int(offset or 0)
+    limit = int(limit or config.config_books_per_page)
+    pagination = Pagination((offset / limit) + 1, limit, result_count)
+    rows = query.add_columns(hits.c.snippet).order_by(hits.c.score).offset(offset).limit(limit).all()
+    snippets = {row.Books.id: search_index.render_snippet(row.snippet) for row in rows}
+    entries = calibre_db.order_authors(rows, list_return=True, combined=True)
+    return entries, result_count, pagination, snippets
+
+
+def render_search_results(term, offset=None, order=None, limit=None, mode=None):
+    snippets = None
+    content_enabled = content_search_enabled()
+    if term and mode == 'content' and content_enabled:
+        entries, result_count, pagination, snippets = get_content_search_results(term, offset, limit)
+        order = [None, None]
+    elif term:
+        mode = None
         join = db.books_series_link, db.Books.id == db.books_series_link.c.book, db.Series
         entries, result_count, pagination = calibre_db.get_search_results(term,
                                                                           config,
@@ -437,6 +467,9 @@ def render_search_results(term, offset=None, order=None, limit=None):
                                  adv_searchterm=term,
                                  entries=entries,
                                  result_count=result_count,
+                                 snippets=snippets,
+                                 search_mode=mode,
+                                 content_search_enabled=content_enabled,
                                  title=_("Search"),
                                  page="search",
                                  order=order[1])
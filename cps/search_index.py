@@ -0,0 +1,445 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""FTS5 metadata search index kept in a sidecar database next to app.db.
+
+Every pooled Calibre connection attaches the sidecar as ``search_index``. The index
+holds one row per book (rowid = books.id) with title, authors, tags, series,
+publishers and the searchable text custom columns, lowercased and transliterated
+the same way as the ``lower`` SQL function. Before each search the books reported
+by library_changes since the indexed generation are indexed again; the index is
+rebuilt when the library or the indexed custom columns change.
+
+The same sidecar holds the book content index filled by TaskIndexBookContent:
+text chunks of one format per book in ``content_fts`` plus the mtime/size of the
+indexed file in ``content_files``.
+
+``normalized_names`` keeps the authors, tags, series and publishers names
+lowercased, transliterated and whitespace-collapsed, so name filters compare
+stored values instead of calling the ``lower`` Python function for every row.
+
+``visible_books`` holds the ids of the books a set of user restrictions (language,
+allowed/denied tags and custom column values) lets through, one set per restriction
+signature, rebuilt when the library fingerprint it was computed for changes.
+
+``library_books``, ``library_names`` and ``library_changes`` back the change feed in
+library_changes. The normalized names are kept for the library generation it recorded.
+
+The functions writing the sidecar are given CalibreDB's writer engine, whose single connection
+serializes them; no lock of this module is held while waiting for it.
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+
+from sqlalchemy import Float, Integer, String, column, func, literal, literal_column, select, table, text
+
+from . import logger
+
+
+log = logger.create()
+
+SEARCH_INDEX_FILENAME = "cwa_search_index.db"
+SCHEMA_VERSION = "metadata-fts-v1"
+REINDEX_CHUNK_SIZE = 500
+# Custom column types searched by CalibreDB.search_query
+SEARCHABLE_CC_TYPES = ("text", "enumeration", "comments")
+
+_schema_ready = False
+_unavailable = False
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Snippet markers, replaced by <mark> once the snippet text is escaped
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+SNIPPET_TOKENS = 24
+
+# Calibre tables whose names are kept normalized
+NAME_KINDS = ("authors", "tags", "series", "publishers")
+NAMES_VERSION = "names-v1"
+_names_table = table("normalized_names", column("kind"), column("id"), column("name"), schema="search_index")
+_visible_books_table = table("visible_books", column("set_key"), column("book_id"), schema="search_index")
+# set_key -> library fingerprint of the visible sets known to be stored
+_visible_sets = {}
+
+
+def search_index_path(app_db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(app_db_path)), SEARCH_INDEX_FILENAME)
+
+
+def attach(dbapi_connection, app_db_path):
+    """Attach the sidecar to a raw sqlite3 connection, called for each new pooled connection"""
+    try:
+        dbapi_connection.execute("attach database ? as search_index", (search_index_path(app_db_path),))
+    except Exception as ex:
+        log.warning("Search index not attached: %s", ex)
+
+
+def _ensure_schema(conn):
+    global _schema_ready, _unavailable
+    if _schema_ready:
+        return True
+    try:
+        conn.exec_driver_sql("PRAGMA search_index.journal_mode=WAL")
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index.books_fts USING fts5("
+            "title, authors, tags, series, publishers, custom, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.index_state (key TEXT PRIMARY KEY, value TEXT)")
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index.content_fts USING fts5("
+            "body, book_id UNINDEXED, format UNINDEXED, char_offset UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2')")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.content_files ("
+            "book_id INTEGER PRIMARY KEY, format TEXT NOT NULL, mtime REAL NOT NULL, "
+            "size INTEGER NOT NULL, chunks INTEGER NOT NULL DEFAULT 0)")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.normalized_names ("
+            "kind TEXT NOT NULL, id INTEGER NOT NULL, source TEXT, name TEXT NOT NULL, "
+            "PRIMARY KEY (kind, id)) WITHOUT ROWID")
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS search_index.normalized_names_name ON normalized_names (kind, name)")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.visible_sets ("
+            "set_key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.visible_books ("
+            "set_key TEXT NOT NULL, book_id INTEGER NOT NULL, PRIMARY KEY (set_key, book_id)) WITHOUT ROWID")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.library_books ("
+            "book_id INTEGER PRIMARY KEY, last_modified TEXT)")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.library_changes ("
+            "generation INTEGER PRIMARY KEY AUTOINCREMENT, book_id INTEGER, kind TEXT NOT NULL, "
+            "changed_at TEXT NOT NULL)")
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_index.library_names ("
+            "kind TEXT NOT NULL, id INTEGER NOT NULL, name TEXT, PRIMARY KEY (kind, id)) WITHOUT ROWID")
+        conn.commit()
+    except Exception as ex:
+        conn.rollback()
+        _unavailable = True
+        log.warning("FTS5 search index unavailable, falling back to LIKE search: %s", ex)
+        return False
+    _schema_ready = True
+    return True
+
+
+def _custom_column_expression(cc_id, datatype):
+    if datatype == "comments":
+        return ("(SELECT group_concat(lower(cc.value), ' ') FROM calibre.custom_column_{0} cc "
+                "WHERE cc.book = b.id)").format(int(cc_id))
+    return ("(SELECT group_concat(lower(cc.value), ' ') FROM calibre.books_custom_column_{0}_link l "
+            "JOIN calibre.custom_column_{0} cc ON cc.id = l.value WHERE l.book = b.id)").format(int(cc_id))
+
+
+def _insert_sql(custom_columns):
+    custom = [_custom_column_expression(cc_id, datatype) for cc_id, datatype in custom_columns]
+    custom_expression = " || ' ' || ".join("coalesce({}, '')".format(c) for c in custom) or "''"
+    return (
+        "INSERT INTO search_index.books_fts (rowid, title, authors, tags, series, publishers, custom) "
+        "SELECT b.id, lower(coalesce(b.title, '')), "
+        "(SELECT group_concat(lower(a.name), ' & ') FROM calibre.books_authors_link l "
+        "JOIN calibre.authors a ON a.id = l.author WHERE l.book = b.id), "
+        "(SELECT group_concat(lower(t.name), ', ') FROM calibre.books_tags_link l "
+        "JOIN calibre.tags t ON t.id = l.tag WHERE l.book = b.id), "
+        "(SELECT group_concat(lower(s.name), ', ') FROM calibre.books_series_link l "
+        "JOIN calibre.series s ON s.id = l.series WHERE l.book = b.id), "
+        "(SELECT group_concat(lower(p.name), ', ') FROM calibre.books_publishers_link l "
+        "JOIN calibre.publishers p ON p.id = l.publisher WHERE l.book = b.id), "
+        "{} FROM calibre.books b".format(custom_expression)
+    )
+
+
+def _reindex(conn, insert_sql, book_ids):
+    for start in range(0, len(book_ids), REINDEX_CHUNK_SIZE):
+        chunk = book_ids[start:start + REINDEX_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        conn.exec_driver_sql(
+            "DELETE FROM search_index.books_fts WHERE rowid IN ({})".format(placeholders), tuple(chunk))
+        conn.exec_driver_sql(insert_sql + " WHERE b.id IN ({})".format(placeholders), tuple(chunk))
+
+
+def _write_state(conn, state):
+    conn.exec_driver_sql(
+        "INSERT OR REPLACE INTO search_index.index_state (key, value) VALUES (?, ?)",
+        [(key, str(value)) for key, value in state.items()])
+
+
+def _index_state(conn, custom_columns):
+    """(signature, generation) the index has to be built for"""
+    library = conn.exec_driver_sql("SELECT uuid FROM calibre.library_id").scalar() or ""
+    return json.dumps([SCHEMA_VERSION, library, custom_columns]), str(library_generation(conn))
+
+
+def _changed_books(conn, since):
+    """Ids of the books library_changes reported after generation since, None when all have to be indexed"""
+    if not since:
+        return None
+    first = conn.exec_driver_sql("SELECT min(generation) FROM search_index.library_changes").scalar()
+    if first is None or first > int(since) + 1:
+        # Trimmed from the history
+        return None
+    rows = conn.exec_driver_sql(
+        "SELECT book_id, kind FROM search_index.library_changes WHERE generation > ?", (int(since),)).fetchall()
+    # library_changes.KIND_RESET: the history started over
+    if any(kind == "reset" for __, kind in rows):
+        return None
+    return sorted({book_id for book_id, __ in rows if book_id is not None})
+
+
+def refresh(engine, writer_engine, custom_columns):
+    """Bring the index up to date, returns False when searches have to use the LIKE fallback.
+
+    The index follows the generations recorded by library_changes: the books changed since
+    the indexed one are indexed again, renamed authors, tags, series and publishers included.
+    Whether it is behind is checked on the read-only engine; only then is the writer taken.
+
+    custom_columns: (id, datatype) of the text custom columns search should cover.
+    """
+    if _unavailable or engine is None or writer_engine is None:
+        return False
+    custom_columns = sorted((int(cc_id), datatype) for cc_id, datatype in custom_columns
+                           if datatype in SEARCHABLE_CC_TYPES)
+    try:
+        if not ensure_schema(writer_engine):
+            return False
+        with engine.connect() as conn:
+            state = dict(conn.exec_driver_sql("SELECT key, value FROM search_index.index_state").fetchall())
+            if (state.get("signature"), state.get("generation")) == _index_state(conn, custom_columns):
+                return True
+        with writer_engine.connect() as conn:
+            state = dict(conn.exec_driver_sql("SELECT key, value FROM search_index.index_state").fetchall())
+            signature, generation = _index_state(conn, custom_columns)
+            if (state.get("signature"), state.get("generation")) == (signature, generation):
+                return True
+            insert_sql = _insert_sql(custom_columns)
+            changed = _changed_books(conn, state.get("generation")) if state.get("signature") == signature else None
+            if changed is None:
+                conn.exec_driver_sql("DELETE FROM search_index.books_fts")
+                conn.exec_driver_sql(insert_sql)
+                log.info("Search index rebuilt for library generation %s", generation)
+            else:
+                # Books deleted since are dropped by the reindex and not inserted again
+                _reindex(conn, insert_sql, changed)
+            _write_state(conn, {"signature": signature, "generation": generation})
+            conn.commit()
+        return True
+    except Exception as ex:
+        log.error("Search index refresh failed: %s", ex)
+        return False
+
+
+def build_match_query(term, normalize):
+    """FTS5 query for a simple search term, or None when the term has no indexable tokens.
+
+    The term matches as a word-prefix phrase in any field, or with all its words in the
+    author names (the old search split authors on spaces and commas).
+    """
+    tokens = _TOKEN_RE.findall(normalize(term or ""))
+    if not tokens:
+        return None
+    phrase = " + ".join('"{}"*'.format(token) for token in tokens)
+    authors = " AND ".join('"{}"*'.format(token) for token in tokens)
+    return "({}) OR authors : ({})".format(phrase, authors)
+
+
+def matching_book_ids(match_query):
+    """Selectable of the book ids matching an FTS5 query from build_match_query"""
+    return (select(literal_column("rowid"))
+            .select_from(text("search_index.books_fts"))
+            .where(text("books_fts MATCH :search_match").bindparams(search_match=match_query)))
+
+
+def library_generation(conn):
+    """Generation of the last change recorded by library_changes, 0 before its first poll"""
+    return conn.exec_driver_sql("SELECT coalesce(max(generation), 0) FROM search_index.library_changes").scalar()
+
+
+def ensure_schema(engine):
+    """Create the sidecar tables, False when FTS5 is not available"""
+    if _schema_ready:
+        return True
+    if _unavailable or engine is None:
+        return False
+    with engine.connect() as conn:
+        return _ensure_schema(conn)
+
+
+def build_content_match_query(term):
+    """FTS5 query for book content: all words of the term, the last one as a prefix"""
+    tokens = _TOKEN_RE.findall((term or "").lower())
+    if not tokens:
+        return None
+    return " AND ".join('"{}"'.format(token) for token in tokens[:-1]) + \
+        (" AND " if len(tokens) > 1 else "") + '"{}"*'.format(tokens[-1])
+
+
+def content_hits(match_query):
+    """Subquery of the best matching chunk per book: book_id, score (lower is better), snippet, char_offset"""
+    # FTS5 auxiliary functions cannot be aggregated, the best chunk is picked by a window
+    return (text(
+        "SELECT book_id, score, snippet, char_offset FROM ("
+        "SELECT *, row_number() OVER (PARTITION BY book_id ORDER BY score) AS chunk_rank FROM ("
+        "SELECT book_id, bm25(content_fts) AS score, "
+        "snippet(content_fts, 0, :mark_start, :mark_end, '…', :snippet_tokens) AS snippet, char_offset "
+        "FROM search_index.content_fts WHERE content_fts MATCH :content_match)) WHERE chunk_rank = 1")
+        .bindparams(mark_start=_MARK_START, mark_end=_MARK_END, snippet_tokens=SNIPPET_TOKENS,
+                    content_match=match_query)
+        .columns(book_id=Integer, score=Float, snippet=String, char_offset=Integer)
+        .subquery("content_hits"))
+
+
+def render_snippet(snippet):
+    """Escape a snippet from content_hits and turn its match markers into <mark> tags"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def indexed_content_files(conn):
+    """{book_id: (format, mtime, size)} of the files currently in the content index"""
+    return {row[0]: (row[1], row[2], row[3]) for row in conn.exec_driver_sql(
+        "SELECT book_id, format, mtime, size FROM search_index.content_files").fetchall()}
+
+
+def store_book_content(conn, book_id, book_format, mtime, size, chunks):
+    """Replace the indexed content of one book with (char_offset, text) chunks"""
+    drop_book_content(conn, [book_id])
+    if chunks:
+        conn.exec_driver_sql(
+            "INSERT INTO search_index.content_fts (body, book_id, format, char_offset) VALUES (?, ?, ?, ?)",
+            [(chunk, book_id, book_format, offset) for offset, chunk in chunks])
+    conn.exec_driver_sql(
+        "INSERT INTO search_index.content_files (book_id, format, mtime, size, chunks) VALUES (?, ?, ?, ?, ?)",
+        (book_id, book_format, mtime, size, len(chunks)))
+
+
+def drop_book_content(conn, book_ids):
+    for start in range(0, len(book_ids), REINDEX_CHUNK_SIZE):
+        chunk = list(book_ids[start:start + REINDEX_CHUNK_SIZE])
+        placeholders = ",".join("?" * len(chunk))
+        conn.exec_driver_sql(
+            "DELETE FROM search_index.content_fts WHERE book_id IN ({})".format(placeholders), tuple(chunk))
+        conn.exec_driver_sql(
+            "DELETE FROM search_index.content_files WHERE book_id IN ({})".format(placeholders), tuple(chunk))
+
+
+def _sync_names(conn, kind, normalize):
+    # Only rows whose Calibre name differs from the one normalized last time are recomputed
+    changed = conn.exec_driver_sql(
+        "SELECT c.id, c.name FROM calibre.{0} c LEFT JOIN search_index.normalized_names n "
+        "ON n.kind = ? AND n.id = c.id WHERE n.source IS NOT c.name".format(kind), (kind,)).fetchall()
+    if changed:
+        conn.exec_driver_sql(
+            "INSERT OR REPLACE INTO search_index.normalized_names (kind, id, source, name) VALUES (?, ?, ?, ?)",
+            [(kind, name_id, name, normalize(name or "")) for name_id, name in changed])
+    conn.exec_driver_sql(
+        "DELETE FROM search_index.normalized_names WHERE kind = ? AND id NOT IN (SELECT id FROM calibre.{0})"
+        .format(kind), (kind,))
+    return len(changed)
+
+
+def _names_state(conn):
+    return json.dumps([NAMES_VERSION, library_generation(conn)])
+
+
+def refresh_names(engine, writer_engine, normalize):
+    """Bring normalized_names up to date, returns False when name filters have to use lower().
+
+    The names are synced again whenever library_changes recorded a new generation: it reports
+    every added, renamed or removed name. The check runs on the read-only engine, the writer
+    is only taken when the names are behind.
+    """
+    if _unavailable or engine is None or writer_engine is None:
+        return False
+    try:
+        if not ensure_schema(writer_engine):
+            return False
+        with engine.connect() as conn:
+            stored = conn.exec_driver_sql(
+                "SELECT value FROM search_index.index_state WHERE key = 'names_generation'").scalar()
+            if stored == _names_state(conn):
+                return True
+        with writer_engine.connect() as conn:
+            stored = conn.exec_driver_sql(
+                "SELECT value FROM search_index.index_state WHERE key = 'names_generation'").scalar()
+            current = _names_state(conn)
+            if stored == current:
+                return True
+            changed = sum(_sync_names(conn, kind, normalize) for kind in NAME_KINDS)
+            _write_state(conn, {"names_generation": current})
+            conn.commit()
+            if changed:
+                log.debug("Normalized %s changed names", changed)
+        return True
+    except Exception as ex:
+        log.error("Normalized names refresh failed: %s", ex)
+        return False
+
+
+def matching_name_ids(kind, normalized_term):
+    """Selectable of the ids of kind whose normalized name contains the normalized term"""
+    return (select(_names_table.c.id)
+            .where(_names_table.c.kind == kind, func.instr(_names_table.c.name, normalized_term) > 0))
+
+
+def visible_set_key(signature):
+    return hashlib.sha1(json.dumps(signature, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def materialize_visible_books(engine, writer_engine, set_key, fingerprint, book_ids):
+    """Store the ids selected by book_ids as visible set set_key, unless it is stored for fingerprint already.
+
+    Whether it is stored is checked on the read-only engine, the writer is only taken to store it.
+    Sets of an older fingerprint are dropped on the way. Returns False when the sidecar is unusable.
+    """
+    if _unavailable or engine is None or writer_engine is None:
+        return False
+    if _visible_sets.get(set_key) == fingerprint:
+        return True
+    try:
+        if not ensure_schema(writer_engine):
+            return False
+        with engine.connect() as conn:
+            stored = conn.exec_driver_sql(
+                "SELECT fingerprint FROM search_index.visible_sets WHERE set_key = ?", (set_key,)).scalar()
+        if stored != fingerprint:
+            with writer_engine.connect() as conn:
+                stored = conn.exec_driver_sql(
+                    "SELECT fingerprint FROM search_index.visible_sets WHERE set_key = ?", (set_key,)).scalar()
+                if stored != fingerprint:
+                    conn.exec_driver_sql(
+                        "DELETE FROM search_index.visible_books WHERE set_key IN "
+                        "(SELECT set_key FROM search_index.visible_sets WHERE fingerprint != ? OR set_key = ?)",
+                        (fingerprint, set_key))
+                    conn.exec_driver_sql(
+                        "DELETE FROM search_index.visible_sets WHERE fingerprint != ? OR set_key = ?",
+                        (fingerprint, set_key))
+                    conn.execute(_visible_books_table.insert().from_select(
+                        ["set_key", "book_id"], book_ids.with_only_columns(
+                            literal(set_key), *book_ids.selected_columns)))
+                    conn.exec_driver_sql(
+                        "INSERT INTO search_index.visible_sets (set_key, fingerprint) VALUES (?, ?)",
+                        (set_key, fingerprint))
+                    conn.commit()
+        for known in [key for key, value in _visible_sets.items() if value != fingerprint]:
+            _visible_sets.pop(known, None)
+        _visible_sets[set_key] = fingerprint
+        return True
+    except Exception as ex:
+        log.error("Visible books set not stored: %s", ex)
+        return False
+
+
+def visible_book_ids(set_key):
+    """Selectable of the book ids in a set stored by materialize_visible_books"""
+    return select(_visible_books_table.c.book_id).where(_visible_books_table.c.set_key == set_key)
@@ -282,6 +282,7 @@ class WebServer(object):
 
         # prevent irritating log of pending tasks message from asyncio
         logger.get('asyncio').setLevel(logger.logging.CRITICAL)
+        self.close_activity_log()
 
         if not self.restart:
             log.info("Performing shutdown of Calibre-Web Automated")
@@ -298,6 +299,18 @@ class WebServer(object):
         if scheduler:
             scheduler.scheduler.shutdown()
 
+    @staticmethod
+    def close_activity_log():
+        # Write queued user activity events, os.execv on restart skips the atexit handler.
+        # cwa_db is imported both as top level module and from the scripts package
+        for name in ('cwa_db', 'scripts.cwa_db'):
+            module = sys.modules.get(name)
+            if module is not None:
+                try:
+                    module.close_activity_log()
+                except Exception as ex:
+                    log.error("Error writing queued activity events: %s", ex)
+
     def _killServer(self, __, ___):
         self.stop()
 
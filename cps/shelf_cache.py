@@ -0,0 +1,169 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Per-user cache of the shelves and magic shelves listed in the sidebar.
+
+Entries are detached copies (SimpleNamespace of the column values) built once per user. Any
+committed change to shelves, shelf books, magic shelves or hidden magic shelves clears the whole
+cache, as public shelves appear for every user. A build that overlapped a clear is handed out
+but not stored. Each request gets its own copies, so setting book_count or sorting does not
+leak into the cache.
+"""
+
+import threading
+from types import SimpleNamespace
+
+from sqlalchemy import event, func, inspect, or_
+from sqlalchemy.orm import Session
+
+from . import logger, ub
+
+
+log = logger.create()
+
+REQUIRED_TABLES = ('magic_shelf', 'hidden_magic_shelf_templates')
+_WATCHED = (ub.Shelf, ub.BookShelf, ub.MagicShelf, ub.HiddenMagicShelfTemplate)
+
+_lock = threading.Lock()
+_shelves = {}
+_magic_shelves = {}
+# Counts the clears, a build started before a clear may have read the old shelves
+_generation = 0
+missing_tables = []
+
+
+def check_tables(engine):
+    """Verify the magic shelf tables exist, done once at startup"""
+    global missing_tables
+    existing_tables = inspect(engine).get_table_names()
+    missing_tables = [table for table in REQUIRED_TABLES if table not in existing_tables]
+    if missing_tables:
+        log.error("Magic shelf tables missing from database: %s. Run migration to create them.", missing_tables)
+    return not missing_tables
+
+
+def _detach(instance, **extra):
+    values = {key: value for key, value in vars(instance).items() if not key.startswith("_")}
+    values.update(extra)
+    return SimpleNamespace(**values)
+
+
+def _copies(entries):
+    return [SimpleNamespace(**vars(entry)) for entry in entries]
+
+
+def _build_shelves(user_id):
+    counts = dict(ub.session.query(ub.BookShelf.shelf, func.count(ub.BookShelf.id))
+                  .group_by(ub.BookShelf.shelf).all())
+    shelves = ub.session.query(ub.Shelf).filter(
+        or_(ub.Shelf.is_public == 1, ub.Shelf.user_id == user_id)).order_by(ub.Shelf.name).all()
+    return [_detach(shelf, book_count=counts.get(shelf.id, 0)) for shelf in shelves]
+
+
+def _build_magic_shelves(user_id):
+    from . import magic_shelf
+
+    # Get hidden items for this user (both system templates and custom shelves)
+    hidden_items = ub.session.query(
+        ub.HiddenMagicShelfTemplate.template_key,
+        ub.HiddenMagicShelfTemplate.shelf_id
+    ).filter(
+        ub.HiddenMagicShelfTemplate.user_id == user_id
+    ).all()
+    hidden_template_keys = {item.template_key for item in hidden_items if item.template_key}
+    hidden_shelf_ids = {item.shelf_id for item in hidden_items if item.shelf_id}
+
+    # Get user's own shelves + public shelves (will filter hidden ones below)
+    shelves = ub.session.query(ub.MagicShelf).filter(
+        or_(
+            ub.MagicShelf.is_public == 1,
+            ub.MagicShelf.user_id == user_id
+        )
+    ).all()
+    log.debug(f"Found {len(shelves)} total magic shelves for user {user_id} before filtering")
+
+    template_keys = {template['name']: key for key, template in magic_shelf.SYSTEM_SHELF_TEMPLATES.items()}
+    filtered_shelves = []
+    for shelf in shelves:
+        # Skip hidden system templates
+        if shelf.is_system and shelf.user_id == user_id:
+            template_key = template_keys.get(shelf.name)
+            # If template_key not found, this is an orphaned/deprecated system shelf
+            if template_key is None:
+                log.warning(f"System shelf '{shelf.name}' (ID: {shelf.id}) doesn't match any current template - may need migration")
+                # Show it anyway - migration should clean it up on next restart
+                filtered_shelves.append(_detach(shelf))
+                continue
+            if template_key in hidden_template_keys:
+                log.debug(f"Hiding system shelf template '{template_key}' for user {user_id}")
+                continue
+
+        # Skip hidden custom public shelves (not owned by user)
+        if shelf.is_public == 1 and shelf.user_id != user_id and shelf.id in hidden_shelf_ids:
+            log.debug(f"Hiding public shelf '{shelf.name}' (ID: {shelf.id}) for user {user_id}")
+            continue
+
+        filtered_shelves.append(_detach(shelf))
+    log.debug(f"Filtered to {len(filtered_shelves)} visible magic shelves for user {user_id}")
+    return filtered_shelves
+
+
+def _cached(entries, user_id, build):
+    with _lock:
+        cached = entries.get(user_id)
+        generation = _generation
+    if cached is None:
+        cached = build(user_id)
+        with _lock:
+            if generation == _generation:
+                entries[user_id] = cached
+    return _copies(cached)
+
+
+def shelves_for_user(user_id):
+    """Public shelves and shelves of the user ordered by name, with their book_count"""
+    return _cached(_shelves, int(user_id), _build_shelves)
+
+
+def magic_shelves_for_user(user_id):
+    """Public and own magic shelves of the user, without the ones the user has hidden"""
+    return _cached(_magic_shelves, int(user_id), _build_magic_shelves)
+
+
+def clear():
+    global _generation
+    with _lock:
+        _generation += 1
+        _shelves.clear()
+        _magic_shelves.clear()
+
+
+# Changes are noted on flush and bulk statements, the cache is only cleared after the commit so a
+# request running in between cannot cache the state from before the commit again
+@event.listens_for(Session, 'after_flush')
+def _note_flushed_changes(session, flush_context):
+    for change in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(change, _WATCHED):
+            session.info['shelves_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_changes(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and \
+            any(mapper.class_ in _WATCHED for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['shelves_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _clear_after_commit(session):
+    if session.info.pop('shelves_changed', False):
+        clear()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back_changes(session, previous_transaction):
+    session.info.pop('shelves_changed', None)
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import multiprocessing
+import os
+import posixpath
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from flask_babel import lazy_gettext as N_
+from lxml import etree, html as lxml_html
+
+from cps import config, db, logger, search_index
+from cps.services.worker import CalibreTask, STAT_CANCELLED, STAT_ENDED
+
+# Formats with extractable text, the first one a book has gets indexed
+CONTENT_FORMATS = ('EPUB', 'KEPUB', 'FB2', 'PDF', 'TXT')
+CHUNK_CHARS = 2000
+COMMIT_EVERY = 20
+MAX_TEXT_CHARS = 20 * 1024 * 1024
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def get_content_index_worker_count():
+    try:
+        workers = int(os.environ.get('CWA_CONTENT_INDEX_WORKERS', '0') or 0)
+    except ValueError:
+        workers = 0
+    if workers <= 0:
+        workers = min(4, max(1, (os.cpu_count() or 2) // 2))
+    return workers
+
+
+def _html_text(content):
+    try:
+        document = lxml_html.fromstring(content)
+    except (etree.ParserError, ValueError):
+        return ''
+    for element in document.xpath('//script|//style'):
+        element.drop_tree()
+    return document.text_content()
+
+
+def _epub_text(path):
+    with zipfile.ZipFile(path) as archive:
+        container = etree.fromstring(archive.read('META-INF/container.xml'))
+        opf_path = container.xpath('string(//*[local-name()="rootfile"]/@full-path)')
+        opf = etree.fromstring(archive.read(opf_path))
+        opf_dir = posixpath.dirname(opf_path)
+        manifest = {item.get('id'): item.get('href')
+                    for item in opf.xpath('//*[local-name()="manifest"]/*[local-name()="item"]')}
+        parts = []
+        for itemref in opf.xpath('//*[local-name()="spine"]/*[local-name()="itemref"]'):
+            href = manifest.get(itemref.get('idref'))
+            if not href:
+                continue
+            try:
+                parts.append(_html_text(archive.read(posixpath.normpath(posixpath.join(opf_dir, href)))))
+            except KeyError:
+                continue
+        return '\n'.join(parts)
+
+
+def _fb2_text(path):
+    tree = etree.parse(path, etree.XMLParser(recover=True, huge_tree=True, resolve_entities=False))
+    bodies = tree.xpath('//*[local-name()="body"]')
+    return '\n'.join(' '.join(body.itertext()) for body in bodies)
+
+
+def _pdf_text(path):
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def _txt_text(path):
+    with open(path, 'rb') as f:
+        raw = f.read(MAX_TEXT_CHARS)
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('cp1252', errors='replace')
+
+
+def extract_text(path, book_format):
+    """Plain text of a book file, EPUB/KEPUB in spine order"""
+    book_format = book_format.upper()
+    if book_format in ('EPUB', 'KEPUB'):
+        return _epub_text(path)
+    if book_format == 'FB2':
+        return _fb2_text(path)
+    if book_format == 'PDF':
+        return _pdf_text(path)
+    return _txt_text(path)
+
+
+def chunk_text(content, size=CHUNK_CHARS):
+    """Split text into (char_offset, chunk) pieces of about size characters, cut at whitespace"""
+    content = _WHITESPACE_RE.sub(' ', content[:MAX_TEXT_CHARS]).strip()
+    chunks = []
+    start = 0
+    while start < len(content):
+        end = min(len(content), start + size)
+        if end < len(content):
+            cut = content.rfind(' ', start + size // 2, end)
+            end = cut if cut > 0 else end
+        chunks.append((start, content[start:end].strip()))
+        start = end + 1 if end < len(content) and content[end] == ' ' else end
+    return chunks
+
+
+def extract_chunks(path, book_format):
+    """Process pool entry point: text chunks of one book file"""
+    return chunk_text(extract_text(path, book_format))
+
+
+class TaskIndexBookContent(CalibreTask):
+    """Index the text of one format per book into the content search index.
+
+    Files whose mtime and size match the indexed ones are skipped, books that are gone
+    are dropped. Text extraction runs in a process pool, the index is written from here.
+    """
+
+    def __init__(self, book_ids=None, task_message=N_('Indexing book content')):
+        super(TaskIndexBookContent, self).__init__(task_message)
+        self.log = logger.create()
+        self.calibre_db = db.CalibreDB(expire_on_commit=False, init=True)
+        self.book_ids = [int(book_id) for book_id in book_ids] if book_ids else None
+        self.indexed = 0
+
+    @property
+    def name(self):
+        return N_('Index Book Content')
+
+    @property
+    def is_cancellable(self):
+        return True
+
+    def _cancelled(self):
+        return self.stat in (STAT_CANCELLED, STAT_ENDED)
+
+    def _book_files(self):
+        query = (self.calibre_db.session.query(db.Books.id, db.Books.path, db.Data.name, db.Data.format)
+                 .join(db.Data, db.Data.book == db.Books.id)
+                 .filter(db.Data.format.in_(CONTENT_FORMATS)))
+        if self.book_ids is not None:
+            query = query.filter(db.Books.id.in_(self.book_ids))
+        files = {}
+        for book_id, book_path, name, book_format in query:
+            current = files.get(book_id)
+            if current is None or CONTENT_FORMATS.index(book_format) < CONTENT_FORMATS.index(current[1]):
+                files[book_id] = (os.path.join(config.get_book_path(), book_path,
+                                               name + '.' + book_format.lower()), book_format)
+        return files
+
+    def run(self, worker_thread):
+        if config.config_use_google_drive:
+            self._handleSuccess()
+            return
+        engine = self.calibre_db.writer_engine
+        if not search_index.ensure_schema(engine):
+            self._handleError('Full-text search (FTS5) is not available')
+            return
+        try:
+            files = self._book_files()
+            with self.calibre_db.engine.connect() as conn:
+                indexed = search_index.indexed_content_files(conn)
+            if self.book_ids is None:
+                gone = [book_id for book_id in indexed if book_id not in files]
+            else:
+                gone = [book_id for book_id in self.book_ids if book_id in indexed and book_id not in files]
+            if gone:
+                with engine.connect() as conn:
+                    search_index.drop_book_content(conn, gone)
+                    conn.commit()
+
+            jobs = []
+            for book_id, (path, book_format) in files.items():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if indexed.get(book_id) != (book_format, stat.st_mtime, stat.st_size):
+                    jobs.append((book_id, path, book_format, stat.st_mtime, stat.st_size))
+            self.log.info("Content index: %s of %s books need indexing", len(jobs), len(files))
+            if jobs:
+                self._index(engine, jobs)
+            if not self._cancelled():
+                self._handleSuccess()
+        except Exception as ex:
+            self.log.error_or_exception(ex)
+            self._handleError('Content indexing failed: {}'.format(ex))
+        finally:
+            self.calibre_db.session.close()
+
+    def _extracted(self, jobs):
+        """Yield (job, chunks) as extraction finishes, in the pool or inline if the pool is unusable"""
+        remaining = list(jobs)
+        try:
+            pool = ProcessPoolExecutor(max_workers=get_content_index_worker_count(),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, ValueError) as ex:
+            self.log.warning("Content index process pool unavailable (%s), extracting inline", ex)
+            pool = None
+        if pool is not None:
+            with pool:
+                futures = {pool.submit(extract_chunks, job[1], job[2]): job for job in jobs}
+                try:
+                    for future in as_completed(futures):
+                        if self._cancelled():
+                            return
+                        job = futures[future]
+                        try:
+                            chunks = future.result()
+                        except BrokenProcessPool as ex:
+                            self.log.warning("Content index process pool broke (%s), extracting inline", ex)
+                            break
+                        except Exception as ex:
+                            self.log.warning("Cannot extract text of %s: %s", job[1], ex)
+                            chunks = []
+                        remaining.remove(job)
+                        yield job, chunks
+                finally:
+                    for future in futures:
+                        future.cancel()
+        for job in remaining:
+            if self._cancelled():
+                return
+            yield job, self._extract_inline(job)
+
+    def _extract_inline(self, job):
+        try:
+            return extract_chunks(job[1], job[2])
+        except Exception as ex:
+            self.log.warning("Cannot extract text of %s: %s", job[1], ex)
+            return []
+
+    def _index(self, engine, jobs):
+        # Chunks are collected first, the writer connection is only taken to store a full batch
+        batch = []
+        for job, chunks in self._extracted(jobs):
+            batch.append((job, chunks))
+            if len(batch) >= COMMIT_EVERY:
+                self._store(engine, batch, len(jobs))
+                batch = []
+        if batch:
+            self._store(engine, batch, len(jobs))
+
+    def _store(self, engine, batch, total):
+        with engine.connect() as conn:
+            for (book_id, __, book_format, mtime, size), chunks in batch:
+                search_index.store_book_content(conn, book_id, book_format, mtime, size, chunks)
+            conn.commit()
+        self.indexed += len(batch)
+        self.progress = self.indexed / total
+
+    def __str__(self):
+        if self.book_ids is not None:
+            return "Index content of {} books".format(len(self.book_ids))
+        return "Index book content"
@@ -308,6 +308,13 @@ class TaskConvert(CalibreTask):
                             command.append(parsed)
                             quotes.append(quotes_index)
                             quotes_index += 1
+            cover_path = os.path.join(os.path.dirname(file_path), 'cover.jpg') \
+                if config.config_embed_metadata and has_cover else None
+            cache, cache_key = self._conversion_cache_entry(file_path + format_old_ext, format_new_ext,
+                                                            path_tmp_opf, cover_path)
+            if cache_key and cache.get(cache_key, file_path + format_new_ext):
+                log.info("Book id %d - reused cached %s conversion", self.book_id, format_new_ext)
+                return 0, None
             p = process_open(command, quotes, newlines=False)
         except OSError as e:
             return 1, N_("Ebook-converter failed: %(error)s", error=e)
@@ -334,8 +341,37 @@ class TaskConvert(CalibreTask):
             log.debug(ele)
             if not ele.startswith('Traceback') and not ele.startswith('  File'):
                 error_message = N_("Calibre failed with error: %(error)s", error=ele)
+        if check == 0 and cache_key and os.path.isfile(file_path + format_new_ext):
+            cache.put(cache_key, file_path + format_new_ext)
         return check, error_message
 
+    @staticmethod
+    def _conversion_cache_entry(source_path, format_new_ext, path_tmp_opf, cover_path):
+        """Return (cache, key) for this conversion, or (None, None) if the cache is disabled.
+
+        The embedded OPF and cover are part of the key, so editing the book's metadata
+        produces a fresh conversion instead of a stale cached one.
+        """
+        import sys
+        scripts_path = '/app/calibre-web-automated/scripts/'
+        if scripts_path not in sys.path:
+            sys.path.insert(1, scripts_path)
+        try:
+            from conversion_cache import ConversionCache, file_sha256, tool_version
+            from cwa_db import CWA_DB
+            cache = ConversionCache.from_settings(CWA_DB().cwa_settings)
+            if not cache.enabled:
+                return None, None
+            options = {"converter": "ebook-convert",
+                       "calibre": tool_version("calibre"),
+                       "parameters": config.config_calibre or "",
+                       "opf": file_sha256(path_tmp_opf) if path_tmp_opf else None,
+                       "cover": file_sha256(cover_path) if cover_path and os.path.isfile(cover_path) else None}
+            return cache, ConversionCache.make_key(file_sha256(source_path), format_new_ext.lstrip('.'), options)
+        except Exception as e:
+            log.debug("Conversion cache unavailable: %s", e)
+            return None, None
+
     @property
     def name(self):
         return N_("Convert")
@@ -12,14 +12,21 @@ from cps.services.worker import CalibreTask
 
 
 class TaskReconnectDatabase(CalibreTask):
-    def __init__(self, task_message=N_('Reconnecting Calibre database')):
+    """Reconnect the Calibre database if metadata.db was replaced or its schema changed, or always with force"""
+
+    def __init__(self, task_message=N_('Reconnecting Calibre database'), force=False):
         super(TaskReconnectDatabase, self).__init__(task_message)
         self.log = logger.create()
+        self.force = force
         self.calibre_db = db.CalibreDB(expire_on_commit=False, init=True)
 
     def run(self, worker_thread):
-        self.calibre_db.reconnect_db(config, ub.app_DB_path)
-        self.calibre_db.session.close()
+        if self.force:
+            self.calibre_db.reconnect_db(config, ub.app_DB_path)
+        elif not self.calibre_db.reconnect_db_if_changed(config, ub.app_DB_path):
+            self.log.debug("Calibre library unchanged, reconnect skipped")
+        if self.calibre_db.session is not None:
+            self.calibre_db.session.close()
         self._handleSuccess()
 
     @property
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from flask_babel import lazy_gettext as N_
+
+from cps import calibre_db, config, constants, fs, gdriveutils, logger, ub
+from cps.duplicate_index import MAX_INCREMENTAL_BOOK_IDS, _load_books_by_ids, upsert_book_keys
+from cps.services.worker import CalibreTask, WorkerThread, STAT_CANCELLED, STAT_ENDED
+from cps.tasks.thumbnail import get_resize_height, get_resize_width
+try:
+    from wand.image import Image
+    use_IM = True
+except (ImportError, RuntimeError):
+    use_IM = False
+
+# Access CWA DB (scripts path)
+if '/app/calibre-web-automated/scripts/' not in sys.path:
+    sys.path.insert(1, '/app/calibre-web-automated/scripts/')
+from cwa_db import CWA_DB
+
+THUMBNAIL_FORMATS = ('webp', 'jpg')
+
+
+class TaskEnrichBatch(CalibreTask):
+    """Post-ingest enrichment of the books added by one ingest batch.
+
+    Runs once per batch instead of once per book and step:
+    1. Metadata lookup (metadata_helper, including the Hardcover provider) for each book
+    2. One load of all books, then per book a single pass over its files: each format
+       file is opened once for its KOReader partial MD5, the cover once for all thumbnails
+       (rendered into a temporary folder of the thumbnail cache)
+    3. Duplicate index keys for the whole batch
+
+    No database transaction is open while files are read or images rendered: once the
+    pass is done, checksums (metadata.db), thumbnails (app.db) and duplicate keys (cwa.db)
+    are each written in one short transaction. With content search enabled the books are
+    then queued for content indexing.
+    """
+
+    def __init__(self, book_ids, task_message=N_('Enriching imported books')):
+        super(TaskEnrichBatch, self).__init__(task_message)
+        self.log = logger.create()
+        self.book_ids = []
+        for book_id in book_ids or []:
+            try:
+                parsed_book_id = int(book_id)
+            except (TypeError, ValueError):
+                continue
+            if parsed_book_id > 0 and parsed_book_id not in self.book_ids:
+                self.book_ids.append(parsed_book_id)
+        self.cache = fs.FileSystem()
+        self.resolutions = [
+            constants.COVER_THUMBNAIL_SMALL,
+            constants.COVER_THUMBNAIL_MEDIUM,
+            constants.COVER_THUMBNAIL_LARGE
+        ]
+        self.checksums_stored = 0
+        self.thumbnails_generated = 0
+
+    @property
+    def name(self):
+        return N_('Enrich Imported Books')
+
+    @property
+    def is_cancellable(self):
+        return True
+
+    def _cancelled(self):
+        return self.stat in (STAT_CANCELLED, STAT_ENDED)
+
+    def run(self, worker_thread):
+        try:
+            ub.init_db_thread()
+        except Exception:
+            # Non-fatal; continue
+            pass
+
+        app_db_session = ub.get_new_session_instance()
+        try:
+            if not self.book_ids:
+                self._handleSuccess()
+                return
+            cwa_db = CWA_DB()
+            settings = cwa_db.cwa_settings
+
+            self.message = N_('Fetching metadata')
+            self._fetch_metadata(cwa_db, settings)
+            if self._cancelled():
+                return
+
+            calibre_db.ensure_session()
+            # Fresh rows, metadata fetched above is written through its own session
+            calibre_db.session.expire_all()
+            books = _load_books_by_ids(self.book_ids)
+
+            # Files are read and thumbnails rendered first, the databases are only written
+            # at the end, each in one short transaction
+            self.message = N_('Generating checksums and cover thumbnails')
+            existing = self._existing_thumbnails(app_db_session)
+            checksums = []
+            thumbnails = []
+            render_dir = tempfile.mkdtemp(dir=self.cache.get_cache_dir(constants.CACHE_TYPE_THUMBNAILS))
+            try:
+                for index, book in enumerate(books):
+                    if self._cancelled():
+                        return
+                    checksums += self._checksum_formats(cwa_db, book)
+                    thumbnails += self._render_thumbnails(cwa_db, book, existing, render_dir)
+                    self.progress = 0.2 + 0.7 * ((index + 1) / len(books))
+
+                self.message = N_('Storing checksums and cover thumbnails')
+                self._store_checksums(checksums)
+                self._store_thumbnails(app_db_session, thumbnails)
+            finally:
+                shutil.rmtree(render_dir, ignore_errors=True)
+
+            if len(self.book_ids) <= MAX_INCREMENTAL_BOOK_IDS:
+                upsert_book_keys(self.book_ids, settings, books=books)
+
+            if settings.get('content_index_enabled', False):
+                from cps.tasks.content_index import TaskIndexBookContent
+                WorkerThread.add(None, TaskIndexBookContent(self.book_ids), hidden=True)
+
+            self.message = N_('Enriched %(count)s imported books', count=len(books))
+            self.log.info("Batch enrichment done: books=%s checksums=%s thumbnails=%s",
+                          len(books), self.checksums_stored, self.thumbnails_generated)
+            self._handleSuccess()
+        except Exception as ex:
+            app_db_session.rollback()
+            self.log.error("Batch enrichment failed: %s", ex)
+            self._handleError(str(ex))
+        finally:
+            app_db_session.remove()
+
+    def _fetch_metadata(self, cwa_db, settings):
+        if not settings.get('auto_metadata_fetch_enabled', False):
+            return
+        from cps.metadata_helper import fetch_and_apply_metadata
+        for index, book_id in enumerate(self.book_ids):
+            if self._cancelled():
+                return
+            start = time.monotonic()
+            try:
+                fetch_and_apply_metadata(book_id)
+            except Exception as ex:
+                self.log.warning("Metadata fetch failed for book %s: %s", book_id, ex)
+            self._record_timing(cwa_db, book_id, "metadata_fetch", time.monotonic() - start)
+            self.progress = 0.2 * ((index + 1) / len(self.book_ids))
+
+    def _checksum_formats(self, cwa_db, book):
+        from cps.progress_syncing.checksums import calculate_koreader_partial_md5_from_file
+        start = time.monotonic()
+        size = 0
+        checksums = []
+        for data in book.data or []:
+            file_path = os.path.join(config.get_book_path(), book.path, f"{data.name}.{data.format.lower()}")
+            try:
+                with open(file_path, 'rb') as book_file:
+                    checksums.append((book.id, data.format, calculate_koreader_partial_md5_from_file(book_file)))
+                    size += os.fstat(book_file.fileno()).st_size
+            except OSError as ex:
+                self.log.debug("Cannot checksum %s: %s", file_path, ex)
+        self._record_timing(cwa_db, book.id, "checksums", time.monotonic() - start, size)
+        return checksums
+
+    def _store_checksums(self, checksums):
+        from cps.progress_syncing.checksums import CHECKSUM_VERSION, store_checksum
+        if not checksums:
+            return
+        with calibre_db.writer_engine.connect() as connection:
+            for book_id, book_format, checksum in checksums:
+                if store_checksum(book_id, book_format, checksum, CHECKSUM_VERSION,
+                                  db_connection=connection, commit=False):
+                    self.checksums_stored += 1
+            connection.commit()
+
+    def _read_cover(self, book):
+        if config.config_use_google_drive:
+            if not gdriveutils.is_gdrive_ready():
+                return None
+            return gdriveutils.get_cover_via_gdrive(book.path) or None
+        cover_path = os.path.join(config.get_book_path(), book.path, 'cover.jpg')
+        try:
+            with open(cover_path, 'rb') as cover_file:
+                return cover_file.read()
+        except OSError:
+            return None
+
+    def _existing_thumbnails(self, app_db_session):
+        existing = {
+            (thumbnail.entity_id, thumbnail.resolution, thumbnail.format.lower())
+            for thumbnail in app_db_session.query(ub.Thumbnail)
+            .filter(ub.Thumbnail.type == constants.THUMBNAIL_TYPE_COVER)
+            .filter(ub.Thumbnail.entity_id.in_(self.book_ids))
+        }
+        # Only read so far, do not keep the transaction open while rendering
+        app_db_session.rollback()
+        return existing
+
+    def _render_thumbnails(self, cwa_db, book, existing, render_dir):
+        """Render the missing thumbnails of a book into render_dir, returns (book_id, resolution, format, path)"""
+        if not use_IM or not book.has_cover:
+            return []
+        wanted = [(resolution, fmt) for resolution in self.resolutions for fmt in THUMBNAIL_FORMATS
+                  if (book.id, resolution, fmt) not in existing]
+        if not wanted:
+            return []
+
+        start = time.monotonic()
+        content = self._read_cover(book)
+        if not content:
+            return []
+        rendered = []
+        try:
+            with Image(blob=content) as cover:
+                for resolution, fmt in wanted:
+                    path = os.path.join(render_dir, f"{book.id}_{resolution}.{fmt}")
+                    try:
+                        with cover.clone() as img:
+                            height = get_resize_height(resolution)
+                            if img.height > height:
+                                img.resize(width=get_resize_width(resolution, img.width, img.height),
+                                           height=height, filter='lanczos')
+                            img.format = fmt
+                            img.compression_quality = 82
+                            img.save(filename=path)
+                        rendered.append((book.id, resolution, fmt, path))
+                    except Exception as ex:
+                        self.log.debug("Error creating %s thumbnail for book %s: %s", fmt.upper(), book.id, ex)
+        except Exception as ex:
+            self.log.debug("Cannot read cover of book %s: %s", book.id, ex)
+        self._record_timing(cwa_db, book.id, "thumbnails", time.monotonic() - start, len(content))
+        return rendered
+
+    def _store_thumbnails(self, app_db_session, rendered):
+        if not rendered:
+            return
+        thumbnails = []
+        for book_id, resolution, fmt, path in rendered:
+            thumbnail = ub.Thumbnail(type=constants.THUMBNAIL_TYPE_COVER, entity_id=book_id,
+                                     format=fmt, resolution=resolution)
+            app_db_session.add(thumbnail)
+            thumbnails.append((thumbnail, path))
+        try:
+            app_db_session.flush()  # assigns the cache filenames
+            for thumbnail, path in thumbnails:
+                try:
+                    os.replace(path, self.cache.get_cache_file_path(thumbnail.filename,
+                                                                    constants.CACHE_TYPE_THUMBNAILS))
+                    self.thumbnails_generated += 1
+                except OSError as ex:
+                    self.log.debug("Cannot store thumbnail %s: %s", thumbnail.filename, ex)
+                    app_db_session.delete(thumbnail)
+            app_db_session.commit()
+        except Exception:
+            app_db_session.rollback()
+            raise
+
+    def _record_timing(self, cwa_db, book_id, stage, seconds, size=0):
+        try:
+            cwa_db.ingest_timing_add(f"book {book_id}", stage, seconds, size)
+        except Exception as ex:
+            self.log.debug("Could not record %s timing for book %s: %s", stage, book_id, ex)
+
+    def __str__(self):
+        return "Enrich {} imported books".format(len(self.book_ids))
@@ -12,7 +12,7 @@ import re
 from flask_babel import lazy_gettext as N_
 
 from cps.services.worker import CalibreTask, STAT_CANCELLED, STAT_ENDED
-from cps import logger, helper
+from cps import config, logger, helper
 
 log = logger.create()
 
@@ -144,3 +144,45 @@ class TaskEpubFixerRun(CalibreTask):
     @property
     def is_cancellable(self):
         return True
+
+
+class TaskRepairLibraryPermissions(CalibreTask):
+    """Recursive abc:abc ownership sweep over the whole library.
+
+    Imports only fix the folders they wrote to; this is the maintenance run for
+    everything else (e.g. files copied into the library from the host).
+    """
+
+    def __init__(self, task_message=N_(u"Repairing library permissions")):
+        super(TaskRepairLibraryPermissions, self).__init__(task_message)
+        self.library_dir = config.get_book_path()
+        # Differs from library_dir with a split library
+        self.metadata_db = os.path.join(config.config_calibre_dir, "metadata.db") if config.config_calibre_dir else None
+
+    def run(self, worker_thread):
+        import sys
+        sys.path.insert(1, '/app/calibre-web-automated/scripts/')
+        try:
+            from library_permissions import network_share_mode, repair_library_ownership
+        except ImportError as e:
+            self._handleError(f"Library permissions helper unavailable: {e}")
+            return
+
+        if network_share_mode():
+            log.info("NETWORK_SHARE_MODE=true detected; skipping chown of %s", self.library_dir)
+            self._handleSuccess()
+            return
+        try:
+            repair_library_ownership(self.library_dir, self.metadata_db)
+        except Exception as e:
+            self._handleError(f"Failed to set ownership of {self.library_dir}: {e}")
+            return
+        self._handleSuccess()
+
+    @property
+    def name(self):
+        return N_(u"Repair Library Permissions")
+
+    @property
+    def is_cancellable(self):
+        return False
@@ -9,7 +9,9 @@ import atexit
 import os
 import sys
 import sqlite3
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 import itertools
 import uuid
@@ -30,7 +32,7 @@ except ImportError as e:
     except ImportError as e:
         OAuthConsumerMixin = BaseException
         oauth_support = False
-from sqlalchemy import create_engine, exc, exists, event, text
+from sqlalchemy import bindparam, create_engine, exc, exists, event, text
 from sqlalchemy import Column, ForeignKey, Index, UniqueConstraint
 from sqlalchemy import String, Integer, SmallInteger, Boolean, DateTime, Float, JSON
 from sqlalchemy.orm.attributes import flag_modified
@@ -87,6 +89,95 @@ def _run_ddl_with_retry(engine, statements, retries=5, base_delay=0.25):
     return False
 
 
+# Validated login sessions are kept in memory for SESSION_CACHE_TTL seconds, so requests don't query
+# user_session each time. Expiry extensions are collected and written in one batch every
+# SESSION_EXPIRY_FLUSH_INTERVAL seconds, logout and session deletion drop the entries right away.
+SESSION_CACHE_TTL = 300
+SESSION_CACHE_SIZE = 4096
+SESSION_EXPIRY_FLUSH_INTERVAL = 60
+SESSION_LIFETIME = timedelta(days=31)
+
+_session_cache_lock = threading.Lock()
+_valid_sessions = OrderedDict()
+_pending_expiry = dict()
+_last_expiry_flush = time.monotonic()
+
+
+def _session_cache_key(user_id, session_key, random):
+    return str(user_id), session_key or "", random or ""
+
+
+def cached_session_valid(user_id, session_key, random):
+    """True if the session was validated against user_session less than SESSION_CACHE_TTL ago"""
+    key = _session_cache_key(user_id, session_key, random)
+    with _session_cache_lock:
+        entry = _valid_sessions.get(key)
+        if entry is None:
+            return False
+        checked, expiry, row_id, row_session_key = entry
+        if time.monotonic() - checked > SESSION_CACHE_TTL or (expiry or 0) < datetime.now().timestamp():
+            del _valid_sessions[key]
+            return False
+        _valid_sessions.move_to_end(key)
+    _note_session_use(key, expiry, row_id, row_session_key)
+    return True
+
+
+def remember_session(user_id, session_key, random, user_session):
+    """Cache a session validated by the user_session row user_session"""
+    key = _session_cache_key(user_id, session_key, random)
+    with _session_cache_lock:
+        _valid_sessions[key] = (time.monotonic(), user_session.expiry, user_session.id, user_session.session_key)
+        _valid_sessions.move_to_end(key)
+        while len(_valid_sessions) > SESSION_CACHE_SIZE:
+            _valid_sessions.popitem(last=False)
+    _note_session_use(key, user_session.expiry, user_session.id, user_session.session_key)
+
+
+def _note_session_use(key, expiry, row_id, row_session_key):
+    """Queue an expiry extension when the stored expiry is more than a day behind"""
+    new_expiry = int((datetime.now() + SESSION_LIFETIME).timestamp())
+    if new_expiry - (expiry or 0) > 86400:
+        with _session_cache_lock:
+            _pending_expiry[row_id] = (key[0], row_session_key, new_expiry)
+            if key in _valid_sessions:
+                _valid_sessions[key] = (_valid_sessions[key][0], new_expiry, row_id, row_session_key)
+    flush_session_expiry()
+
+
+def forget_user_sessions(user_id, session_key=None):
+    """Drop cached sessions of a user, all of them or only the one with session_key"""
+    def matches(owner, row_session_key):
+        return owner == str(user_id) and (session_key is None or row_session_key == session_key)
+
+    with _session_cache_lock:
+        for key in [key for key, entry in _valid_sessions.items() if matches(key[0], entry[3])]:
+            del _valid_sessions[key]
+        for row_id in [row_id for row_id, pending in _pending_expiry.items() if matches(*pending[:2])]:
+            del _pending_expiry[row_id]
+
+
+def flush_session_expiry(force=False):
+    """Write the queued expiry extensions in one transaction, at most every SESSION_EXPIRY_FLUSH_INTERVAL"""
+    global _last_expiry_flush
+    with _session_cache_lock:
+        if not _pending_expiry or (not force and
+                                   time.monotonic() - _last_expiry_flush < SESSION_EXPIRY_FLUSH_INTERVAL):
+            return
+        pending = [{'b_id': row_id, 'b_expiry': expiry} for row_id, (__, __, expiry) in _pending_expiry.items()]
+        _pending_expiry.clear()
+        _last_expiry_flush = time.monotonic()
+    table = User_Sessions.__table__
+    statement = table.update().where(table.c.id == bindparam('b_id')).values(expiry=bindparam('b_expiry'))
+    try:
+        session.execute(statement, pending)
+        session.commit()
+        log.debug("Extended expiry of %s sessions", len(pending))
+    except (exc.OperationalError, exc.InvalidRequestError) as e:
+        session.rollback()
+        log.error("Extending session expiry failed: %s", e)
+
+
 def signal_store_user_session(object, user):
     store_user_session()
 
@@ -113,6 +204,7 @@ def store_user_session():
 
 
 def delete_user_session(user_id, session_key):
+    forget_user_sessions(user_id, session_key)
     try:
         log.debug("Deleted session_key: " + session_key)
         session.query(User_Sessions).filter(User_Sessions.user_id == user_id,
@@ -124,17 +216,15 @@ def delete_user_session(user_id, session_key):
 
 
 def check_user_session(user_id, session_key, random):
+    if cached_session_valid(user_id, session_key, random):
+        return True
     try:
         found = session.query(User_Sessions).filter(User_Sessions.user_id==user_id,
                                                     User_Sessions.session_key==session_key,
                                                     User_Sessions.random == random,
                                                     ).one_or_none()
         if found is not None:
-            new_expiry = int((datetime.now()  + timedelta(days=31)).timestamp())
-            if new_expiry - found.expiry > 86400:
-                found.expiry = new_expiry
-                session.merge(found)
-                session.commit()
+            remember_session(user_id, session_key, random, found)
         return bool(found)
     except (exc.OperationalError, exc.InvalidRequestError) as e:
         session.rollback()
@@ -150,12 +240,6 @@ def store_ids(result):
         ids.append(element.id)
     searched_ids[current_user.id] = ids
 
-def store_combo_ids(result):
-    ids = list()
-    for element in result:
-        ids.append(element[0].id)
-    searched_ids[current_user.id] = ids
-
 
 class UserBase:
 
@@ -458,6 +542,7 @@ class MagicShelfCache(Base):
     book_ids = Column(JSON)  # Stores [1, 45, 2, ...]
     total_count = Column(Integer)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    library_generation = Column(Integer)  # library_changes generation the ids were computed for
 
     # Composite index for fast lookups
     __table_args__ = (
@@ -1104,6 +1189,13 @@ def migrate_magic_shelf_table(engine, _session):
         _safe_session_rollback(_session, "magic_shelf.kobo_sync")
         _run_ddl_with_retry(engine, "ALTER TABLE magic_shelf ADD column 'kobo_sync' Boolean DEFAULT 0")
 
+    try:
+        _session.query(exists().where(MagicShelfCache.library_generation)).scalar()
+        _session.commit()
+    except exc.OperationalError:
+        _safe_session_rollback(_session, "magic_shelf_cache.library_generation")
+        _run_ddl_with_retry(engine, "ALTER TABLE magic_shelf_cache ADD column 'library_generation' Integer")
+
 
 def migrate_shelf_table(engine, _session):
     try:
@@ -246,15 +246,20 @@ def load_user(user_id, random, session_key):
         if not user:
             return None
             
+        if session_key or random:
+            if ub.cached_session_valid(user.id, session_key, random):
+                return user
         if session_key:
             entry = ub.session.query(ub.User_Sessions).filter(ub.User_Sessions.random == random,
                                                               ub.User_Sessions.session_key == session_key).first()
             if not entry or entry.user_id != user.id:
                 return None
+            ub.remember_session(user.id, session_key, random, entry)
         elif random:
             entry = ub.session.query(ub.User_Sessions).filter(ub.User_Sessions.random == random).first()
             if not entry or entry.user_id != user.id:
                 return None
+            ub.remember_session(user.id, session_key, random, entry)
         return user
     except (ValueError, TypeError) as e:
         log.error("Invalid user_id in load_user: %s", e)
@@ -31,7 +31,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 from . import constants, logger, isoLanguages, services, helper
 from . import db, ub, config, app
-from . import calibre_db, kobo_sync_status
+from . import calibre_db, kobo_sync_status, category_cache
 from .search import render_search_results, render_adv_search_results
 from .gdriveutils import getFileFromEbooksFolder, do_gdrive_download
 from .helper import check_valid_domain, check_email, check_username, \
@@ -330,7 +330,7 @@ def get_matching_tags():
     title_input = request.args.get('title') or ''
     include_tag_inputs = request.args.getlist('include_tag') or ''
     exclude_tag_inputs = request.args.getlist('exclude_tag') or ''
-    q = q.filter(db.Books.authors.any(func.lower(db.Authors.name).ilike("%" + author_input + "%")),
+    q = q.filter(db.Books.authors.any(calibre_db.name_filter(db.Authors, author_input)),
                  func.lower(db.Books.title).ilike("%" + title_input + "%"))
     if len(include_tag_inputs) > 0:
         for tag in include_tag_inputs:
@@ -463,7 +463,8 @@ def render_books_list(data, sort_param, book_id, page):
     elif data == "search":
         term = request.args.get('query', None)
         offset = int(int(config.config_books_per_page) * (page - 1))
-        return render_search_results(term, offset, order, config.config_books_per_page)
+        return render_search_results(term, offset, order, config.config_books_per_page,
+                                     mode=request.args.get('mode'))
     elif data == "advsearch":
         term = json.loads(flask_session.get('query', '{}'))
         offset = int(int(config.config_books_per_page) * (page - 1))
@@ -1540,10 +1541,11 @@ def author_list():
         else:
             order = db.Authors.sort.asc()
             order_no = 1
-        entries = calibre_db.session.query(db.Authors, func.count('books_authors_link.book').label('count')) \
-            .join(db.books_authors_link).join(db.Books).filter(calibre_db.common_filters()) \
-            .group_by(text('books_authors_link.author')).order_by(order).all()
-        char_list = query_char_list(db.Authors.sort, db.books_authors_link)
+        entries, char_list = category_cache.get(('author', order_no), lambda: (
+            calibre_db.session.query(db.Authors, func.count('books_authors_link.book').label('count'))
+            .join(db.books_authors_link).join(db.Books).filter(calibre_db.common_filters())
+            .group_by(text('books_authors_link.author')).order_by(order).all(),
+            query_char_list(db.Authors.sort, db.books_authors_link)))
         return render_title_template('list.html', entries=entries, folder='web.books_list', charlist=char_list,
                                      title="Authors", page="authorlist", data='author', order=order_no)
     else:
@@ -1579,20 +1581,22 @@ def publisher_list():
         order_no = 1 if order_dir != 'desc' else 0
         order = db.Publishers.name.desc() if order_dir == 'desc' else db.Publishers.name.asc()
 
-        entries_query = (calibre_db.session.query(db.Publishers, func.count(db.books_publishers_link.c.book).label('count'))
-                         .join(db.books_publishers_link, db.Publishers.id == db.books_publishers_link.c.publisher)
-                         .join(db.Books, db.books_publishers_link.c.book == db.Books.id)
-                         .filter(calibre_db.common_filters())
-                         .group_by(db.Publishers.id)
-                         .order_by(order))
-
-        entries = entries_query.all()
-
-        no_publisher_count = (calibre_db.session.query(func.count(db.Books.id))
-                              .outerjoin(db.books_publishers_link)
-                              .filter(db.books_publishers_link.c.book == None)
-                              .filter(calibre_db.common_filters())
-                              .scalar())
+        def publishers():
+            entries = (calibre_db.session.query(db.Publishers, func.count(db.books_publishers_link.c.book).label('count'))
+                       .join(db.books_publishers_link, db.Publishers.id == db.books_publishers_link.c.publisher)
+                       .join(db.Books, db.books_publishers_link.c.book == db.Books.id)
+                       .filter(calibre_db.common_filters())
+                       .group_by(db.Publishers.id)
+                       .order_by(order)).all()
+            no_publisher_count = (calibre_db.session.query(func.count(db.Books.id))
+                                  .outerjoin(db.books_publishers_link)
+                                  .filter(db.books_publishers_link.c.book == None)
+                                  .filter(calibre_db.common_filters())
+                                  .scalar())
+            return entries, no_publisher_count
+
+        entries, no_publisher_count = category_cache.get(('publisher', order_no), publishers)
+        entries = list(entries)
 
         if no_publisher_count:
             # Manually create a "None" category entry
@@ -1622,16 +1626,18 @@ def series_list():
         else:
             order = db.Series.sort.asc()
             order_no = 1
-        char_list = query_char_list(db.Series.sort, db.books_series_link)
+        char_list = category_cache.get('series_chars', lambda: query_char_list(db.Series.sort, db.books_series_link))
         if current_user.get_view_property('series', 'series_view') == 'list':
-            entries = calibre_db.session.query(db.Series, func.count('books_series_link.book').label('count')) \
-                .join(db.books_series_link).join(db.Books).filter(calibre_db.common_filters()) \
-                .group_by(text('books_series_link.series')).order_by(order).all()
-            no_series_count = (calibre_db.session.query(db.Books)
-                            .outerjoin(db.books_series_link).outerjoin(db.Series)
-                            .filter(db.Series.name == None)
-                            .filter(calibre_db.common_filters())
-                            .count())
+            entries, no_series_count = category_cache.get(('series', order_no), lambda: (
+                calibre_db.session.query(db.Series, func.count('books_series_link.book').label('count'))
+                .join(db.books_series_link).join(db.Books).filter(calibre_db.common_filters())
+                .group_by(text('books_series_link.series')).order_by(order).all(),
+                calibre_db.session.query(db.Books)
+                .outerjoin(db.books_series_link).outerjoin(db.Series)
+                .filter(db.Series.name == None)
+                .filter(calibre_db.common_filters())
+                .count()))
+            entries = list(entries)
             if no_series_count:
                 entries.append([db.Category(_("None"), "-1"), no_series_count])
             entries = sorted(entries, key=lambda x: x[0].name.lower(), reverse=not order_no)
@@ -1665,23 +1671,25 @@ def ratings_list():
         order_no = 1 if order_dir != 'desc' else 0
         order = db.Ratings.rating.desc() if order_dir == 'desc' else db.Ratings.rating.asc()
 
-        entries_query = (calibre_db.session.query(db.Ratings, func.count(db.books_ratings_link.c.book).label('count'),
-                                           (db.Ratings.rating / 2).label('name'))
-                   .join(db.books_ratings_link, db.Ratings.id == db.books_ratings_link.c.rating)
-                   .join(db.Books, db.books_ratings_link.c.book == db.Books.id)
-                   .filter(calibre_db.common_filters())
-                   .filter(db.Ratings.rating > 0)
-                   .group_by(db.Ratings.id)
-                   .order_by(order))
-
-        entries = entries_query.all()
-
-        no_rating_count = (calibre_db.session.query(func.count(db.Books.id))
-                           .outerjoin(db.books_ratings_link, db.Books.id == db.books_ratings_link.c.book)
-                           .outerjoin(db.Ratings, db.books_ratings_link.c.rating == db.Ratings.id)
-                           .filter(calibre_db.common_filters())
-                           .filter(or_(db.books_ratings_link.c.rating == None, db.Ratings.rating == 0))
-                           .scalar())
+        def ratings():
+            entries = (calibre_db.session.query(db.Ratings, func.count(db.books_ratings_link.c.book).label('count'),
+                                                (db.Ratings.rating / 2).label('name'))
+                       .join(db.books_ratings_link, db.Ratings.id == db.books_ratings_link.c.rating)
+                       .join(db.Books, db.books_ratings_link.c.book == db.Books.id)
+                       .filter(calibre_db.common_filters())
+                       .filter(db.Ratings.rating > 0)
+                       .group_by(db.Ratings.id)
+                       .order_by(order)).all()
+            no_rating_count = (calibre_db.session.query(func.count(db.Books.id))
+                               .outerjoin(db.books_ratings_link, db.Books.id == db.books_ratings_link.c.book)
+                               .outerjoin(db.Ratings, db.books_ratings_link.c.rating == db.Ratings.id)
+                               .filter(calibre_db.common_filters())
+                               .filter(or_(db.books_ratings_link.c.rating == None, db.Ratings.rating == 0))
+                               .scalar())
+            return entries, no_rating_count
+
+        entries, no_rating_count = category_cache.get(('ratings', order_no), ratings)
+        entries = list(entries)
 
         if no_rating_count:
             none_rating_entry = (db.Category(_("None"), "-1"), no_rating_count, 0)
@@ -1706,15 +1714,17 @@ def formats_list():
         else:
             order = db.Data.format.asc()
             order_no = 1
-        entries = calibre_db.session.query(db.Data,
-                                           func.count('data.book').label('count'),
-                                           db.Data.format.label('format')) \
-            .join(db.Books).filter(calibre_db.common_filters()) \
-            .group_by(db.Data.format).order_by(order).all()
-        no_format_count = (calibre_db.session.query(db.Books).outerjoin(db.Data)
-                           .filter(db.Data.format == None)
-                           .filter(calibre_db.common_filters())
-                           .count())
+        entries, no_format_count = category_cache.get(('formats', order_no), lambda: (
+            calibre_db.session.query(db.Data,
+                                     func.count('data.book').label('count'),
+                                     db.Data.format.label('format'))
+            .join(db.Books).filter(calibre_db.common_filters())
+            .group_by(db.Data.format).order_by(order).all(),
+            calibre_db.session.query(db.Books).outerjoin(db.Data)
+            .filter(db.Data.format == None)
+            .filter(calibre_db.common_filters())
+            .count()))
+        entries = list(entries)
         if no_format_count:
             entries.append([db.Category(_("None"), "-1"), no_format_count])
         return render_title_template('list.html', entries=entries, folder='web.books_list', charlist=list(),
@@ -1728,7 +1738,8 @@ def formats_list():
 def language_overview():
     if current_user.check_visibility(constants.SIDEBAR_LANGUAGE) and current_user.filter_language() == "all":
         order_no = 0 if current_user.get_view_property('language', 'dir') == 'desc' else 1
-        languages = calibre_db.speaking_language(reverse_order=not order_no, with_count=True)
+        languages = category_cache.get(
+            ('language', order_no), lambda: calibre_db.speaking_language(reverse_order=not order_no, with_count=True))
         char_list = generate_char_list(languages)
         return render_title_template('list.html', entries=languages, folder='web.books_list', charlist=char_list,
                                      title=_("Languages"), page="langlist", data="language", order=order_no)
@@ -1746,14 +1757,16 @@ def category_list():
         else:
             order = db.Tags.name.asc()
             order_no = 1
-        entries = calibre_db.session.query(db.Tags, func.count('books_tags_link.book').label('count')) \
-            .join(db.books_tags_link).join(db.Books).order_by(order).filter(calibre_db.common_filters()) \
-            .group_by(db.Tags.id).all()
-        no_tag_count = (calibre_db.session.query(db.Books)
-                         .outerjoin(db.books_tags_link).outerjoin(db.Tags)
-                        .filter(db.Tags.name == None)
-                         .filter(calibre_db.common_filters())
-                         .count())
+        entries, no_tag_count = category_cache.get(('category', order_no), lambda: (
+            calibre_db.session.query(db.Tags, func.count('books_tags_link.book').label('count'))
+            .join(db.books_tags_link).join(db.Books).order_by(order).filter(calibre_db.common_filters())
+            .group_by(db.Tags.id).all(),
+            calibre_db.session.query(db.Books)
+            .outerjoin(db.books_tags_link).outerjoin(db.Tags)
+            .filter(db.Tags.name == None)
+            .filter(calibre_db.common_filters())
+            .count()))
+        entries = list(entries)
         if no_tag_count:
             entries.append([db.Category(_("None"), "-1"), no_tag_count])
         entries = sorted(entries, key=lambda x: x[0].name.lower(), reverse=not order_no)
@@ -0,0 +1,137 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""On-disk cache of conversion outputs shared by the ingest processor and the web convert task.
+
+Entries are keyed by the SHA-256 of the source file, the target format and every
+option that changes the converter's output (tool versions, extra arguments,
+embedded metadata...).  The cache is bounded by a size budget and evicts the
+least recently used entries first; a hit refreshes the entry's mtime.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+DEFAULT_CACHE_DIR = "/config/conversion_cache"
+# Same as the conversion_cache_max_mb default in cwa_schema.sql
+DEFAULT_MAX_MB = 1024
+TOOL_RELEASE_FILES = {
+    "calibre": "/CALIBRE_RELEASE",
+    "kepubify": "/app/KEPUBIFY_RELEASE",
+}
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tool_version(tool: str) -> str:
+    try:
+        with open(TOOL_RELEASE_FILES[tool], "r") as f:
+            return f.read().strip()
+    except (KeyError, OSError):
+        return "unknown"
+
+
+def get_cache_dir() -> str:
+    return os.environ.get("CWA_CONVERSION_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+class ConversionCache:
+    def __init__(self, max_mb: int, cache_dir: str | None = None):
+        self.max_bytes = max(0, int(max_mb or 0)) * 1024 * 1024
+        self.cache_dir = cache_dir or get_cache_dir()
+
+    @classmethod
+    def from_settings(cls, cwa_settings: dict) -> "ConversionCache":
+        return cls(cwa_settings.get("conversion_cache_max_mb", DEFAULT_MAX_MB))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(source_sha256: str, target_format: str, options) -> str:
+        payload = json.dumps([source_sha256, str(target_format).lower(), options], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str, dest_path: str) -> bool:
+        """Copy a cached output to dest_path.  Returns False on a miss."""
+        if not self.enabled:
+            return False
+        entry = self._entry_path(key)
+        try:
+            shutil.copyfile(entry, dest_path)
+            os.utime(entry)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"[conversion-cache] WARN: Could not read cache entry {key}: {e}", flush=True)
+            return False
+
+    def put(self, key: str, src_path: str) -> None:
+        """Store src_path under key, then evict down to the size budget."""
+        if not self.enabled:
+            return
+        try:
+            if os.path.getsize(src_path) > self.max_bytes:
+                return
+            entry = self._entry_path(key)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            # Copy next to the entry and rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(entry))
+            try:
+                with os.fdopen(fd, "wb") as out, open(src_path, "rb") as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+                os.replace(tmp_path, entry)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"[conversion-cache] WARN: Could not store cache entry {key}: {e}", flush=True)
+            return
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits its budget.  Returns entries removed."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
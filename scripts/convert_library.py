@@ -22,6 +22,7 @@ import pwd
 import grp
 
 from cwa_db import CWA_DB
+from library_permissions import fix_touched_ownership, network_share_mode
 from kindle_epub_fixer import EPUBFixer
 
 ### Global Variables
@@ -457,7 +458,7 @@ class LibraryConverter:
                 self.current_book += 1
                 continue
 
-            self.set_library_permissions()
+            self.set_library_permissions(book_id)
             self.empty_tmp_con_dir()
             self.current_book += 1
             continue
@@ -545,16 +546,20 @@ class LibraryConverter:
             print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) An error occurred while emptying {self.tmp_conversion_dir}.")
 
 
-    def set_library_permissions(self):
+    def set_library_permissions(self, book_id):
+        """Fix ownership of metadata.db and the converted book's folder only (not the whole library)."""
+        if network_share_mode():
+            print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) NETWORK_SHARE_MODE=true detected; skipping chown of {self.library_dir}")
+            return
+        metadata_db = self.calibre_env.get('CALIBRE_OVERRIDE_DATABASE_PATH') or os.path.join(self.library_dir, "metadata.db")
         try:
-            nsm = os.getenv("NETWORK_SHARE_MODE", "false").strip().lower() in ("1", "true", "yes", "on")
-            if not nsm:
-                subprocess.run(["chown", "-R", "abc:abc", self.library_dir], check=True)
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Successfully set ownership of new files in {self.library_dir} to abc:abc.")
+            _, failed = fix_touched_ownership(self.library_dir, metadata_db, [book_id])
+            if failed:
+                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Could not set ownership of {failed} path(s) in {self.library_dir} to abc:abc.")
             else:
-                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) NETWORK_SHARE_MODE=true detected; skipping chown of {self.library_dir}")
-        except subprocess.CalledProcessError as e:
-            print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) An error occurred while attempting to recursively set ownership of {self.library_dir} to abc:abc. See the following error:\n{e}")
+                print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) Successfully set ownership of new files in {self.library_dir} to abc:abc.")
+        except Exception as e:
+            print_and_log(f"[convert-library]: ({self.current_book}/{len(self.to_convert)}) An error occurred while attempting to set ownership of new files in {self.library_dir} to abc:abc. See the following error:\n{e}")
 
 
 def main():
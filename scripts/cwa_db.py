@@ -4,16 +4,213 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 # See CONTRIBUTORS for full list of authors.
 
+import atexit
+import copy
+import math
+import queue
 import sqlite3
 import sys
+import threading
 import os
+import time
+import uuid
 from sqlite3 import Error as sqlError
 import re
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from tabulate import tabulate
 
 
+# Schema reconciliation runs once per process and database file, connections are kept
+# per thread and the parsed settings are shared until update_cwa_settings() writes.
+# Other processes (ingest, scripts) may also write settings, hence the snapshot max age.
+SETTINGS_MAX_AGE = 30
+
+_state_lock = threading.Lock()
+_reconciled = set()
+_schema_cache = {}
+_settings_snapshots = {}
+_local = threading.local()
+
+
+def _database_key(db_file: str):
+    try:
+        return db_file, os.stat(db_file).st_ino
+    except OSError:
+        return db_file, None
+
+
+def invalidate_settings_snapshot(db_file: str | None = None) -> None:
+    """Drops the shared settings snapshot, so the next CWA_DB() reads the settings again"""
+    with _state_lock:
+        if db_file is None:
+            _settings_snapshots.clear()
+        else:
+            _settings_snapshots.pop(db_file, None)
+
+
+# User activity rows are written by a background thread in batches, one transaction per
+# batch instead of a commit per logged event on the request thread
+ACTIVITY_QUEUE_SIZE = 10000
+ACTIVITY_BATCH_SIZE = 200
+ACTIVITY_FLUSH_INTERVAL = 0.5
+ACTIVITY_PUT_TIMEOUT = 0.05
+
+_FLUSH = object()
+_STOP = object()
+
+
+class ActivitySink:
+    """Bounded queue of cwa_user_activity rows with a background flusher.
+
+    When the queue stays full for ACTIVITY_PUT_TIMEOUT the row is dropped and counted,
+    so a stalled database never blocks request threads for long.
+    """
+
+    def __init__(self, db_file: str, max_queue: int = ACTIVITY_QUEUE_SIZE,
+                 batch_size: int = ACTIVITY_BATCH_SIZE, interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "errors": 0}
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="cwa-activity-sink", daemon=True)
+                self._thread.start()
+
+    def put(self, row: tuple) -> bool:
+        """Queues one activity row, returns False when it had to be dropped"""
+        self._start()
+        try:
+            self._queue.put(row, timeout=ACTIVITY_PUT_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+                dropped = self.stats["dropped"]
+            if dropped == 1 or dropped % 1000 == 0:
+                print(f"[cwa-db] Activity log queue full, {dropped} events dropped so far", flush=True)
+            return False
+        with self._lock:
+            self.stats["queued"] += 1
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        con = None
+        try:
+            con = sqlite3.connect(self.db_file, timeout=30)
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.interval)
+                except queue.Empty:
+                    continue
+                batch, done = [], [item]
+                deadline = time.monotonic() + self.interval
+                while item is not _FLUSH and item is not _STOP:
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    done.append(item)
+                self._write(con, batch)
+                for __ in done:
+                    self._queue.task_done()
+                if item is _STOP:
+                    return
+        except sqlError as e:
+            print(f"[cwa-db] Activity log writer stopped: {e}", flush=True)
+        finally:
+            if con is not None:
+                con.close()
+
+    def _write(self, con: sqlite3.Connection, batch: list[tuple]) -> None:
+        if not batch:
+            return
+        try:
+            with con:
+                con.executemany("""
+                    INSERT INTO cwa_user_activity (user_id, user_name, event_type, item_id, item_title, extra_data, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+            with self._lock:
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+        except sqlError as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                self.stats["dropped"] += len(batch)
+            print(f"[cwa-db] Error writing {len(batch)} activity events: {e}", flush=True)
+
+    def _wait(self, marker, timeout: float) -> bool:
+        thread = self._thread
+        if (thread is None or not thread.is_alive()) and self._queue.unfinished_tasks == 0:
+            return True
+        self._start()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._queue.all_tasks_done.wait(remaining):
+                    return False
+        return True
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Waits until everything queued so far is written"""
+        return self._wait(_FLUSH, timeout)
+
+    def close(self, timeout: float = 10) -> bool:
+        """Writes the queued rows and stops the flusher thread"""
+        flushed = self._wait(_STOP, timeout)
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return flushed
+
+
+_activity_sinks = {}
+
+
+def activity_sink(db_file: str) -> ActivitySink:
+    with _state_lock:
+        sink = _activity_sinks.get(db_file)
+        if sink is None:
+            sink = _activity_sinks[db_file] = ActivitySink(db_file)
+    return sink
+
+
+def flush_activity_log(timeout: float = 10) -> bool:
+    """Writes all queued activity events, returns False if that did not finish in time"""
+    with _state_lock:
+        sinks = list(_activity_sinks.values())
+    return all([sink.flush(timeout) for sink in sinks])
+
+
+def close_activity_log(timeout: float = 10) -> None:
+    """Flushes and stops the activity writers, used on shutdown"""
+    with _state_lock:
+        sinks = list(_activity_sinks.values())
+    for sink in sinks:
+        sink.close(timeout)
+
+
+atexit.register(close_activity_log)
+
+
 class CWA_DB:
     def __init__(self, verbose=False):
         self.verbose = verbose
@@ -34,31 +231,64 @@ class CWA_DB:
             "cwa_duplicate_cache",
             "cwa_duplicate_book_keys",
             "cwa_duplicate_resolutions",
+            "cwa_ingest_timings",
+            "cwa_ingest_jobs",
         ]
-        self.tables, self.schema = self.make_tables()
+        db_key = _database_key(self.db_path + self.db_file)
+        with _state_lock:
+            if db_key not in _reconciled:
+                self.tables, self.schema = self.make_tables()
+                _schema_cache[self.schema_path] = (self.tables, self.schema, self.get_cwa_default_settings())
+                self.cwa_default_settings = dict(_schema_cache[self.schema_path][2])
+                self.ensure_settings_schema_match()
+                self.match_stat_table_columns_with_schema()
+                self.ensure_scheduled_jobs_schema()
+                self.set_default_settings()
+                _reconciled.add(db_key)
+                _settings_snapshots.pop(self.db_path + self.db_file, None)
+            else:
+                self.tables, self.schema, default_settings = _schema_cache[self.schema_path]
+                self.cwa_default_settings = dict(default_settings)
+        self.cwa_settings = self._settings_snapshot()
 
-        self.cwa_default_settings = self.get_cwa_default_settings()
-        self.ensure_settings_schema_match()
-        self.match_stat_table_columns_with_schema()
-        self.ensure_scheduled_jobs_schema()
-        self.set_default_settings()
-        self.cwa_settings = self.get_cwa_settings()
+
+    def _settings_snapshot(self) -> dict:
+        """Copy of the shared settings snapshot, read from the database when missing or too old"""
+        db_file = self.db_path + self.db_file
+        with _state_lock:
+            snapshot = _settings_snapshots.get(db_file)
+        if snapshot is None or time.monotonic() - snapshot[0] > SETTINGS_MAX_AGE:
+            snapshot = (time.monotonic(), self.get_cwa_settings())
+            with _state_lock:
+                _settings_snapshots[db_file] = snapshot
+        return copy.deepcopy(snapshot[1])
 
 
     def connect_to_db(self) -> tuple[sqlite3.Connection, sqlite3.Cursor] | None:
-        """Establishes connection with the db or makes one if one doesn't already exist"""
-        con = None
-        cur = None
-        try:
-            con = sqlite3.connect(self.db_path + self.db_file, timeout=30)
-        except sqlError as e:
-            print(f"[cwa-db]: The following error occurred while trying to connect to the CWA Enforcement DB: {e}")
-            sys.exit(0)
-        if con:
-            cur = con.cursor()
+        """Returns this thread's connection with the db (made on first use, the db is created if it
+        doesn't already exist) and a cursor of its own for this instance"""
+        db_file = self.db_path + self.db_file
+        connections = getattr(_local, "connections", None)
+        if connections is None or _local.pid != os.getpid():
+            connections = _local.connections = {}
+            _local.pid = os.getpid()
+        con = connections.get(db_file)
+        if con is not None:
+            try:
+                con.total_changes
+            except sqlite3.ProgrammingError:
+                # Closed by a previous user of this thread's connection
+                con = None
+        if con is None:
+            try:
+                con = sqlite3.connect(db_file, timeout=30)
+            except sqlError as e:
+                print(f"[cwa-db]: The following error occurred while trying to connect to the CWA Enforcement DB: {e}")
+                sys.exit(0)
+            connections[db_file] = con
             if self.verbose:
                 print("[cwa-db]: Connection with the CWA Enforcement DB Successful!")
-            return con, cur
+        return con, con.cursor()
 
 
     def make_tables(self) -> tuple[list[str], list[str]]:
@@ -453,6 +683,7 @@ class CWA_DB:
             for setting in self.cwa_default_settings:
                 self.cur.execute(f"UPDATE cwa_settings SET {setting}=?;", (self.cwa_default_settings[setting],))
                 self.con.commit()
+            invalidate_settings_snapshot(self.db_path + self.db_file)
             print("[cwa-db] CWA Default Settings successfully applied!")
             return
         try:
@@ -511,6 +742,9 @@ class CWA_DB:
             'archived_cleanup_schedule_hour': 3,
             'ingest_stale_temp_minutes': 120,
             'ingest_stale_temp_interval': 600,
+            'ingest_conversion_workers': 0,
+            'conversion_cache_max_mb': 1024,
+            'ingest_skip_identical_files': 1,
             'cover_download_max_mb': 15
         }
         
@@ -520,7 +754,7 @@ class CWA_DB:
                 cwa_settings[key] = default_value
 
         # Define which settings should remain as integers (not converted to boolean)
-        integer_settings = ['ingest_timeout_minutes', 'ingest_stale_temp_minutes', 'ingest_stale_temp_interval', 'auto_send_delay_minutes', 'hardcover_auto_fetch_batch_size', 'hardcover_auto_fetch_schedule_hour', 'duplicate_scan_hour', 'duplicate_scan_chunk_size', 'duplicate_scan_debounce_seconds', 'duplicate_auto_resolve_cooldown_minutes', 'archived_cleanup_schedule_hour', 'cover_download_max_mb']
+        integer_settings = ['ingest_timeout_minutes', 'ingest_stale_temp_minutes', 'ingest_stale_temp_interval', 'ingest_conversion_workers', 'conversion_cache_max_mb', 'auto_send_delay_minutes', 'hardcover_auto_fetch_batch_size', 'hardcover_auto_fetch_schedule_hour', 'duplicate_scan_hour', 'duplicate_scan_chunk_size', 'duplicate_scan_debounce_seconds', 'duplicate_auto_resolve_cooldown_minutes', 'archived_cleanup_schedule_hour', 'cover_download_max_mb']
         
         # Define which settings should remain as floats (not converted to boolean)
         float_settings = ['hardcover_auto_fetch_min_confidence', 'hardcover_auto_fetch_rate_limit']
@@ -556,7 +790,8 @@ class CWA_DB:
                 # Continue to next setting instead of failing completely
                 continue
         self.set_default_settings()
-        self.cwa_settings = self.get_cwa_settings()
+        invalidate_settings_snapshot(self.db_path + self.db_file)
+        self.cwa_settings = self._settings_snapshot()
 
 
     def enforce_add_entry_from_log(self, log_info: dict, trigger_type: str = "auto -log"):
@@ -672,6 +907,29 @@ class CWA_DB:
         self.con.commit()
 
 
+    def ingest_hash_lookup(self, sha256: str, size: int) -> int | None:
+        """Book id previously imported from a file with this content, if any."""
+        row = self.cur.execute("SELECT book_id FROM cwa_ingest_hashes WHERE sha256 = ? AND size = ?;", (sha256, int(size))).fetchone()
+        return int(row[0]) if row else None
+
+
+    def ingest_hash_add(self, sha256: str, size: int, book_id: int, filename: str) -> None:
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cur.execute("INSERT OR REPLACE INTO cwa_ingest_hashes(sha256, size, book_id, filename, timestamp) VALUES (?, ?, ?, ?, ?);", (sha256, int(size), int(book_id), filename, timestamp))
+        self.con.commit()
+
+
+    def ingest_hash_remove(self, sha256: str, size: int) -> None:
+        self.cur.execute("DELETE FROM cwa_ingest_hashes WHERE sha256 = ? AND size = ?;", (sha256, int(size)))
+        self.con.commit()
+
+
+    def ingest_timing_add(self, filename: str, stage: str, seconds: float, size_bytes: int = 0) -> None:
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cur.execute("INSERT INTO cwa_ingest_timings(timestamp, filename, stage, seconds, size_bytes) VALUES (?, ?, ?, ?, ?);", (timestamp, filename, stage, float(seconds), int(size_bytes or 0)))
+        self.con.commit()
+
+
     def conversion_add_entry(self, filename, original_format, end_format, original_backed_up): # TODO Add end_format - 22.11.2024 - Done?
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         self.cur.execute("INSERT INTO cwa_conversions(timestamp, filename, original_format, end_format, original_backed_up) VALUES (?, ?, ?, ?, ?);", (timestamp, filename, original_format, end_format, original_backed_up))
@@ -695,6 +953,125 @@ class CWA_DB:
 
         return totals
 
+    # ==============================
+    # Ingest Job Queue
+    # ==============================
+
+    def ingest_job_enqueue(self, path: str, priority: int = 0, source: str = 'watcher', sha256: str | None = None) -> int:
+        """Queue a file for ingest and return its job id.
+
+        A queued or running job for the same path and content is reused (keeping the
+        higher of the two priorities) instead of adding a duplicate.
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = self.cur.execute(
+            "SELECT id, state, sha256 FROM cwa_ingest_jobs WHERE path = ? AND state IN ('queued', 'leased') ORDER BY id DESC",
+            (path,)
+        ).fetchall()
+        for job_id, state, job_sha256 in rows:
+            same_content = job_sha256 is None or sha256 is None or job_sha256 == sha256
+            if state == 'queued' or same_content:
+                # A queued job picks up the current file content when it runs
+                self.cur.execute(
+                    "UPDATE cwa_ingest_jobs SET priority = MAX(priority, ?), sha256 = COALESCE(?, sha256), updated_at = ? WHERE id = ?",
+                    (int(priority), sha256 if state == 'queued' else None, now, job_id)
+                )
+                self.con.commit()
+                return int(job_id)
+        self.cur.execute(
+            "INSERT INTO cwa_ingest_jobs(path, sha256, priority, source, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, sha256, int(priority), source, now, now)
+        )
+        self.con.commit()
+        return int(self.cur.lastrowid)
+
+    def ingest_job_lease(self, lease_seconds: float) -> dict | None:
+        """Claim the next runnable job (highest priority, then oldest) or return None.
+
+        Leases that ran past their expiry are handed out again.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cur.execute(
+            "UPDATE cwa_ingest_jobs SET state = 'queued', updated_at = ? WHERE state = 'leased' AND lease_expires < ?",
+            (stamp, now)
+        )
+        self.cur.execute(
+            """
+            UPDATE cwa_ingest_jobs
+            SET state = 'leased', lease_token = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+            WHERE id = (SELECT id FROM cwa_ingest_jobs WHERE state = 'queued' AND not_before <= ?
+                        ORDER BY priority DESC, id LIMIT 1)
+            """,
+            (token, now + lease_seconds, stamp, now)
+        )
+        self.con.commit()
+        row = self.cur.execute(
+            "SELECT id, path, sha256, priority, source, attempts, deferrals FROM cwa_ingest_jobs WHERE lease_token = ? AND state = 'leased'",
+            (token,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('id', 'path', 'sha256', 'priority', 'source', 'attempts', 'deferrals'), row))
+
+    def ingest_job_finish(self, job_id: int, exit_code: int, error: str = '') -> None:
+        state = 'done' if int(exit_code) == 0 else 'failed'
+        self.cur.execute(
+            "UPDATE cwa_ingest_jobs SET state = ?, exit_code = ?, last_error = ?, lease_token = '', updated_at = ? WHERE id = ?",
+            (state, int(exit_code), error, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), int(job_id))
+        )
+        self.con.commit()
+
+    def ingest_job_defer(self, job_id: int, delay_seconds: float, error: str = '') -> None:
+        """Put a leased job that could not run yet back in the queue, not to be leased again for delay_seconds."""
+        self.cur.execute(
+            "UPDATE cwa_ingest_jobs SET state = 'queued', not_before = ?, last_error = ?, lease_token = '', "
+            "attempts = MAX(attempts - 1, 0), deferrals = deferrals + 1, updated_at = ? WHERE id = ?",
+            (time.time() + delay_seconds, error, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), int(job_id))
+        )
+        self.con.commit()
+
+    def ingest_job_cancel(self, job_id: int, exit_code: int, error: str = '') -> bool:
+        """Fail a job that is still waiting in the queue. Returns False if it is not queued (any more)."""
+        self.cur.execute(
+            "UPDATE cwa_ingest_jobs SET state = 'failed', exit_code = ?, last_error = ?, updated_at = ? WHERE id = ? AND state = 'queued'",
+            (int(exit_code), error, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), int(job_id))
+        )
+        self.con.commit()
+        return self.cur.rowcount > 0
+
+    def ingest_job_recover(self, max_attempts: int) -> tuple[int, int]:
+        """Requeue jobs left leased by a daemon that is gone.
+
+        Jobs already leased max_attempts times are marked failed instead, so a file
+        that keeps killing the daemon is not retried forever.  Returns (requeued, failed).
+        """
+        stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cur.execute(
+            "UPDATE cwa_ingest_jobs SET state = 'failed', last_error = 'abandoned after repeated interruptions', updated_at = ? WHERE state = 'leased' AND attempts >= ?",
+            (stamp, int(max_attempts))
+        )
+        failed = self.cur.rowcount
+        self.cur.execute(
+            "UPDATE cwa_ingest_jobs SET state = 'queued', lease_token = '', updated_at = ? WHERE state = 'leased'",
+            (stamp,)
+        )
+        requeued = self.cur.rowcount
+        self.con.commit()
+        return requeued, failed
+
+    def ingest_job_counts(self) -> dict[str, int]:
+        rows = self.cur.execute("SELECT state, COUNT(*) FROM cwa_ingest_jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def ingest_job_prune(self, older_than_days: int = 7) -> int:
+        """Delete finished jobs older than the given number of days. Returns rows removed."""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+        self.cur.execute("DELETE FROM cwa_ingest_jobs WHERE state IN ('done', 'failed') AND updated_at < ?", (cutoff,))
+        self.con.commit()
+        return self.cur.rowcount
+
     # ==============================
     # Scheduled Jobs (Auto-Send)
     # ==============================
@@ -880,7 +1257,7 @@ class CWA_DB:
             return []
 
     def log_activity(self, user_id, user_name, event_type, item_id=None, item_title=None, extra_data=None):
-        """Logs a user activity event to the database with device detection."""
+        """Queues a user activity event for the database with device detection."""
         try:
             import json
             
@@ -917,11 +1294,10 @@ class CWA_DB:
             # Convert back to JSON string
             extra_data_json = json.dumps(extra_data_dict) if extra_data_dict else None
             
-            self.cur.execute("""
-                INSERT INTO cwa_user_activity (user_id, user_name, event_type, item_id, item_title, extra_data)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (user_id, user_name, event_type, item_id, item_title, extra_data_json))
-            self.con.commit()
+            # Timestamp taken now, the row is written a little later by the activity sink
+            timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            activity_sink(self.db_path + self.db_file).put(
+                (user_id, user_name, event_type, item_id, item_title, extra_data_json, timestamp))
         except Exception as e:
             print(f"[cwa-db] Error logging activity: {e}")
 
@@ -1386,6 +1762,108 @@ class CWA_DB:
                 'trend': 0
             }
 
+    @staticmethod
+    def _percentile(sorted_values: list[float], pct: float) -> float:
+        """Nearest-rank percentile of an already sorted list (0 for an empty list)."""
+        if not sorted_values:
+            return 0
+        rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+        return sorted_values[rank]
+
+    @staticmethod
+    def _busy_seconds(intervals: list[tuple[float, float]]) -> float:
+        """Wall-clock seconds covered by (start, end) intervals, counting overlaps once."""
+        busy = 0.0
+        current_start = current_end = None
+        for start, end in sorted(intervals):
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            busy += current_end - current_start
+        return busy
+
+    def get_ingest_performance(self, days=None, start_date=None, end_date=None):
+        """Returns ingest throughput and per-stage latency from cwa_ingest_timings.
+
+        Throughput is measured against the time the ingest pipeline was actually busy
+        (overlapping files counted once), so idle hours don't drag it down.
+
+        Returns dict with:
+            summary: files, total_mb, books_per_min, mb_per_s
+            stages: list of {stage, count, p50, p95, total_seconds} in pipeline order
+            daily: list of {date, files, books_per_min, mb_per_s, p50, p95} for whole-file times
+        """
+        empty = {'summary': {'files': 0, 'total_mb': 0, 'books_per_min': 0, 'mb_per_s': 0}, 'stages': [], 'daily': []}
+        try:
+            if start_date and end_date:
+                date_filter = f"timestamp BETWEEN date('{start_date}') AND date('{end_date}', '+1 day')"
+            elif days:
+                date_filter = f"timestamp >= date('now', '-{days} days')"
+            else:
+                date_filter = "1=1"  # All time - no filter
+
+            rows = self.cur.execute(f"""
+                SELECT timestamp, stage, seconds, COALESCE(size_bytes, 0)
+                FROM cwa_ingest_timings
+                WHERE {date_filter}
+            """).fetchall()
+
+            durations = {}
+            files_by_day = {}
+            for timestamp, stage, seconds, size_bytes in rows:
+                durations.setdefault(stage, []).append(float(seconds))
+                if stage == 'total':
+                    end = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timestamp()
+                    files_by_day.setdefault(timestamp[:10], []).append((end - float(seconds), end, float(seconds), int(size_bytes)))
+
+            def throughput(files):
+                busy = self._busy_seconds([(start, end) for start, end, _, _ in files])
+                size_mb = sum(size for _, _, _, size in files) / (1024 * 1024)
+                return (round(len(files) / (busy / 60), 2) if busy > 0 else 0,
+                        round(size_mb / busy, 2) if busy > 0 else 0,
+                        round(size_mb, 2))
+
+            stage_order = ['readiness_wait', 'convert', 'epub_fix', 'calibredb_batch_wait', 'calibredb_add', 'metadata_fetch', 'checksums', 'total']
+            stages = []
+            for stage in sorted(durations, key=lambda name: (stage_order.index(name) if name in stage_order else len(stage_order), name)):
+                values = sorted(durations[stage])
+                stages.append({
+                    'stage': stage,
+                    'count': len(values),
+                    'p50': round(self._percentile(values, 50), 2),
+                    'p95': round(self._percentile(values, 95), 2),
+                    'total_seconds': round(sum(values), 1),
+                })
+
+            daily = []
+            for day in sorted(files_by_day):
+                files = files_by_day[day]
+                books_per_min, mb_per_s, _ = throughput(files)
+                values = sorted(seconds for _, _, seconds, _ in files)
+                daily.append({
+                    'date': day,
+                    'files': len(files),
+                    'books_per_min': books_per_min,
+                    'mb_per_s': mb_per_s,
+                    'p50': round(self._percentile(values, 50), 2),
+                    'p95': round(self._percentile(values, 95), 2),
+                })
+
+            all_files = [entry for files in files_by_day.values() for entry in files]
+            books_per_min, mb_per_s, total_mb = throughput(all_files)
+            return {
+                'summary': {'files': len(all_files), 'total_mb': total_mb, 'books_per_min': books_per_min, 'mb_per_s': mb_per_s},
+                'stages': stages,
+                'daily': daily,
+            }
+        except Exception as e:
+            print(f"[cwa-db] Error getting ingest performance: {e}")
+            return empty
+
     def get_series_completion_stats(self, limit=10):
         """Returns largest series by book count from Calibre metadata.db.
         
@@ -2417,6 +2895,19 @@ class CWA_DB:
             print(f"[cwa-db] Error invalidating duplicate cache: {e}")
             return False
 
+    def get_duplicate_cache_marker(self):
+        """Cheap marker of the cached duplicate scan results that changes whenever the cache is written"""
+        try:
+            self.cur.execute("""
+                SELECT scan_timestamp, total_count, scan_pending, last_scanned_book_id, length(duplicate_groups_json)
+                FROM cwa_duplicate_cache
+                WHERE id = 1
+            """)
+            return self.cur.fetchone()
+        except Exception as e:
+            print(f"[cwa-db] Error getting duplicate cache marker: {e}")
+            return None
+
     def get_duplicate_cache(self):
         """Get cached duplicate scan results"""
         import json
@@ -44,9 +44,12 @@ CREATE TABLE IF NOT EXISTS cwa_settings(
     auto_ingest_ignored_formats TEXT DEFAULT "" NOT NULL,
     auto_convert_retained_formats TEXT DEFAULT "" NOT NULL,
     auto_ingest_automerge TEXT DEFAULT "new_record" NOT NULL,
+    ingest_skip_identical_files SMALLINT DEFAULT 1 NOT NULL,
     ingest_timeout_minutes INTEGER DEFAULT 15 NOT NULL,
     ingest_stale_temp_minutes INTEGER DEFAULT 120 NOT NULL,
     ingest_stale_temp_interval INTEGER DEFAULT 600 NOT NULL,
+    ingest_conversion_workers INTEGER DEFAULT 0 NOT NULL,
+    conversion_cache_max_mb INTEGER DEFAULT 1024 NOT NULL,
     auto_metadata_enforcement SMALLINT DEFAULT 1 NOT NULL,
     kindle_epub_fixer SMALLINT DEFAULT 1 NOT NULL,
     kindle_epub_fixer_aggressive SMALLINT DEFAULT 0 NOT NULL,
@@ -73,6 +76,7 @@ CREATE TABLE IF NOT EXISTS cwa_settings(
     metadata_provider_hierarchy TEXT DEFAULT '["ibdb","google","dnb"]' NOT NULL,
     metadata_providers_enabled TEXT DEFAULT '{}' NOT NULL,
     auto_send_delay_minutes INTEGER DEFAULT 5 NOT NULL,
+    content_index_enabled SMALLINT DEFAULT 0 NOT NULL,
     duplicate_detection_title SMALLINT DEFAULT 1 NOT NULL,
     duplicate_detection_author SMALLINT DEFAULT 1 NOT NULL,
     duplicate_detection_language SMALLINT DEFAULT 1 NOT NULL,
@@ -196,6 +200,50 @@ CREATE TABLE IF NOT EXISTS cwa_duplicate_book_keys (
 CREATE INDEX IF NOT EXISTS idx_cwa_duplicate_book_keys_key
     ON cwa_duplicate_book_keys(criteria_fingerprint, duplicate_key);
 
+-- Content hashes of ingested files, so byte-identical re-drops skip conversion and calibredb
+CREATE TABLE IF NOT EXISTS cwa_ingest_hashes(
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (sha256, size)
+);
+
+-- Durable ingest job queue, leased by the ingest daemon highest priority first
+CREATE TABLE IF NOT EXISTS cwa_ingest_jobs(
+    id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT,                                -- content hash when queued (NULL if not computed)
+    priority INTEGER NOT NULL DEFAULT 0,        -- higher runs first, web uploads use 10
+    source TEXT NOT NULL DEFAULT 'watcher',     -- 'watcher' | 'upload'
+    state TEXT NOT NULL DEFAULT 'queued',       -- 'queued' | 'leased' | 'done' | 'failed'
+    attempts INTEGER NOT NULL DEFAULT 0,        -- number of times the job ran (busy deferrals excluded)
+    deferrals INTEGER NOT NULL DEFAULT 0,       -- times it was put back because the ingest lock was busy
+    lease_token TEXT DEFAULT '',
+    lease_expires REAL DEFAULT 0,               -- unix time after which a leased job is reclaimed
+    not_before REAL DEFAULT 0,                  -- unix time before which a deferred job is not leased
+    exit_code INTEGER,
+    last_error TEXT DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cwa_ingest_jobs_state ON cwa_ingest_jobs(state, priority, id);
+CREATE INDEX IF NOT EXISTS idx_cwa_ingest_jobs_path ON cwa_ingest_jobs(path);
+
+-- Per-file ingest stage durations in seconds ('readiness_wait', 'convert', 'epub_fix', 'calibredb_add'
+-- and 'total' for the whole file, plus 'metadata_fetch', 'checksums' and 'thumbnails' recorded per
+-- book by the batch enrichment pass), timestamped when the stage ended
+CREATE TABLE IF NOT EXISTS cwa_ingest_timings(
+    id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    timestamp TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    size_bytes INTEGER DEFAULT 0                -- bytes handled by the stage, 0 where not meaningful
+);
+CREATE INDEX IF NOT EXISTS idx_cwa_ingest_timings_timestamp ON cwa_ingest_timings(timestamp);
+
 -- Auto-resolution audit log
 CREATE TABLE IF NOT EXISTS cwa_duplicate_resolutions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
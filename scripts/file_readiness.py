@@ -0,0 +1,251 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Decide when a dropped file has finished being written, without spawning lsof.
+
+Where the kernel supports it an inotify watch decides: a file that is open for
+writing (seen in /proc, where lsof looked) or written to while it is watched is
+ready only once its writer closed it (IN_CLOSE_WRITE) or a complete file was
+moved over it (IN_MOVED_TO), however long the writer pauses in between.  A file
+nobody has open and that sees no write in the first INOTIFY_QUIET_SECONDS was
+closed before it was handed over: the ingest service reacts to exactly those
+two events.
+
+Without inotify, in NETWORK_SHARE_MODE, or when the file changes without
+raising events (remote writes on NFS/SMB), the file is ready once its size and
+mtime have stayed the same for a settle window.  While the file keeps
+changing, the re-check interval backs off exponentially so a long copy costs a
+handful of wakeups, not one per write.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import NamedTuple
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Stat comparison only.  Longer than the 1s lsof re-check this replaced and the
+# 1.5s stabilization of watch_fallback, the watcher used on network shares
+DEFAULT_SETTLE_SECONDS = 2.0
+INOTIFY_QUIET_SECONDS = 0.2
+MIN_INTERVAL_SECONDS = 0.05
+MAX_INTERVAL_SECONDS = 2.0
+
+
+class Readiness(NamedTuple):
+    ready: bool
+    waited: float  # seconds spent waiting
+    method: str  # "inotify" or "stat"
+
+
+def get_settle_seconds() -> float:
+    try:
+        return max(0.0, float(os.environ.get("CWA_INGEST_READY_SETTLE_SECONDS", DEFAULT_SETTLE_SECONDS)))
+    except ValueError:
+        return DEFAULT_SETTLE_SECONDS
+
+
+class _InotifyWatch:
+    """Inotify watch on one file, and on its directory for a file moved over it.
+
+    Raises OSError where inotify is unavailable.
+    """
+
+    _libc = None
+
+    def __init__(self, path: str):
+        if _InotifyWatch._libc is None:
+            _InotifyWatch._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc = _InotifyWatch._libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory, name = os.path.split(os.path.abspath(path))
+        self._name = os.fsencode(name)
+        self._dir_wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MOVED_TO)
+        if self._dir_wd < 0 or libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, "inotify_add_watch failed", path)
+
+    def wait(self, timeout: float) -> list[int]:
+        """Block up to timeout seconds; return the masks of the events read, oldest first ([] on timeout).
+
+        Of the directory's events only a file moved over ours is kept, as IN_MOVED_TO.
+        """
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        masks = []
+        try:
+            while True:
+                buf = os.read(self.fd, 4096)
+                offset = 0
+                while offset + _EVENT_HEADER.size <= len(buf):
+                    wd, event_mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                    name = buf[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_len].rstrip(b"\0")
+                    offset += _EVENT_HEADER.size + name_len
+                    if wd != self._dir_wd:
+                        masks.append(event_mask)
+                    elif event_mask & IN_MOVED_TO and name == self._name:
+                        masks.append(IN_MOVED_TO)
+        except BlockingIOError:
+            pass
+        return masks
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def _signature(path: str):
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _open_for_writing(path: str) -> bool:
+    """Whether a process visible in /proc holds path open for writing"""
+    target = os.path.realpath(path)
+    try:
+        pids = [pid for pid in os.listdir("/proc") if pid.isdigit()]
+    except OSError:
+        return False
+    for pid in pids:
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                if os.readlink(f"/proc/{pid}/fd/{fd}") != target:
+                    continue
+                with open(f"/proc/{pid}/fdinfo/{fd}") as info:
+                    flags = next((line.split()[1] for line in info if line.startswith("flags:")), "0")
+            except (OSError, IndexError):
+                continue
+            if int(flags, 8) & os.O_ACCMODE != os.O_RDONLY:
+                return True
+    return False
+
+
+def _wait_for_close(path: str, watch: _InotifyWatch, last, start: float, timeout: float):
+    """True once the file was closed after its last write, False when it vanished or timed out.
+
+    None when it changed without raising events: writes to it are not reported here.
+    """
+    # Handed over after its close, count the time since the last write as quiet time
+    age = max(0.0, time.time() - last[1] / 1e9)
+    closed_at = start - min(age, INOTIFY_QUIET_SECONDS)
+    writing = _open_for_writing(path)
+    while True:
+        now = time.monotonic()
+        if not writing and now - closed_at >= INOTIFY_QUIET_SECONDS:
+            current = _signature(path)
+            if current is None:
+                return False
+            return True if current == last else None
+        if now - start >= timeout:
+            return False
+        wait_for = timeout - (now - start)
+        if not writing:
+            wait_for = min(wait_for, INOTIFY_QUIET_SECONDS - (now - closed_at))
+        for mask in watch.wait(wait_for):
+            if mask & IN_MOVED_TO:
+                # A complete file took the place of the one being written
+                return _signature(path) is not None
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                return False
+            if mask & IN_MODIFY:
+                writing = True
+            if mask & IN_CLOSE_WRITE:
+                # Another writer may still hold it open
+                writing = _open_for_writing(path)
+                closed_at = time.monotonic()
+                last = _signature(path)
+                if last is None:
+                    return False
+
+
+def _wait_for_settle(path: str, last, start: float, timeout: float, settle: float, max_interval: float) -> bool:
+    """True once size and mtime stayed the same for settle seconds, False when the file vanished or timed out"""
+    # Count the time since the last write as already-quiet time
+    age = min(max(0.0, time.time() - last[1] / 1e9), settle)
+    quiet_since = start - age
+    interval = MIN_INTERVAL_SECONDS
+    while True:
+        now = time.monotonic()
+        if now - quiet_since >= settle:
+            current = _signature(path)
+            if current is None:
+                return False
+            if current == last:
+                return True
+            last, quiet_since = current, now
+            continue
+        if now - start >= timeout:
+            return False
+
+        time.sleep(min(settle - (now - quiet_since), timeout - (now - start)))
+        current = _signature(path)
+        if current is None:
+            return False
+        if current != last:
+            # Still being written: back off before looking again
+            last, quiet_since = current, time.monotonic()
+            interval = min(interval * 2, max_interval)
+            time.sleep(min(interval, max(0.0, timeout - (time.monotonic() - start))))
+
+
+def wait_until_ready(path: str, timeout: float, settle: float | None = None,
+                     max_interval: float = MAX_INTERVAL_SECONDS, use_inotify: bool = True) -> Readiness:
+    """Wait until path has finished being written (see the module docstring).
+
+    Returns Readiness(ready=False) if the file vanishes, is moved away or the
+    timeout is reached first.  `settle` only applies to the stat comparison,
+    used when use_inotify is False (network shares) or inotify is unavailable;
+    a file whose mtime is already older than it is ready immediately.
+    """
+    settle = get_settle_seconds() if settle is None else settle
+    start = time.monotonic()
+    last = _signature(path)
+    if last is None:
+        return Readiness(False, 0.0, "stat")
+
+    watch = None
+    if use_inotify:
+        try:
+            watch = _InotifyWatch(path)
+        except (OSError, AttributeError):
+            watch = None
+    try:
+        if watch is not None:
+            ready = _wait_for_close(path, watch, last, start, timeout)
+            if ready is not None:
+                return Readiness(ready, time.monotonic() - start, "inotify")
+            last = _signature(path)
+            if last is None:
+                return Readiness(False, time.monotonic() - start, "stat")
+        ready = _wait_for_settle(path, last, start, timeout, settle, max_interval)
+        return Readiness(ready, time.monotonic() - start, "stat")
+    finally:
+        if watch is not None:
+            watch.close()
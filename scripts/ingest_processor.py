@@ -5,8 +5,12 @@
 # See CONTRIBUTORS for full list of authors.
 
 import atexit
+import hmac
 import json
 import os
+import secrets
+import signal
+import socket
 import subprocess
 import sys
 import tempfile
@@ -15,9 +19,18 @@ import shutil
 import sqlite3
 import fcntl
 import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+from conversion_cache import ConversionCache, file_sha256, tool_version
+from file_readiness import wait_until_ready
+from library_permissions import fix_touched_ownership, network_share_mode
+from zero_copy import place_file
+
 # ── Lazy-initialization sentinels ──────────────────────────────────────────
 # Heavy modules (GDrive sync, auto-send, metadata fetch, audiobook support,
 # EPUB fixing) are NOT imported at module level.  All globals below start as
@@ -35,7 +48,6 @@ _GDRIVE_AVAILABLE = False
 _CPS_AVAILABLE = False
 _gdriveutils = None
 _cps_config = None
-fetch_and_apply_metadata = None
 TaskAutoSend = None
 WorkerThread = None
 _ub = None
@@ -48,6 +60,23 @@ process_lock = None
 _runtime_initialized = False
 _runtime_init_attempted = False
 
+# Long-lived daemon mode (see run_daemon()).  The daemon keeps the heavy imports
+# above warm and reuses one CWA_DB connection across files.
+_daemon_mode = False
+_daemon_state = threading.local()
+_active_jobs = 0
+_active_jobs_lock = threading.Lock()
+
+# Parallel ingest stages (daemon only).  Conversions, EPUB fixing and metadata
+# fetches of several files may overlap; writes to the Calibre library through
+# calibredb stay serialized behind _library_write_lock.
+_library_write_lock = threading.RLock()
+_conversion_slots = None
+_conversion_slots_size = 0
+_stage_pool = None
+_stage_pool_size = 0
+_stage_pool_lock = threading.Lock()
+
 # Debounced duplicate scan timer
 _duplicate_scan_timer = None
 _duplicate_scan_lock = threading.Lock()
@@ -262,7 +291,7 @@ def _load_runtime_dependencies() -> None:
 
 def _load_optional_cps_modules() -> None:
     global _GDRIVE_AVAILABLE, _CPS_AVAILABLE
-    global _gdriveutils, _cps_config, fetch_and_apply_metadata, TaskAutoSend, WorkerThread, _ub
+    global _gdriveutils, _cps_config, TaskAutoSend, WorkerThread, _ub
 
     if _GDRIVE_AVAILABLE and _CPS_AVAILABLE:
         return
@@ -284,23 +313,20 @@ def _load_optional_cps_modules() -> None:
             _cps_config = None
             _GDRIVE_AVAILABLE = False
 
-        # Import auto-send and metadata functionality
+        # Import auto-send functionality
         try:
-            from cps.metadata_helper import fetch_and_apply_metadata as loaded_fetch_and_apply_metadata
             from cps.tasks.auto_send import TaskAutoSend as LoadedTaskAutoSend
             from cps.services.worker import WorkerThread as LoadedWorkerThread
             from cps import ub as loaded_ub
             from cps.calibre_init import init_calibre_db_from_app_db
             init_calibre_db_from_app_db(get_app_db_path())
-            fetch_and_apply_metadata = loaded_fetch_and_apply_metadata
             TaskAutoSend = LoadedTaskAutoSend
             WorkerThread = LoadedWorkerThread
             _ub = loaded_ub
             _CPS_AVAILABLE = True
-            print("[ingest-processor] Auto-send and metadata functionality available", flush=True)
+            print("[ingest-processor] Auto-send functionality available", flush=True)
         except ImportError as e:
-            print(f"[ingest-processor] Auto-send/metadata functionality not available: {e}", flush=True)
-            fetch_and_apply_metadata = None
+            print(f"[ingest-processor] Auto-send functionality not available: {e}", flush=True)
             TaskAutoSend = None
             WorkerThread = None
             _ub = None
@@ -363,9 +389,285 @@ def initialize_runtime() -> bool:
     return True
 
 
+def _get_cwa_db():
+    """Return a CWA_DB handle.
+
+    One-shot runs construct a fresh instance. Each daemon worker thread keeps its
+    own instance (and sqlite connection) alive and only re-reads cwa_settings so
+    changes made in the web UI are picked up on the next file.
+    """
+    if not _daemon_mode:
+        return CWA_DB()
+    db = getattr(_daemon_state, "cwa_db", None)
+    if db is None:
+        db = CWA_DB()
+        _daemon_state.cwa_db = db
+    else:
+        db.cwa_settings = db.get_cwa_settings()
+    return db
+
+
+def get_ingest_worker_count(cwa_settings: dict) -> int:
+    """Number of files that may be in the conversion stage at once (0 in settings = one per core)."""
+    try:
+        workers = int(cwa_settings.get('ingest_conversion_workers', 0) or 0)
+    except (TypeError, ValueError):
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(32, workers))
+
+
+@contextmanager
+def conversion_stage(cwa_settings: dict):
+    """Bound the number of concurrent ebook-convert/kepubify runs in the daemon."""
+    global _conversion_slots, _conversion_slots_size
+    if not _daemon_mode:
+        yield
+        return
+    size = get_ingest_worker_count(cwa_settings)
+    with _stage_pool_lock:
+        if _conversion_slots is None or _conversion_slots_size != size:
+            # Holders of a previous semaphore release it on exit, so swapping is safe
+            _conversion_slots = threading.BoundedSemaphore(size)
+            _conversion_slots_size = size
+        slots = _conversion_slots
+    with slots:
+        yield
+
+
+@contextmanager
+def library_write_stage():
+    """Serialize calibredb writes (and the metadata.db fix-ups around them)."""
+    with _library_write_lock:
+        yield
+
+
+class IngestJobCancelled(Exception):
+    """Raised inside a daemon job that was cancelled or ran past its deadline."""
+
+
+class _JobControl:
+    """Deadline and cancel flag of one running daemon job (see IngestJobDispatcher)."""
+
+    __slots__ = ("job_id", "deadline", "cancelled", "reason", "done", "source_hash")
+
+    def __init__(self, job_id: int, deadline: float, source_hash: tuple | None = None):
+        self.job_id = job_id
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self.reason = ""
+        self.done = threading.Event()
+        # (sha256, size, mtime_ns) of the file as hashed on submit, see find_identical_import
+        self.source_hash = source_hash
+
+    def cancel(self, reason: str) -> None:
+        if not self.cancelled.is_set():
+            self.reason = reason
+            self.cancelled.set()
+
+
+def check_job_cancelled() -> None:
+    """Stop the current daemon job here if it was cancelled; a no-op outside daemon jobs."""
+    job = getattr(_daemon_state, "job", None)
+    if job is not None and job.cancelled.is_set():
+        raise IngestJobCancelled(job.reason)
+
+
+def run_job_subprocess(args: list, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run() for converters, killed together with its children when the daemon job is cancelled.
+
+    Only for commands whose output is not captured; one-shot runs call subprocess.run() as is.
+    """
+    job = getattr(_daemon_state, "job", None)
+    if job is None:
+        return subprocess.run(args, **kwargs)
+    check = kwargs.pop("check", False)
+    check_job_cancelled()
+    with subprocess.Popen(args, start_new_session=True, **kwargs) as process:
+        while process.poll() is None:
+            if job.cancelled.wait(0.5):
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                process.wait()
+                raise IngestJobCancelled(job.reason)
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    return subprocess.CompletedProcess(args, process.returncode)
+
+
+def _init_stage_worker() -> None:
+    _ensure_project_root_on_path()
+    _load_runtime_dependencies()
+    _load_optional_cps_modules()
+
+
+def _get_stage_pool(cwa_settings: dict):
+    global _stage_pool, _stage_pool_size
+    if not _daemon_mode:
+        return None
+    size = get_ingest_worker_count(cwa_settings)
+    with _stage_pool_lock:
+        if _stage_pool is not None and _stage_pool_size != size:
+            _stage_pool.shutdown(wait=False)
+            _stage_pool = None
+        if _stage_pool is None:
+            # spawn rather than fork: the daemon is multi-threaded
+            _stage_pool = ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_stage_worker,
+            )
+            _stage_pool_size = size
+        return _stage_pool
+
+
+def run_in_stage_pool(cwa_settings: dict, func, *args):
+    """Run a CPU or DB heavy stage in the daemon's process pool, or inline for one-shot runs.
+
+    Workers keep their own imports and database connections warm between files.
+    """
+    global _stage_pool
+    pool = _get_stage_pool(cwa_settings)
+    if pool is None:
+        return func(*args)
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool as e:
+        print(f"[ingest-processor] WARN: Stage worker pool broke ({e}), running {func.__name__} inline", flush=True)
+        with _stage_pool_lock:
+            if _stage_pool is pool:
+                _stage_pool = None
+        return func(*args)
+
+
+def _stage_fix_epub(filepath: str, dest: str | None) -> None:
+    EPUBFixer().process(input_path=filepath, output_path=dest)
+
+
+def get_ingest_batch_quiet_seconds() -> float:
+    try:
+        return max(0.0, float(os.environ.get("CWA_INGEST_BATCH_QUIET_SECONDS", "5") or 5))
+    except ValueError:
+        return 5.0
+
+
+class _BatchedAdd:
+    __slots__ = ("processor", "staged_path", "done", "book_ids", "error", "queued_at", "wait_seconds", "add_timing")
+
+    def __init__(self, processor, staged_path: Path):
+        self.processor = processor
+        self.staged_path = staged_path
+        self.done = threading.Event()
+        self.book_ids = None
+        self.error = None
+        self.queued_at = time.monotonic()
+        self.wait_seconds = 0.0
+        self.add_timing = None
+
+
+class CalibredbAddBatcher:
+    """Group text imports of concurrent daemon jobs into one `calibredb add` call.
+
+    The first job to reach the library write stage becomes the leader: it keeps the
+    batch open while other jobs are still converting and new files keep arriving
+    within the ingest quiet window, then adds every staged file in one calibredb run
+    and hands each job the book id(s) created for its file.
+
+    Each job records how long it waited for the batch as its calibredb_batch_wait
+    stage; the calibredb run itself is recorded once, as the calibredb_add stage of
+    the first job of the batch.
+    """
+
+    def __init__(self, max_batch: int = 50):
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = []
+        self._last_arrival = 0.0
+
+    def add(self, processor, staged_path: Path) -> list[int] | None:
+        """Returns the book ids for staged_path, or None if the caller should add it on its own."""
+        request = _BatchedAdd(processor, staged_path)
+        with self._cond:
+            self._pending.append(request)
+            self._last_arrival = time.monotonic()
+            is_leader = len(self._pending) == 1
+            self._cond.notify_all()
+        if is_leader:
+            while True:
+                batch = self._collect()
+                if not batch:
+                    break
+                self._flush(batch)
+        request.done.wait()
+        # Recorded here, in the job's own thread, which owns the processor's CWA_DB connection
+        processor.record_stage_timing("calibredb_batch_wait", request.wait_seconds, _file_size(staged_path))
+        if request.add_timing is not None:
+            processor.record_stage_timing("calibredb_add", *request.add_timing)
+        if request.error is not None:
+            raise request.error
+        return request.book_ids
+
+    def _collect(self) -> list:
+        quiet = get_ingest_batch_quiet_seconds()
+        with self._cond:
+            while self._pending and len(self._pending) < self.max_batch:
+                # Jobs still converting may join; stop early once none are left to wait for
+                if _active_jobs <= len(self._pending):
+                    break
+                remaining = quiet - (time.monotonic() - self._last_arrival)
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, 0.5))
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            return batch
+
+    @staticmethod
+    def _flush(batch: list) -> None:
+        try:
+            if len(batch) == 1:
+                # Nothing to group; let the job take the regular single-file path
+                batch[0].wait_seconds = time.monotonic() - batch[0].queued_at
+                return
+            runner = batch[0].processor
+            staged_paths = [request.staged_path for request in batch]
+            try:
+                with library_write_stage():
+                    started = time.monotonic()
+                    for request in batch:
+                        request.wait_seconds = started - request.queued_at
+                    book_ids = runner._run_calibredb_add_batch(staged_paths)
+                    batch[0].add_timing = (time.monotonic() - started,
+                                           sum(_file_size(path) for path in staged_paths))
+                for request in batch:
+                    request.book_ids = book_ids.get(str(request.staged_path), [])
+            except subprocess.CalledProcessError as e:
+                # One bad file must not fail the rest of the batch: each job retries on its own
+                print(f"[ingest-processor] WARN: Batched calibredb add of {len(batch)} files failed (exit {e.returncode}), adding them one by one.", flush=True)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
+
+
+_add_batcher = CalibredbAddBatcher()
+
+
 def _is_missing_ingest_target(filepath: str) -> bool:
     return not os.path.isfile(filepath) and not os.path.isdir(filepath)
 
+
+def _file_size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
 def gdrive_sync_if_enabled():
     """Sync Calibre library to Google Drive if enabled in app config."""
     if _GDRIVE_AVAILABLE and getattr(_cps_config, "config_use_google_drive", False):
@@ -418,14 +720,25 @@ def get_ingest_batch_dirty_file() -> str:
     return os.environ.get("CWA_INGEST_BATCH_DIRTY_FILE", "/config/cwa_ingest_batch_dirty")
 
 
-def mark_ingest_batch_dirty() -> None:
+_batch_dirty_lock = threading.Lock()
+
+
+def mark_ingest_batch_dirty(book_ids=None, auto_sends=None) -> None:
+    """Mark the ingest batch dirty and note the books it touched.
+
+    The marker collects one book_id=<id> line per book until the post-batch
+    follow-up hands them to the enrichment pass (see read_ingest_batch_book_ids),
+    and one auto_send=<json> line per auto-send scheduled after that pass.
+    """
     dirty_file = get_ingest_batch_dirty_file()
     try:
         dirty_dir = os.path.dirname(dirty_file)
         if dirty_dir:
             os.makedirs(dirty_dir, exist_ok=True)
-        with open(dirty_file, "w", encoding="utf-8") as marker:
-            marker.write(f"dirty_at={int(time.time())}\n")
+        lines = [f"book_id={int(book_id)}\n" for book_id in book_ids or [] if book_id is not None]
+        lines += [f"auto_send={json.dumps(payload, sort_keys=True)}\n" for payload in auto_sends or []]
+        with _batch_dirty_lock, open(dirty_file, "a", encoding="utf-8") as marker:
+            marker.write(f"dirty_at={int(time.time())}\n" + "".join(lines))
         print(f"[ingest-processor] Marked ingest batch follow-up dirty: {dirty_file}", flush=True)
     except Exception as e:
         print(f"[ingest-processor] WARN: Failed to mark ingest batch follow-up dirty: {e}", flush=True)
@@ -482,15 +795,62 @@ def _post_internal_endpoint(path: str, payload: dict | None = None) -> bool:
     return False
 
 
+def read_ingest_batch_book_ids(marker_path: str) -> list[int]:
+    """Book ids recorded in a batch marker by mark_ingest_batch_dirty, in first-seen order."""
+    book_ids = []
+    try:
+        with open(marker_path, "r", encoding="utf-8") as marker:
+            for line in marker:
+                key, _, value = line.strip().partition("=")
+                if key == "book_id" and value.isdigit():
+                    book_ids.append(int(value))
+    except OSError:
+        return []
+    return list(dict.fromkeys(book_ids))
+
+
+def read_ingest_batch_auto_sends(marker_path: str) -> list[dict]:
+    """Auto-send payloads recorded in a batch marker by mark_ingest_batch_dirty."""
+    auto_sends = []
+    try:
+        with open(marker_path, "r", encoding="utf-8") as marker:
+            for line in marker:
+                key, _, value = line.strip().partition("=")
+                if key != "auto_send":
+                    continue
+                try:
+                    auto_sends.append(json.loads(value))
+                except ValueError:
+                    continue
+    except OSError:
+        return []
+    return auto_sends
+
+
 def run_post_batch_follow_up() -> int:
-    """Run follow-up work once the ingest service observes a quiet dirty batch."""
+    """Run follow-up work once the ingest service observes a quiet dirty batch.
+
+    The service has moved the dirty marker to <marker>.running by now; the books
+    listed in it get one batch enrichment pass (metadata, checksums, thumbnails,
+    duplicate keys) queued right behind the database reconnect. Auto-sends are
+    only scheduled once everything else went through: their task then queues
+    behind the enrichment pass, and a retried marker does not send twice.
+    """
     print("[ingest-processor] Running post-batch follow-up", flush=True)
-    checks = [
-        _post_internal_endpoint("/cwa-internal/reconnect-db"),
+    marker_path = get_ingest_batch_dirty_file() + ".running"
+    book_ids = read_ingest_batch_book_ids(marker_path)
+    checks = [_post_internal_endpoint("/cwa-internal/reconnect-db")]
+    if book_ids:
+        checks.append(_post_internal_endpoint("/cwa-internal/enrich-batch", {"book_ids": book_ids}))
+    checks += [
         _post_internal_endpoint("/duplicates/invalidate-cache"),
         _post_internal_endpoint("/cwa-internal/queue-duplicate-scan"),
     ]
     if all(checks):
+        for payload in read_ingest_batch_auto_sends(marker_path):
+            if not _post_internal_endpoint("/cwa-internal/schedule-auto-send", payload):
+                print(f"[ingest-processor] WARN: Could not schedule auto-send of book {payload.get('book_id')} "
+                      f"to user {payload.get('username')}", flush=True)
         print("[ingest-processor] Post-batch follow-up completed", flush=True)
         return 0
     print("[ingest-processor] WARN: Post-batch follow-up incomplete", flush=True)
@@ -518,7 +878,7 @@ class NewBookProcessor:
             ]
 
         # Settings / DB
-        self.db = CWA_DB()
+        self.db = _get_cwa_db()
         self.cwa_settings = self.db.cwa_settings
 
         # Core ingest settings
@@ -559,6 +919,8 @@ class NewBookProcessor:
                 print(f"[ingest-processor] WARN: Could not read config_calibre_dir from app.db ({app_db_path}), using default. Error: {e}", flush=True)
 
         Path(self.tmp_conversion_dir).mkdir(exist_ok=True)
+        # Every file gets its own scratch directory so parallel jobs never clean up each other's files
+        self.tmp_conversion_dir = tempfile.mkdtemp(prefix="job_", dir=self.tmp_conversion_dir) + os.sep
         self.staging_dir = os.path.join(self.tmp_conversion_dir, "staging")
         Path(self.staging_dir).mkdir(exist_ok=True)
 
@@ -583,6 +945,15 @@ class NewBookProcessor:
         # Track the last added Calibre book id(s) from calibredb output
         self.last_added_book_id: int | None = None
         self.last_added_book_ids: list[int] = []
+        # Books whose folders this run wrote to; only these get their ownership fixed afterwards
+        self.touched_book_ids: set[int] = set()
+        self.library_written = False
+        # Content hash of the incoming file (see find_identical_import)
+        self.source_sha256: str | None = None
+        self.source_size: int | None = None
+        # Seconds spent waiting for the dropped file to finish being written (see is_file_in_use)
+        self.readiness_wait_seconds: float | None = None
+        self.started_at = time.monotonic()
         self._title_sort_regex = self._get_title_sort_regex()
 
     @staticmethod
@@ -620,6 +991,16 @@ class NewBookProcessor:
         except Exception:
             return []
 
+    @staticmethod
+    def _parse_batch_book_ids(output: str) -> tuple[list[int], list[int]]:
+        """Return (added, merged) book ids reported by a multi-file calibredb add."""
+        import re
+        added, merged = [], []
+        for m in re.finditer(r"(Added|Merged|Updated) book id[s]?:\s*([0-9,\s]+)", output, flags=re.IGNORECASE):
+            ids = [int(x.strip()) for x in m.group(2).split(',') if x.strip().isdigit()]
+            (added if m.group(1).lower() == "added" else merged).extend(ids)
+        return added, merged
+
     def _fallback_last_added_book_id(self) -> None:
         """Fallback to the most recently modified book when calibredb output lacks IDs."""
         if self.last_added_book_id is not None:
@@ -714,7 +1095,8 @@ class NewBookProcessor:
                 raise KeyError(f"No backup destination for type '{backup_type}'")
             # Ensure destination directory exists
             os.makedirs(output_path, exist_ok=True)
-            destination = shutil.copy(input_file, output_path)
+            destination = os.path.join(output_path, os.path.basename(input_file))
+            place_file(input_file, destination)
             os.utime(destination, None)
         except Exception as e:
             # Never let backups crash ingest; just log the problem
@@ -732,9 +1114,16 @@ class NewBookProcessor:
 
         original_filepath = Path(self.filepath)
         target_filepath = f"{self.tmp_conversion_dir}{original_filepath.stem}.{end_format}"
+
+        def run_ebook_convert():
+            with conversion_stage(self.cwa_settings):
+                run_job_subprocess(['ebook-convert', self.filepath, target_filepath], env=self.calibre_env, check=True)
+
         try:
             t_convert_book_start = time.time()
-            subprocess.run(['ebook-convert', self.filepath, target_filepath], env=self.calibre_env, check=True)
+            self._cached_conversion(self.filepath, end_format,
+                                    {"converter": "ebook-convert", "calibre": tool_version("calibre")},
+                                    target_filepath, run_ebook_convert)
             t_convert_book_end = time.time()
             time_book_conversion = t_convert_book_end - t_convert_book_start
             print(f"\n[ingest-processor]: END_CON: Conversion of {self.filename} complete in {time_book_conversion:.2f} seconds.\n", flush=True)
@@ -773,8 +1162,15 @@ class NewBookProcessor:
         if convert_successful:
             converted_filepath = Path(converted_filepath)
             target_filepath = f"{self.tmp_conversion_dir}{converted_filepath.stem}.kepub"
+
+            def run_kepubify():
+                with conversion_stage(self.cwa_settings):
+                    run_job_subprocess(['kepubify', '--inplace', '--calibre', '--output', self.tmp_conversion_dir, converted_filepath], check=True)
+
             try:
-                subprocess.run(['kepubify', '--inplace', '--calibre', '--output', self.tmp_conversion_dir, converted_filepath], check=True)
+                self._cached_conversion(str(converted_filepath), "kepub",
+                                        {"converter": "kepubify", "args": ["--inplace", "--calibre"], "kepubify": tool_version("kepubify")},
+                                        target_filepath, run_kepubify)
                 if self.cwa_settings['auto_backup_conversions']:
                     self.backup(self.filepath, backup_type="converted")
 
@@ -789,6 +1185,8 @@ class NewBookProcessor:
                 print(f"[ingest-processor]: CON_ERROR: {self.filename} could not be converted to kepub due to the following error:\nEXIT/ERROR CODE: {e.returncode}\n{e.stderr}", flush=True)
                 self.backup(converted_filepath, backup_type="failed")
                 return False, ""
+            except IngestJobCancelled:
+                raise
             except Exception as e:
                 print(f"[ingest-processor] ingest-processor ran into the following error:\n{e}", flush=True)
         else:
@@ -796,6 +1194,76 @@ class NewBookProcessor:
             return False, ""
 
 
+    def _cached_conversion(self, source_path: str, end_format: str, options: dict, output_path: str, run_converter) -> bool:
+        """Fill output_path from the conversion cache, or run run_converter() and cache what it produced.
+
+        Returns True on a cache hit.  Errors raised by run_converter propagate unchanged.
+        """
+        cache = ConversionCache.from_settings(self.cwa_settings)
+        key = None
+        if cache.enabled:
+            try:
+                if source_path == self.filepath and self.source_sha256:
+                    source_sha256 = self.source_sha256
+                else:
+                    source_sha256 = file_sha256(source_path)
+                key = cache.make_key(source_sha256, end_format, options)
+            except OSError as e:
+                print(f"[ingest-processor] WARN: Could not hash {source_path} for the conversion cache: {e}", flush=True)
+            if key and cache.get(key, output_path):
+                print(f"[ingest-processor]: Reusing cached {end_format} conversion of {os.path.basename(source_path)}", flush=True)
+                return True
+        run_converter()
+        if key and os.path.exists(output_path):
+            cache.put(key, output_path)
+        return False
+
+    def find_identical_import(self) -> int | None:
+        """Return the id of a library book that was imported from a byte-identical file, or None.
+
+        The file's hash is kept so record_import_hash() can index it after a successful import.
+        Inside a daemon job the hash taken on submit is reused while the file's size and mtime
+        are still the ones seen then. With automerge set to new_record every file is imported
+        as a new book, identical or not.
+        """
+        try:
+            stat = os.stat(self.filepath)
+            job = getattr(_daemon_state, "job", None)
+            source_hash = job.source_hash if job is not None else None
+            if source_hash and source_hash[1:] == (stat.st_size, stat.st_mtime_ns):
+                self.source_sha256 = source_hash[0]
+            else:
+                self.source_sha256 = file_sha256(self.filepath)
+            self.source_size = stat.st_size
+        except OSError as e:
+            print(f"[ingest-processor] WARN: Could not hash {self.filename}: {e}", flush=True)
+            self.source_sha256 = self.source_size = None
+            return None
+        if not self.cwa_settings.get('ingest_skip_identical_files', True):
+            return None
+        if self.cwa_settings.get('auto_ingest_automerge') == 'new_record':
+            return None
+        try:
+            book_id = self.db.ingest_hash_lookup(self.source_sha256, self.source_size)
+            if book_id is None:
+                return None
+            if not self._validate_book_exists(book_id):
+                # The earlier import was deleted from the library; let this one through
+                self.db.ingest_hash_remove(self.source_sha256, self.source_size)
+                return None
+            return book_id
+        except Exception as e:
+            print(f"[ingest-processor] WARN: Content hash lookup failed for {self.filename}: {e}", flush=True)
+            return None
+
+    def record_import_hash(self) -> None:
+        if self.source_sha256 is None or self.last_added_book_id is None:
+            return
+        try:
+            self.db.ingest_hash_add(self.source_sha256, self.source_size, self.last_added_book_id, self.filename)
+        except Exception as e:
+            print(f"[ingest-processor] WARN: Failed to record content hash for {self.filename}: {e}", flush=True)
+
     def delete_current_file(self) -> None:
         """Deletes file just processed from ingest folder"""
         try:
@@ -822,44 +1290,44 @@ class NewBookProcessor:
             print(f"[ingest-processor] WARN: Failed to delete processed file {self.filepath}: {e}", flush=True)
 
     def is_file_in_use(self, timeout: float = None) -> bool:
-        """Wait until the file is no longer in use (write handle is closed) or timeout is reached.
-        Returns True if file is ready, False if timed out or file vanished."""
+        """Wait until the file has finished being written (see file_readiness) or timeout is reached.
+        On network shares remote writes raise no inotify events, only the stat comparison is used there.
+        Returns True if file is ready, False if timed out or file vanished.
+        The time spent waiting is kept in self.readiness_wait_seconds."""
 
         # Use configured timeout from CWA settings (default 15 minutes if not configured)
         if timeout is None:
             timeout_minutes = self.cwa_settings.get('ingest_timeout_minutes', 15)
             timeout = timeout_minutes * 60  # Convert to seconds
 
-        start = time.time()
-        while time.time() - start < timeout:
-            if not os.path.exists(self.filepath):
-                return False
-            try:
-                # lsof '-F f' gets file access mode; we check for 'w' (write).
-                # Add timeout to prevent hanging (issue #654)
-                result = subprocess.run(['lsof', '-F', 'f', '--', self.filepath],
-                                      capture_output=True, text=True, timeout=10)
-                if 'w' not in result.stdout:
-                    return True # Not in use for writing
-            except subprocess.TimeoutExpired:
-                print("[ingest-processor] WARN: lsof command timed out. Assuming file is not in use.", flush=True)
-                return True  # If lsof hangs, assume file is ready to avoid indefinite wait
-            except FileNotFoundError:
-                print("[ingest-processor] WARN: 'lsof' command not found. Cannot reliably check if file is in use. Proceeding with caution.", flush=True)
-                return True # Fallback for systems without lsof
-            except Exception as e:
-                print(f"[ingest-processor] WARN: Error checking file usage with lsof: {e}", flush=True)
-                # On error, wait and retry to be safe
-            time.sleep(1)
-        return False # Timeout reached
+        result = wait_until_ready(self.filepath, timeout, use_inotify=not network_share_mode())
+        self.readiness_wait_seconds = result.waited
+        print(f"[ingest-processor] Waited {result.waited:.2f}s for {self.filename} to be ready ({result.method})", flush=True)
+        self.record_stage_timing("readiness_wait", result.waited, _file_size(self.filepath))
+        return result.ready
 
+    def record_stage_timing(self, stage: str, seconds: float, size: int = 0) -> None:
+        """Store how long one ingest stage took for this file (cwa_ingest_timings), and how many bytes it handled."""
+        try:
+            self.db.ingest_timing_add(self.filename, stage, seconds, size)
+        except Exception as e:
+            print(f"[ingest-processor] WARN: Could not record {stage} timing for {self.filename}: {e}", flush=True)
+
+    @contextmanager
+    def timed_stage(self, stage: str, size: int = 0):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_stage_timing(stage, time.monotonic() - start, size)
 
 
     def add_book_to_library(self, book_path:str, text: bool=True, format: str="text" ) -> None:
         # If kindle-epub-fixer is on, run it first and import the *fixed* file.
         if self.target_format == "epub" and self.is_kindle_epub_fixer:
             fixed_epub_path = Path(self.tmp_conversion_dir) / os.path.basename(book_path)
-            self.run_kindle_epub_fixer(book_path, dest=self.tmp_conversion_dir)
+            with self.timed_stage("epub_fix", _file_size(book_path)):
+                self.run_kindle_epub_fixer(book_path, dest=self.tmp_conversion_dir)
             try:
                 # Use the fixed path only if the fixer succeeded and created a non-empty file
                 if fixed_epub_path.exists() and fixed_epub_path.stat().st_size > 0:
@@ -874,16 +1342,6 @@ class NewBookProcessor:
                     print(f"[ingest-processor] An error occurred while checking the fixed EPUB path on {book_path}:\n{e}", flush=True)
                     raise
 
-        # Capture the current max(timestamp) in Calibre DB so we can detect rows whose last_modified was bumped by an overwrite
-        pre_import_max_timestamp = None
-        if self.cwa_settings.get('auto_ingest_automerge') == 'overwrite':
-            try:
-                with sqlite3.connect(self.metadata_db, timeout=30) as con:
-                    cur = con.cursor()
-                    pre_import_max_timestamp = cur.execute('SELECT MAX(timestamp) FROM books').fetchone()[0]
-            except Exception as e:
-                print(f"[ingest-processor] WARN: Could not read pre-import max timestamp: {e}", flush=True)
-
         print("[ingest-processor]: Importing new book to CWA...")
         source_path = Path(book_path)
         if not source_path.exists() or source_path.stat().st_size == 0:
@@ -891,140 +1349,55 @@ class NewBookProcessor:
             self.backup(self.filepath, backup_type="failed") # Backup original file
             return
 
+        # A job cancelled by now must not reach the library any more
+        check_job_cancelled()
+
         # Stage file for import
         staged_path = Path(self.staging_dir) / source_path.name
         try:
-            shutil.copy2(source_path, staged_path)
+            place_file(source_path, staged_path)
         except Exception as e:
             print(f"[ingest-processor] ERROR: Failed to stage file for import: {e}", flush=True)
             self.backup(self.filepath, backup_type="failed")
             return
 
         try:
-            if text:
-                result = subprocess.run([
-                    "calibredb", "add", str(staged_path), "--automerge", self.cwa_settings['auto_ingest_automerge'], f"--library-path={self.library_dir}"
-                ], env=self.calibre_env, check=True, capture_output=True, text=True)
-                added_ids = self._parse_added_book_ids((result.stdout or '') + '\n' + (result.stderr or ''))
-                if added_ids:
-                    self.last_added_book_ids = added_ids
-                    self.last_added_book_id = added_ids[-1]
-                else:
-                    self._fallback_last_added_book_id()
-            else:  # audiobook path
-                meta = audiobook.get_audio_file_info(str(staged_path), format, os.path.basename(str(staged_path)), False)
-
-                # Coalesce metadata to safe strings
-                _title = str(meta[2]) if meta[2] else Path(staged_path).stem
-                _authors = str(meta[3]) if meta[3] else ""
-                _tags = str(meta[6]) if meta[6] else ""
-                _series = str(meta[7]) if meta[7] else ""
-                _series_index = str(meta[8]) if meta[8] is not None and meta[8] != "" else None
-                _languages = str(meta[9]) if meta[9] else ""
-                _cover = meta[4] if meta[4] and isinstance(meta[4], str) else None
-
-                add_command = [
-                    "calibredb", "add", str(staged_path), "--automerge", self.cwa_settings['auto_ingest_automerge'],
-                    f"--library-path={self.library_dir}",
-                ]
-                if _title:
-                    add_command.extend(["--title", _title])
-                if _authors:
-                    add_command.extend(["--authors", _authors])
-                if _tags:
-                    add_command.extend(["--tags", _tags])
-                if _series:
-                    add_command.extend(["--series", _series])
-                if _series_index:
-                    add_command.extend(["--series-index", str(_series_index)])
-                if _languages:
-                    add_command.extend(["--languages", _languages])
-                if _cover and os.path.exists(_cover):
-                    add_command.extend(["--cover", _cover])
-
-                # Add identifiers if present; expect entries like "isbn:12345"
-                try:
-                    identifiers_list = meta[12] if isinstance(meta[12], (list, tuple)) else []
-                except Exception:
-                    identifiers_list = []
-                for ident in identifiers_list:
-                    if isinstance(ident, str) and ":" in ident and ident.strip():
-                        add_command.extend(["--identifier", ident.strip()])
-
-                result = subprocess.run(add_command, env=self.calibre_env, check=True, capture_output=True, text=True)
-                added_ids = self._parse_added_book_ids((result.stdout or '') + '\n' + (result.stderr or ''))
-                if added_ids:
-                    self.last_added_book_ids = added_ids
-                    self.last_added_book_id = added_ids[-1]
-                else:
-                    self._fallback_last_added_book_id()
-            print(f"[ingest-processor] Added {staged_path.stem} to Calibre database", flush=True)
+            # Only the library write itself is serialized; conversion, fixing and metadata
+            # fetching of other files keep running meanwhile.
+            # In the daemon, text imports of files arriving together share one calibredb run,
+            # which the batcher times itself
+            batched_ids = _add_batcher.add(self, staged_path) if (text and _daemon_mode) else None
+            if batched_ids is not None:
+                self.last_added_book_ids = batched_ids
+                self.last_added_book_id = batched_ids[-1] if batched_ids else None
+                print(f"[ingest-processor] Added {staged_path.stem} to Calibre database", flush=True)
+            else:
+                with library_write_stage(), self.timed_stage("calibredb_add", _file_size(staged_path)):
+                    # Capture the current max(timestamp) in Calibre DB so we can detect rows whose last_modified was bumped by an overwrite
+                    pre_import_max_timestamp = self._get_pre_import_max_timestamp()
+                    self._run_calibredb_add(staged_path, text, format)
+                    print(f"[ingest-processor] Added {staged_path.stem} to Calibre database", flush=True)
+                    self._update_import_timestamps(pre_import_max_timestamp)
+                    # Optional post-import GDrive sync
+                    gdrive_sync_if_enabled()
+            self.library_written = True
+            self.touched_book_ids.update(self.last_added_book_ids)
 
             if self.cwa_settings['auto_backup_imports']:
                 self.backup(str(staged_path), backup_type="imported")
 
             self.db.import_add_entry(staged_path.stem,
                                     str(self.cwa_settings["auto_backup_imports"]))
+            self.record_import_hash()
 
-            mark_ingest_batch_dirty()
-
-            # Optional post-import GDrive sync
-            gdrive_sync_if_enabled()
-
-            # Fetch metadata if enabled, prefer exact book id from calibredb
-            if self.last_added_book_id is not None:
-                self.fetch_metadata_if_enabled(book_id=self.last_added_book_id)
-            else:
-                self.fetch_metadata_if_enabled(staged_path.stem)
-
-            # Trigger auto-send for users who have it enabled
-            if self.last_added_book_id is not None:
-                self.trigger_auto_send_if_enabled(book_id=self.last_added_book_id, book_path=book_path)
-            else:
-                self.trigger_auto_send_if_enabled(staged_path.stem, book_path)
-
-            # Generate KOReader sync checksums for the imported book
+            # Auto-send for users who have it enabled, scheduled by the post-batch follow-up
             if self.last_added_book_id is not None:
-                self.generate_book_checksums(staged_path.stem, book_id=self.last_added_book_id)
+                auto_sends = self.auto_send_requests(book_id=self.last_added_book_id)
             else:
-                self.generate_book_checksums(staged_path.stem)
-
-            # Ensure newly imported books have their timestamp set to the current time
-            # so they appear at the top of "Recently Added" views.
-            # calibredb sets timestamp from EPUB metadata (publication date), which can be
-            # years in the past, making new imports invisible in recently-added sorting.
-            if self.last_added_book_id is not None:
-                try:
-                    with sqlite3.connect(self.metadata_db, timeout=30) as con:
-                        if not self._register_title_sort_function(con):
-                            print("[ingest-processor] INFO: Skipping timestamp adjust (title_sort SQL function unavailable).", flush=True)
-                        else:
-                            cur = con.cursor()
-                            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S+00:00")
-                            cur.execute('UPDATE books SET timestamp = ? WHERE id = ?', (now, self.last_added_book_id))
-                            print(f"[ingest-processor] INFO: Set timestamp to {now} for newly imported book id={self.last_added_book_id}.", flush=True)
-                except Exception as e:
-                    print(f"[ingest-processor] WARN: Failed to set timestamp for new book: {e}", flush=True)
+                auto_sends = self.auto_send_requests(staged_path.stem)
 
-            # If we overwrote an existing book, Calibre does not bump books.timestamp, only last_modified.
-            # Update timestamp to last_modified for any rows changed by this import so sorting by 'new' reflects overwrites.
-            if self.cwa_settings.get('auto_ingest_automerge') == 'overwrite':
-                try:
-                    with sqlite3.connect(self.metadata_db, timeout=30) as con:
-                        cur = con.cursor()
-                        if not self._register_title_sort_function(con):
-                            print("[ingest-processor] INFO: Skipping timestamp adjust (title_sort SQL function unavailable).", flush=True)
-                            return
-                        # pre_import_max_timestamp may be None (empty library) -> update all rows where timestamp < last_modified
-                        if pre_import_max_timestamp is None:
-                            cur.execute('UPDATE books SET timestamp = last_modified WHERE timestamp < last_modified')
-                        else:
-                            cur.execute('UPDATE books SET timestamp = last_modified WHERE last_modified > ? AND timestamp < last_modified', (pre_import_max_timestamp,))
-                        affected = cur.rowcount
-                        if affected:
-                            print(f"[ingest-processor] INFO: Updated timestamp for {affected} overwritten book(s) to reflect latest import.", flush=True)
-                except Exception as e:
-                    print(f"[ingest-processor] WARN: Failed to adjust timestamps after overwrite import: {e}", flush=True)
+            # Metadata fetch, KOReader checksums and thumbnails run once per batch (TaskEnrichBatch)
+            mark_ingest_batch_dirty(self.last_added_book_ids, auto_sends)
 
         except subprocess.CalledProcessError as e:
             print(f"[ingest-processor] {staged_path.stem} was not able to be added to the Calibre Library due to the following error:\nCALIBREDB EXIT/ERROR CODE: {e.returncode}\n{e.stderr}", flush=True)
@@ -1035,6 +1408,173 @@ class NewBookProcessor:
             if staged_path.exists():
                 os.remove(staged_path)
 
+    def _get_pre_import_max_timestamp(self):
+        """Max(books.timestamp) before an overwrite import, used to find rows the import touched."""
+        if self.cwa_settings.get('auto_ingest_automerge') != 'overwrite':
+            return None
+        try:
+            with sqlite3.connect(self.metadata_db, timeout=30) as con:
+                cur = con.cursor()
+                return cur.execute('SELECT MAX(timestamp) FROM books').fetchone()[0]
+        except Exception as e:
+            print(f"[ingest-processor] WARN: Could not read pre-import max timestamp: {e}", flush=True)
+            return None
+
+    def _run_calibredb_add(self, staged_path: Path, text: bool, format: str) -> None:
+        """Add a staged file with calibredb and record the resulting book id(s).
+
+        Raises subprocess.CalledProcessError if calibredb fails.
+        """
+        if text:
+            add_command = [
+                "calibredb", "add", str(staged_path), "--automerge", self.cwa_settings['auto_ingest_automerge'], f"--library-path={self.library_dir}"
+            ]
+        else:  # audiobook path
+            meta = audiobook.get_audio_file_info(str(staged_path), format, os.path.basename(str(staged_path)), False)
+
+            # Coalesce metadata to safe strings
+            _title = str(meta[2]) if meta[2] else Path(staged_path).stem
+            _authors = str(meta[3]) if meta[3] else ""
+            _tags = str(meta[6]) if meta[6] else ""
+            _series = str(meta[7]) if meta[7] else ""
+            _series_index = str(meta[8]) if meta[8] is not None and meta[8] != "" else None
+            _languages = str(meta[9]) if meta[9] else ""
+            _cover = meta[4] if meta[4] and isinstance(meta[4], str) else None
+
+            add_command = [
+                "calibredb", "add", str(staged_path), "--automerge", self.cwa_settings['auto_ingest_automerge'],
+                f"--library-path={self.library_dir}",
+            ]
+            if _title:
+                add_command.extend(["--title", _title])
+            if _authors:
+                add_command.extend(["--authors", _authors])
+            if _tags:
+                add_command.extend(["--tags", _tags])
+            if _series:
+                add_command.extend(["--series", _series])
+            if _series_index:
+                add_command.extend(["--series-index", str(_series_index)])
+            if _languages:
+                add_command.extend(["--languages", _languages])
+            if _cover and os.path.exists(_cover):
+                add_command.extend(["--cover", _cover])
+
+            # Add identifiers if present; expect entries like "isbn:12345"
+            try:
+                identifiers_list = meta[12] if isinstance(meta[12], (list, tuple)) else []
+            except Exception:
+                identifiers_list = []
+            for ident in identifiers_list:
+                if isinstance(ident, str) and ":" in ident and ident.strip():
+                    add_command.extend(["--identifier", ident.strip()])
+
+        result = subprocess.run(add_command, env=self.calibre_env, check=True, capture_output=True, text=True)
+        added_ids = self._parse_added_book_ids((result.stdout or '') + '\n' + (result.stderr or ''))
+        if added_ids:
+            self.last_added_book_ids = added_ids
+            self.last_added_book_id = added_ids[-1]
+        else:
+            self._fallback_last_added_book_id()
+
+    def _run_calibredb_add_batch(self, staged_paths: list[Path]) -> dict[str, list[int]]:
+        """Add several staged text files with one calibredb call.
+
+        Returns the book id(s) of each file keyed by its staged path; files calibre
+        skipped (e.g. duplicates with automerge=ignore) map to an empty list.
+        Raises subprocess.CalledProcessError if calibredb fails.
+        """
+        pre_import_max_timestamp = self._get_pre_import_max_timestamp()
+        add_command = [
+            "calibredb", "add", *[str(path) for path in staged_paths],
+            "--automerge", self.cwa_settings['auto_ingest_automerge'], f"--library-path={self.library_dir}"
+        ]
+        result = subprocess.run(add_command, env=self.calibre_env, check=True, capture_output=True, text=True)
+        added_ids, merged_ids = self._parse_batch_book_ids((result.stdout or '') + '\n' + (result.stderr or ''))
+        book_ids = self._map_batch_book_ids(staged_paths, added_ids, merged_ids)
+        print(f"[ingest-processor] Added {len(staged_paths)} files to Calibre database in one batch", flush=True)
+        self._update_import_timestamps(pre_import_max_timestamp, [ids[-1] for ids in book_ids.values() if ids])
+        gdrive_sync_if_enabled()
+        return book_ids
+
+    def _map_batch_book_ids(self, staged_paths: list[Path], added_ids: list[int], merged_ids: list[int]) -> dict[str, list[int]]:
+        """Work out which book each file of a batched calibredb add ended up in."""
+        mapping = {str(path): [] for path in staged_paths}
+        if not merged_ids and len(added_ids) == len(staged_paths):
+            # calibredb adds the files in order and new book ids only ever grow
+            for path, book_id in zip(staged_paths, sorted(added_ids)):
+                mapping[str(path)] = [book_id]
+            return mapping
+
+        # Some files were skipped or merged into existing books: match on format and
+        # the exact file size calibre recorded for it
+        candidate_ids = sorted(set(added_ids) | set(merged_ids))
+        if not candidate_ids:
+            return mapping
+        try:
+            with sqlite3.connect(self.metadata_db, timeout=30) as con:
+                placeholders = ",".join("?" * len(candidate_ids))
+                rows = con.execute(
+                    f"SELECT book, format, uncompressed_size FROM data WHERE book IN ({placeholders})",
+                    candidate_ids,
+                ).fetchall()
+        except Exception as e:
+            print(f"[ingest-processor] WARN: Could not map batched imports to book ids: {e}", flush=True)
+            return mapping
+        unclaimed = [(int(book), str(fmt).upper(), size) for book, fmt, size in rows]
+        for path in staged_paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            fmt = Path(path).suffix.lstrip('.').upper()
+            for row in unclaimed:
+                if row[1] == fmt and row[2] == size:
+                    mapping[str(path)] = [row[0]]
+                    unclaimed.remove(row)
+                    break
+        return mapping
+
+    def _update_import_timestamps(self, pre_import_max_timestamp, book_ids: list[int] | None = None) -> None:
+        # Ensure newly imported books have their timestamp set to the current time
+        # so they appear at the top of "Recently Added" views.
+        # calibredb sets timestamp from EPUB metadata (publication date), which can be
+        # years in the past, making new imports invisible in recently-added sorting.
+        if book_ids is None:
+            book_ids = [self.last_added_book_id] if self.last_added_book_id is not None else []
+        if book_ids:
+            try:
+                with sqlite3.connect(self.metadata_db, timeout=30) as con:
+                    if not self._register_title_sort_function(con):
+                        print("[ingest-processor] INFO: Skipping timestamp adjust (title_sort SQL function unavailable).", flush=True)
+                    else:
+                        cur = con.cursor()
+                        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S+00:00")
+                        cur.executemany('UPDATE books SET timestamp = ? WHERE id = ?', [(now, book_id) for book_id in book_ids])
+                        print(f"[ingest-processor] INFO: Set timestamp to {now} for newly imported book id(s)={', '.join(map(str, book_ids))}.", flush=True)
+            except Exception as e:
+                print(f"[ingest-processor] WARN: Failed to set timestamp for new book: {e}", flush=True)
+
+        # If we overwrote an existing book, Calibre does not bump books.timestamp, only last_modified.
+        # Update timestamp to last_modified for any rows changed by this import so sorting by 'new' reflects overwrites.
+        if self.cwa_settings.get('auto_ingest_automerge') == 'overwrite':
+            try:
+                with sqlite3.connect(self.metadata_db, timeout=30) as con:
+                    cur = con.cursor()
+                    if not self._register_title_sort_function(con):
+                        print("[ingest-processor] INFO: Skipping timestamp adjust (title_sort SQL function unavailable).", flush=True)
+                        return
+                    # pre_import_max_timestamp may be None (empty library) -> update all rows where timestamp < last_modified
+                    if pre_import_max_timestamp is None:
+                        cur.execute('UPDATE books SET timestamp = last_modified WHERE timestamp < last_modified')
+                    else:
+                        cur.execute('UPDATE books SET timestamp = last_modified WHERE last_modified > ? AND timestamp < last_modified', (pre_import_max_timestamp,))
+                    affected = cur.rowcount
+                    if affected:
+                        print(f"[ingest-processor] INFO: Updated timestamp for {affected} overwritten book(s) to reflect latest import.", flush=True)
+            except Exception as e:
+                print(f"[ingest-processor] WARN: Failed to adjust timestamps after overwrite import: {e}", flush=True)
+
     def _validate_book_exists(self, book_id: int) -> bool:
         """Check if a book with the given ID exists in the Calibre library"""
         try:
@@ -1060,25 +1600,31 @@ class NewBookProcessor:
             self.backup(self.filepath, backup_type="failed")
             return
 
+        # A job cancelled by now must not reach the library any more
+        check_job_cancelled()
+
         # Stage file for import
         staged_path = Path(self.staging_dir) / source_path.name
         try:
-            shutil.copy2(source_path, staged_path)
+            place_file(source_path, staged_path)
         except Exception as e:
             print(f"[ingest-processor] ERROR: Failed to stage file for add_format: {e}", flush=True)
             self.backup(self.filepath, backup_type="failed")
             return
 
         try:
-            result = subprocess.run([
-                "calibredb", "add_format", str(book_id), str(staged_path), f"--library-path={self.library_dir}"
-            ], env=self.calibre_env, check=True, capture_output=True, text=True)
-            print(f"[ingest-processor] Added new format for book id {book_id}: {os.path.basename(str(staged_path))}", flush=True)
-            mark_ingest_batch_dirty()
+            with library_write_stage():
+                result = subprocess.run([
+                    "calibredb", "add_format", str(book_id), str(staged_path), f"--library-path={self.library_dir}"
+                ], env=self.calibre_env, check=True, capture_output=True, text=True)
+                print(f"[ingest-processor] Added new format for book id {book_id}: {os.path.basename(str(staged_path))}", flush=True)
+                self.library_written = True
+                self.touched_book_ids.add(int(book_id))
+                # Optional post-add-format GDrive sync
+                gdrive_sync_if_enabled()
+            mark_ingest_batch_dirty([book_id])
             if self.cwa_settings['auto_backup_imports']:
                 self.backup(str(staged_path), backup_type="imported")
-            # Optional post-add-format GDrive sync
-            gdrive_sync_if_enabled()
         except subprocess.CalledProcessError as e:
             stderr_output = e.stderr if e.stderr else "No error details available"
             print(f"[ingest-processor] Failed to add format for book id {book_id}: {os.path.basename(str(staged_path))}\nCALIBREDB EXIT/ERROR CODE: {e.returncode}\nError details: {stderr_output}", flush=True)
@@ -1092,61 +1638,19 @@ class NewBookProcessor:
 
     def run_kindle_epub_fixer(self, filepath:str, dest=None) -> None:
         try:
-            EPUBFixer().process(input_path=filepath, output_path=dest)
+            run_in_stage_pool(self.cwa_settings, _stage_fix_epub, filepath, dest)
             print(f"[ingest-processor] {os.path.basename(filepath)} successfully processed with the cwa-kindle-epub-fixer!")
         except Exception as e:
             print(f"[ingest-processor] An error occurred while processing {os.path.basename(filepath)} with the kindle-epub-fixer. See the following error:\n{e}")
 
 
-    def fetch_metadata_if_enabled(self, book_title: str | None = None, book_id: int | None = None) -> None:
-        """Fetch and apply metadata for newly ingested books if enabled"""
-        if not _CPS_AVAILABLE:
-            print("[ingest-processor] CPS modules not available, skipping metadata fetch", flush=True)
-            return
-
-        if fetch_and_apply_metadata is None:
-            print("[ingest-processor] Metadata helper not available, skipping metadata fetch", flush=True)
-            return
-
-        try:
-            with sqlite3.connect(self.metadata_db, timeout=30) as con:
-                cur = con.cursor()
-                if book_id is not None:
-                    cur.execute("SELECT id, title FROM books WHERE id = ?", (int(book_id),))
-                else:
-                    # Fallback: most recently added book
-                    cur.execute("SELECT id, title FROM books ORDER BY timestamp DESC LIMIT 1")
-                result = cur.fetchone()
-
-            if not result:
-                print(f"[ingest-processor] Could not find book ID for metadata fetch: {book_title}", flush=True)
-                return
-                
-            book_id = int(result[0])
-            actual_title = result[1]
-
-            print(f"[ingest-processor] Attempting to fetch metadata for: {actual_title}", flush=True)
-
-            # Fetch and apply metadata (now admin-controlled only)
-            if fetch_and_apply_metadata(book_id):
-                print(f"[ingest-processor] Successfully fetched and applied metadata for: {actual_title}", flush=True)
-            else:
-                print(f"[ingest-processor] No metadata improvements found for: {actual_title}", flush=True)
-
-        except Exception as e:
-            print(f"[ingest-processor] Error fetching metadata: {e}", flush=True)
-
-
-    def trigger_auto_send_if_enabled(self, book_title: str | None = None, book_path: str | None = None, book_id: int | None = None) -> None:
-        """Trigger auto-send for users who have it enabled"""
-        if not _CPS_AVAILABLE:
-            print("[ingest-processor] CPS modules not available, skipping auto-send", flush=True)
-            return
-
-        if TaskAutoSend is None or WorkerThread is None:
-            print("[ingest-processor] Auto-send functionality not available, skipping auto-send", flush=True)
-            return
+    def auto_send_requests(self, book_title: str | None = None, book_id: int | None = None) -> list[dict]:
+        """Auto-send payloads for the users who have it enabled.
 
+        They are not scheduled here: they ride along in the batch marker and the post-batch
+        follow-up schedules them right behind the enrichment pass, so the eReader gets the
+        book with its fetched metadata and cover.
+        """
         try:
             with sqlite3.connect(self.metadata_db, timeout=30) as con:
                 cur = con.cursor()
@@ -1158,8 +1662,8 @@ class NewBookProcessor:
 
             if not result:
                 print(f"[ingest-processor] Could not find book ID for auto-send: {book_title}", flush=True)
-                return
-                
+                return []
+
             book_id = int(result[0])
             actual_title = result[1]
 
@@ -1194,158 +1698,425 @@ class NewBookProcessor:
                 ]
                 if not auto_send_users:
                     print(f"[ingest-processor] No CWA user matches subfolder '{target_username}', skipping auto-send", flush=True)
-                    return
+                    return []
 
             if not auto_send_users:
                 print(f"[ingest-processor] No users with auto-send enabled found", flush=True)
-                return
-                
-            # Queue or schedule auto-send tasks for each user
-            for user_id, username, kindle_mail in auto_send_users:
-                try:
-                    delay_minutes = self.cwa_settings.get('auto_send_delay_minutes', 5)
+                return []
 
-                    # Prefer to schedule in the long-lived web process so it shows in UI
-                    scheduled_via_api = False
-                    try:
-                        url = get_internal_api_url("/cwa-internal/schedule-auto-send")
-                        payload = {
-                            'book_id': int(book_id),
-                            'user_id': int(user_id),
-                            'delay_minutes': int(delay_minutes) if isinstance(delay_minutes, (int, float, str)) else 5,
-                            'username': username,
-                            'title': actual_title,
-                        }
-                        resp = requests.post(
-                            url,
-                            json=payload,
-                            headers=get_internal_api_headers(),
-                            timeout=5,
-                            verify=False,
-                        )
-                        if resp.status_code == 200:
-                            try:
-                                run_at = resp.json().get('run_at', 'soon')
-                            except Exception:
-                                run_at = 'soon'
-                            print(f"[ingest-processor] Scheduled auto-send at {run_at} for '{actual_title}' to user {username} ({kindle_mail}) via web process", flush=True)
-                            scheduled_via_api = True
-                        else:
-                            print(f"[ingest-processor] WARN: Web scheduling returned {resp.status_code}, falling back to immediate queue", flush=True)
-                    except Exception as api_err:
-                        print(f"[ingest-processor] WARN: Failed to schedule via web API: {api_err}. Falling back to immediate queue.", flush=True)
-
-                    if not scheduled_via_api:
-                        # Fallback: queue immediately in this process (task does not sleep)
-                        task_message = f"Auto-sending '{actual_title}' to {username}'s eReader(s)"
-                        task = TaskAutoSend(task_message, book_id, user_id, delay_minutes)
-                        WorkerThread.add(username, task)
-                        print(f"[ingest-processor] Queued auto-send immediately for '{actual_title}' to user {username} ({kindle_mail})", flush=True)
-                except Exception as e:
-                    print(f"[ingest-processor] Error queuing auto-send for user {username}: {e}", flush=True)
+            delay_minutes = self.cwa_settings.get('auto_send_delay_minutes', 5)
+            delay_minutes = int(delay_minutes) if isinstance(delay_minutes, (int, float, str)) else 5
+            requests_for_users = []
+            for user_id, username, kindle_mail in auto_send_users:
+                requests_for_users.append({
+                    'book_id': book_id,
+                    'user_id': int(user_id),
+                    'delay_minutes': delay_minutes,
+                    'username': username,
+                    'title': actual_title,
+                })
+                print(f"[ingest-processor] Auto-send of '{actual_title}' to user {username} ({kindle_mail}) will be scheduled after the batch enrichment", flush=True)
+            return requests_for_users
 
         except Exception as e:
             print(f"[ingest-processor] Error in auto-send trigger: {e}", flush=True)
+            return []
 
 
-    def generate_book_checksums(self, book_title: str, book_id: int | None = None) -> None:
-        """Generate and store partial MD5 checksums for all formats of a newly imported book
-
-        This creates KOReader-compatible checksums that allow reading progress to sync
-        between KOReader devices and Calibre-Web.
+    def set_library_permissions(self):
+        """Set abc:abc ownership on what this run wrote: metadata.db and the touched book folders.
 
-        Args:
-            book_title: Title of the book (used to find the book in Calibre database)
-            book_id: Optional ID of the book (more reliable than title lookup)
+        The recursive sweep over the whole library is the "Repair Library Permissions"
+        maintenance task in the admin panel.
         """
+        if not self.library_written:
+            return
+        if network_share_mode():
+            print(f"[ingest-processor] NETWORK_SHARE_MODE=true detected; skipping chown of {self.library_dir}", flush=True)
+            return
         try:
-            import sqlite3
-            # Import the centralized partial MD5 calculation function
-            sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-            from cps.progress_syncing.checksums import calculate_koreader_partial_md5, store_checksum, CHECKSUM_VERSION
+            _, failed = fix_touched_ownership(self.library_dir, self.metadata_db, self.touched_book_ids)
+            if failed:
+                print(f"[ingest-processor] WARN: Could not set ownership of {failed} path(s) in {self.library_dir} to abc:abc", flush=True)
+        except Exception as e:
+            print(f"[ingest-processor] An error occurred while attempting to set ownership of new files in {self.library_dir} to abc:abc. See the following error:\n{e}", flush=True)
 
-            calibre_db_path = os.path.join(self.library_dir, 'metadata.db')
 
-            with sqlite3.connect(calibre_db_path, timeout=30) as con:
-                cur = con.cursor()
+def get_daemon_port_file() -> str:
+    return os.environ.get(
+        "CWA_INGEST_DAEMON_PORT_FILE",
+        os.path.join(tempfile.gettempdir(), "cwa_ingest_daemon.port"),
+    )
 
-                book_row = None
-                if book_id is not None:
-                    # Find by ID (preferred)
-                    book_row = cur.execute(
-                        'SELECT id, path FROM books WHERE id = ?',
-                        (book_id,)
-                    ).fetchone()
-
-                if not book_row:
-                    # Fallback: Find the book ID by title (most recently added if multiple matches)
-                    book_row = cur.execute(
-                        'SELECT id, path FROM books WHERE title = ? ORDER BY timestamp DESC LIMIT 1',
-                        (book_title,)
-                    ).fetchone()
-
-                if not book_row:
-                    print(f"[ingest-processor] Could not find book '{book_title}' (ID: {book_id}) in database for checksum generation", flush=True)
-                    return
 
-                book_id, book_path = book_row
+def _is_within_root(filepath: str, root: str) -> bool:
+    try:
+        real_root = os.path.realpath(root)
+        real_path = os.path.realpath(filepath)
+        return os.path.commonpath([real_root, real_path]) == real_root
+    except (TypeError, ValueError):
+        return False
 
-                # Get all formats for this book
-                formats = cur.execute(
-                    'SELECT format, name FROM data WHERE book = ?',
-                    (book_id,)
-                ).fetchall()
 
-                if not formats:
-                    print(f"[ingest-processor] No formats found for book ID {book_id}", flush=True)
-                    return
+def _begin_daemon_job() -> bool:
+    """Take the ingest lock when the first concurrent job starts. Returns False if it is held elsewhere.
 
-                print(f"[ingest-processor] Generating KOReader sync checksums v{CHECKSUM_VERSION} for book ID {book_id}...", flush=True)
+    The lock is not held while the daemon is idle so that library refreshes and the DB
+    restore in the admin panel can still take it.
+    """
+    global process_lock, _runtime_initialized, _active_jobs
+    with _active_jobs_lock:
+        if _active_jobs == 0:
+            lock = ProcessLock()
+            if not lock.acquire(timeout=10):
+                return False
+            process_lock = lock
+            _ensure_processed_books_dirs()
+            _load_backup_destinations()
+            _runtime_initialized = True
+        _active_jobs += 1
+        return True
 
-                for format_ext, format_name in formats:
-                    # Construct full file path
-                    file_path = os.path.join(self.library_dir, book_path, f"{format_name}.{format_ext.lower()}")
 
-                    if not os.path.exists(file_path):
-                        print(f"[ingest-processor] WARN: File not found: {file_path}", flush=True)
-                        continue
+def _end_daemon_job() -> None:
+    global process_lock, _runtime_initialized, _active_jobs
+    with _active_jobs_lock:
+        _active_jobs -= 1
+        if _active_jobs == 0:
+            _runtime_initialized = False
+            if process_lock:
+                process_lock.release()
+            process_lock = None
 
-                    # Generate partial MD5 checksum using centralized function
-                    checksum = calculate_koreader_partial_md5(file_path)
 
-                    if checksum:
-                        # Store using centralized manager function
-                        success = store_checksum(
-                            book_id=book_id,
-                            book_format=format_ext.upper(),
-                            checksum=checksum,
-                            version=CHECKSUM_VERSION,
-                            db_connection=con
-                        )
+def _run_daemon_ingest(filepath: str) -> int:
+    """Process one file inside the daemon while holding the (shared) ingest lock."""
+    if not _begin_daemon_job():
+        return 2
+    try:
+        return int(main(filepath) or 0)
+    finally:
+        _end_daemon_job()
+
+
+# Job queue tunables (see IngestJobDispatcher)
+JOB_MAX_ATTEMPTS = 3  # a job still leased after this many daemon restarts is failed, not retried
+JOB_POLL_SECONDS = 2.0  # how often an idle dispatcher looks for jobs queued by other processes (web uploads)
+JOB_RESULT_HISTORY = 1024
+JOB_CANCEL_GRACE_SECONDS = 30.0  # how long CANCEL waits for the job to stop before replying
+JOB_LEASE_MARGIN_SECONDS = 300  # leases outlive the job deadline so a job winding down is not leased again
+EXIT_QUEUED = 3  # reported for a job deferred in the queue because the ingest lock is busy
+EXIT_TIMEOUT = 124  # a job cancelled by the service or past its deadline, as `timeout` reports it
+
+
+class IngestJobDispatcher:
+    """Runs the cwa_ingest_jobs queue inside the daemon, highest priority first.
+
+    Files from the ingest service and web uploads (queued by editbooks.upload with a
+    higher priority) land in the same table, so an upload overtakes a large folder
+    dump.  Jobs are leased while they run; after a crash or restart leased jobs are
+    requeued and everything still queued is picked up without rescanning the ingest
+    folder.  When the ingest lock is held by another process (library refresh, DB
+    restore) the job is deferred with exponential backoff instead of failing.
+
+    Each running job has a deadline (its lease) and can be cancelled on its own: its
+    converter processes are killed and it stops before writing to the library, while
+    the other jobs keep running.  Cancelled jobs are finished with EXIT_TIMEOUT rather
+    than requeued.
+    """
+
+    def __init__(self, max_jobs: int, watch_root: str):
+        self.watch_root = watch_root
+        self._slots = threading.BoundedSemaphore(max_jobs)
+        self._workers = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingest-job")
+        self._cond = threading.Condition()
+        self._wakeup = False
+        self._stopped = False
+        self._results: dict[int, int] = {}
+        self._jobs: dict[int, _JobControl] = {}
+        # path -> (sha256, size, mtime_ns) of the last submit, so the job does not hash the file again
+        self._hashed: dict[str, tuple] = {}
+
+    def start(self) -> None:
+        db = _get_cwa_db()
+        requeued, failed = db.ingest_job_recover(JOB_MAX_ATTEMPTS)
+        db.ingest_job_prune()
+        if requeued or failed:
+            print(f"[ingest-processor] Resuming ingest queue: {requeued} interrupted job(s) requeued, {failed} given up", flush=True)
+        threading.Thread(target=self._dispatch_loop, name="ingest-dispatcher", daemon=True).start()
+        threading.Thread(target=self._watchdog_loop, name="ingest-watchdog", daemon=True).start()
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._workers.shutdown(wait=False)
+
+    def submit(self, path: str, priority: int = 0, source: str = "watcher") -> int:
+        try:
+            stat = os.stat(path)
+            sha256 = file_sha256(path)
+        except OSError:
+            stat = sha256 = None
+        job_id = _get_cwa_db().ingest_job_enqueue(path, priority, source, sha256)
+        with self._cond:
+            if sha256 is not None:
+                self._hashed[path] = (sha256, stat.st_size, stat.st_mtime_ns)
+            self._wakeup = True
+            self._cond.notify_all()
+        return job_id
+
+    def wait(self, job_id: int, timeout: float | None = None) -> int | None:
+        """Block until the job finishes or is deferred; returns its exit code (EXIT_QUEUED if deferred).
+
+        Returns None if the job is still running after timeout seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: job_id in self._results, timeout):
+                return None
+            return self._results[job_id]
+
+    def cancel(self, job_id: int, reason: str = "cancelled by the ingest service") -> bool:
+        """Cancel one queued or running job. Returns False if there is no such job left to cancel."""
+        with self._cond:
+            control = self._jobs.get(job_id)
+            if control is not None:
+                control.cancel(reason)
+                return True
+        try:
+            cancelled = _get_cwa_db().ingest_job_cancel(job_id, EXIT_TIMEOUT, reason)
+        except sqlite3.Error as e:
+            print(f"[ingest-processor] WARN: Could not cancel ingest job {job_id}: {e}", flush=True)
+            return False
+        if cancelled:
+            self._set_result(job_id, EXIT_TIMEOUT)
+        return cancelled
+
+    def _set_result(self, job_id: int, exit_code: int) -> None:
+        with self._cond:
+            self._results[job_id] = exit_code
+            while len(self._results) > JOB_RESULT_HISTORY:
+                del self._results[next(iter(self._results))]
+            self._cond.notify_all()
+
+    def _lease_seconds(self, db) -> float:
+        # Matches the service's safety timeout (3x the configured ingest timeout)
+        return max(60, int(db.cwa_settings.get('ingest_timeout_minutes', 15) or 15) * 60 * 3)
+
+    def _dispatch_loop(self) -> None:
+        db = _get_cwa_db()
+        while not self._stopped:
+            self._slots.acquire()
+            job = None
+            try:
+                job = db.ingest_job_lease(self._lease_seconds(db) + JOB_LEASE_MARGIN_SECONDS)
+            except sqlite3.Error as e:
+                print(f"[ingest-processor] WARN: Could not lease ingest job: {e}", flush=True)
+            if job is None or self._stopped:
+                self._slots.release()
+                if job is not None:
+                    db.ingest_job_defer(job["id"], 0)
+                with self._cond:
+                    if not self._wakeup and not self._stopped:
+                        self._cond.wait(JOB_POLL_SECONDS)
+                    self._wakeup = False
+                continue
+            lease_seconds = self._lease_seconds(db)
+            with self._cond:
+                hashed = self._hashed.pop(job["path"], None)
+                source_hash = hashed if hashed and job.get("sha256") == hashed[0] else None
+                self._jobs[job["id"]] = _JobControl(job["id"], time.monotonic() + lease_seconds, source_hash)
+            self._workers.submit(self._run_job, job)
+
+    def _watchdog_loop(self) -> None:
+        while not self._stopped:
+            now = time.monotonic()
+            with self._cond:
+                overdue = [control for control in self._jobs.values()
+                           if now > control.deadline and not control.cancelled.is_set()]
+            for control in overdue:
+                print(f"[ingest-processor] WARN: Ingest job {control.job_id} ran past its deadline, cancelling it", flush=True)
+                control.cancel("timed out")
+            time.sleep(1)
 
-                        if success:
-                            print(f"[ingest-processor] Generated checksum {checksum} (v{CHECKSUM_VERSION}) for {format_ext.upper()} format", flush=True)
-                        else:
-                            print(f"[ingest-processor] WARN: Failed to store checksum for {format_ext.upper()} format", flush=True)
-                    else:
-                        print(f"[ingest-processor] WARN: Failed to generate checksum for {file_path}", flush=True)
+    def _run_job(self, job: dict) -> None:
+        exit_code, error = 1, ""
+        with self._cond:
+            control = self._jobs[job["id"]]
+        _daemon_state.job = control
+        try:
+            if _is_within_root(job["path"], self.watch_root):
+                exit_code = _run_daemon_ingest(job["path"])
+            else:
+                error = f"path outside of {self.watch_root}"
+                print(f"[ingest-processor] Daemon refused queued path outside of {self.watch_root}: {job['path']}", flush=True)
+        except Exception as e:
+            error = str(e)
+            print(f"[ingest-processor] Daemon failed to process {job['path']}: {e}", flush=True)
+        finally:
+            _daemon_state.job = None
+        if exit_code != 0 and control.cancelled.is_set():
+            exit_code, error = EXIT_TIMEOUT, control.reason
+        try:
+            db = _get_cwa_db()
+            if exit_code == 2:
+                delay = min(300, 5 * 2 ** min(job["deferrals"], 6))
+                db.ingest_job_defer(job["id"], delay, "ingest lock busy")
+                print(f"[ingest-processor] Ingest lock busy, {os.path.basename(job['path'])} stays queued (retry in {delay}s)", flush=True)
+                exit_code = EXIT_QUEUED
+            else:
+                db.ingest_job_finish(job["id"], exit_code, error)
+        except sqlite3.Error as e:
+            print(f"[ingest-processor] WARN: Could not update ingest job {job['id']}: {e}", flush=True)
+        finally:
+            with self._cond:
+                self._jobs.pop(job["id"], None)
+            control.done.set()
+            self._slots.release()
+            self._set_result(job["id"], exit_code)
+
+
+_job_dispatcher: IngestJobDispatcher | None = None
+
+
+def _handle_daemon_command(line: str, watch_root: str, send_progress=None) -> str:
+    """Execute a single daemon protocol line and return the reply line.
+
+    Protocol (one request per connection, newline terminated, after the AUTH line
+    checked by _serve_daemon_connection):
+        PING           -> PONG
+        INGEST <path>  -> JOB <id>      (sent first through send_progress once the file is queued)
+                       -> EXIT <code>   (same exit codes as a one-shot run)
+                       -> QUEUED <id>   (deferred in the job queue; the daemon retries it)
+        CANCEL <id>    -> EXIT <code>   (the job stopped within JOB_CANCEL_GRACE_SECONDS)
+                       -> CANCELLING <id> (still winding down, it will not write to the library)
+                       -> UNKNOWN <id>  (no such job queued or running)
+    """
+    command, _, argument = line.rstrip("\r\n").partition(" ")
+    if command == "PING":
+        return "PONG"
+    if command == "CANCEL":
+        if _job_dispatcher is None or not argument.isdigit():
+            return f"UNKNOWN {argument}"
+        job_id = int(argument)
+        if not _job_dispatcher.cancel(job_id):
+            return f"UNKNOWN {job_id}"
+        exit_code = _job_dispatcher.wait(job_id, JOB_CANCEL_GRACE_SECONDS)
+        return f"CANCELLING {job_id}" if exit_code is None else f"EXIT {exit_code}"
+    if command == "INGEST":
+        if not argument or not _is_within_root(argument, watch_root):
+            print(f"[ingest-processor] Daemon refused path outside of {watch_root}: {argument}", flush=True)
+            return "EXIT 1"
+        try:
+            if _job_dispatcher is None:
+                return f"EXIT {_run_daemon_ingest(argument)}"
+            job_id = _job_dispatcher.submit(argument)
+            if send_progress is not None:
+                send_progress(f"JOB {job_id}")
+            exit_code = _job_dispatcher.wait(job_id)
+            return f"QUEUED {job_id}" if exit_code == EXIT_QUEUED else f"EXIT {exit_code}"
+        except Exception as e:
+            print(f"[ingest-processor] Daemon failed to process {argument}: {e}", flush=True)
+            return "EXIT 1"
+    return "ERROR unknown command"
 
-                con.commit()
-                print(f"[ingest-processor] Checksum generation complete for book ID {book_id}", flush=True)
 
-        except Exception as e:
-            print(f"[ingest-processor] Error generating book checksums: {e}", flush=True)
-            # Don't fail the import if checksum generation fails
+def _serve_daemon_connection(conn: socket.socket, watch_root: str, token: str) -> None:
+    """Answer one request. The first line must be ``AUTH <token>`` with the token of the port file."""
+    with conn, conn.makefile("r", encoding="utf-8", errors="surrogateescape") as reader:
+        conn.settimeout(30)
+        try:
+            auth = reader.readline()
+            if not hmac.compare_digest(auth.rstrip("\r\n").encode("utf-8", errors="surrogateescape"),
+                                       f"AUTH {token}".encode("utf-8")):
+                print("[ingest-processor] WARN: Daemon refused a request without a valid token", flush=True)
+                conn.sendall(b"ERROR unauthorized\n")
+                return
+            line = reader.readline()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"[ingest-processor] WARN: Daemon could not read request: {e}", flush=True)
+            return
+        if not line:
+            return
+        def send_progress(message: str) -> None:
+            try:
+                conn.sendall((message + "\n").encode("utf-8", errors="surrogateescape"))
+            except OSError:
+                pass  # reported when the final reply cannot be sent either
 
-    def set_library_permissions(self):
+        reply = _handle_daemon_command(line, watch_root, send_progress)
         try:
-            nsm = os.getenv("NETWORK_SHARE_MODE", "false").strip().lower() in ("1", "true", "yes", "on")
-            if not nsm:
-                subprocess.run(["chown", "-R", "abc:abc", self.library_dir], check=True)
-            else:
-                print(f"[ingest-processor] NETWORK_SHARE_MODE=true detected; skipping chown of {self.library_dir}", flush=True)
-        except subprocess.CalledProcessError as e:
-            print(f"[ingest-processor] An error occurred while attempting to recursively set ownership of {self.library_dir} to abc:abc. See the following error:\n{e}", flush=True)
+            conn.sendall((reply + "\n").encode("utf-8", errors="surrogateescape"))
+        except OSError as e:
+            # The service gave up waiting (timeout) or was restarted; nothing to report to
+            print(f"[ingest-processor] WARN: Daemon could not send reply '{reply}': {e}", flush=True)
+
+
+def run_daemon(watch_root: str) -> int:
+    """Serve ingest requests from the cwa-ingest-service over a loopback socket.
+
+    Imports, cps initialisation and the CWA_DB connection are paid for once instead
+    of once per file. The listening port, PID and a random token are written to the port
+    file (mode 0600) so the service can reach the daemon (and cancel a single job when it
+    exceeds the safety timeout); requests without the token are refused, as any local
+    user can connect to a loopback port.
+    """
+    global _daemon_mode
+
+    _ensure_project_root_on_path()
+    _load_runtime_dependencies()
+    _load_optional_cps_modules()
+    _daemon_mode = True
+
+    port_file = get_daemon_port_file()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", int(os.environ.get("CWA_INGEST_DAEMON_PORT", "0") or 0)))
+    server.listen(16)
+    port = server.getsockname()[1]
+    token = secrets.token_hex(32)
+
+    def _remove_port_file():
+        try:
+            with open(port_file, "r", encoding="utf-8") as f:
+                if f.read().split()[1:2] == [str(os.getpid())]:
+                    os.remove(port_file)
+        except (OSError, IndexError):
+            pass
+
+    def _terminate(signum, frame):
+        sys.exit(0)
+
+    atexit.register(_remove_port_file)
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+
+    tmp_port_file = f"{port_file}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp_port_file):
+        os.remove(tmp_port_file)
+    with os.fdopen(os.open(tmp_port_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w", encoding="utf-8") as f:
+        f.write(f"{port} {os.getpid()} {token}\n")
+    os.replace(tmp_port_file, port_file)
+    print(f"[ingest-processor] Daemon listening on 127.0.0.1:{port} for {watch_root} (PID: {os.getpid()})", flush=True)
+
+    # Requests only queue their file and wait for it; the dispatcher runs up to
+    # max_jobs files at once, the stage helpers bound how many convert at once and
+    # library_write_stage() keeps calibredb writes one at a time.
+    global _job_dispatcher
+    max_jobs = max(1, int(os.environ.get("CWA_INGEST_MAX_PARALLEL_JOBS", "8") or 8))
+    _job_dispatcher = IngestJobDispatcher(max_jobs, watch_root)
+    _job_dispatcher.start()
+    requests_pool = ThreadPoolExecutor(max_workers=max_jobs + 4, thread_name_prefix="ingest-request")
+    try:
+        while True:
+            conn, _ = server.accept()
+            requests_pool.submit(_serve_daemon_connection, conn, watch_root, token)
+    finally:
+        server.close()
+        requests_pool.shutdown(wait=False)
+        _job_dispatcher.shutdown()
+        if _stage_pool is not None:
+            _stage_pool.shutdown(wait=False)
 
 
 def main(filepath=None):
@@ -1362,6 +2133,14 @@ def main(filepath=None):
     if filepath == "--post-batch-follow-up":
         return run_post_batch_follow_up()
 
+    if filepath == "--daemon":
+        if len(sys.argv) > 2:
+            watch_root = sys.argv[2]
+        else:
+            with open("/app/calibre-web-automated/dirs.json", "r") as f:
+                watch_root = json.load(f)["ingest_folder"]
+        return run_daemon(watch_root)
+
     nbp = None
     skip_delete = False
     try:
@@ -1467,6 +2246,13 @@ def main(filepath=None):
             skip_delete = True
             return 0
 
+        # Byte-identical re-drops of a book that is still in the library skip conversion and calibredb entirely
+        identical_book_id = nbp.find_identical_import()
+        if identical_book_id is not None:
+            print(f"[ingest-processor] {nbp.filename} is identical to a file already imported as book id {identical_book_id}, skipping import", flush=True)
+            nbp.db.import_add_entry(f"{Path(nbp.filename).stem} (identical to book {identical_book_id}, skipped)", "False")
+            return 0
+
         if nbp.is_target_format: # File can just be imported
             print(f"\n[ingest-processor]: No conversion needed for {nbp.filename}, importing now...", flush=True)
             nbp.add_book_to_library(filepath)
@@ -1481,9 +2267,11 @@ def main(filepath=None):
                     nbp.add_book_to_library(filepath)
                     convert_successful = False
                 elif nbp.target_format == "kepub": # File is not in the convert ignore list and target is kepub, so we start the kepub conversion process
-                    convert_successful, converted_filepath = nbp.convert_to_kepub()
+                    with nbp.timed_stage("convert", _file_size(filepath)):
+                        convert_successful, converted_filepath = nbp.convert_to_kepub()
                 else: # File is not in the convert ignore list and target is not kepub, so we start the regular conversion process
-                    convert_successful, converted_filepath = nbp.convert_book()
+                    with nbp.timed_stage("convert", _file_size(filepath)):
+                        convert_successful, converted_filepath = nbp.convert_book()
 
                 if convert_successful: # If previous conversion process was successful, remove tmp files and import into library
                     nbp.add_book_to_library(converted_filepath) # type: ignore
@@ -1521,6 +2309,11 @@ def main(filepath=None):
 
         return 0
 
+    except IngestJobCancelled as e:
+        print(f"[ingest-processor] Ingest of {os.path.basename(filepath)} cancelled ({e}), moving it to failed", flush=True)
+        if nbp:
+            nbp.backup(nbp.filepath, backup_type="failed")
+        return EXIT_TIMEOUT
     except Exception as e:
         print(f"[ingest-processor] Unexpected error during processing: {e}", flush=True)
         raise
@@ -1532,6 +2325,10 @@ def main(filepath=None):
             except Exception as e:
                 print(f"[ingest-processor] Error setting library permissions during cleanup: {e}", flush=True)
 
+            if nbp.library_written:
+                # End-to-end time of files that reached the library, the basis of the throughput figures
+                nbp.record_stage_timing("total", time.monotonic() - nbp.started_at, nbp.source_size or 0)
+
             try:
                 if skip_delete:
                     print(f"[ingest-processor] Skipping delete for ignored/temporary file: {nbp.filename}", flush=True)
@@ -0,0 +1,98 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Ownership repair for files CWA writes into the Calibre library.
+
+After an import only the book folders calibredb created or changed (plus
+metadata.db) need fixing, which keeps the cost per book independent of the
+library size.  The full recursive sweep is kept for the explicit maintenance
+task in the admin panel.
+"""
+
+import grp
+import os
+import pwd
+import sqlite3
+import subprocess
+
+LIBRARY_OWNER = "abc"
+METADATA_DB_SIDECARS = ("", "-wal", "-shm", "-journal")
+
+
+def network_share_mode() -> bool:
+    return os.getenv("NETWORK_SHARE_MODE", "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _library_owner_ids() -> tuple[int, int] | None:
+    try:
+        return pwd.getpwnam(LIBRARY_OWNER).pw_uid, grp.getgrnam(LIBRARY_OWNER).gr_gid
+    except KeyError:
+        return None
+
+
+def get_book_dirs(metadata_db: str, library_dir: str, book_ids) -> list[str]:
+    """Absolute author/title folders of the given books."""
+    book_ids = sorted({int(book_id) for book_id in book_ids if book_id is not None})
+    if not book_ids:
+        return []
+    placeholders = ",".join("?" * len(book_ids))
+    with sqlite3.connect(metadata_db, timeout=30) as con:
+        rows = con.execute(f"SELECT path FROM books WHERE id IN ({placeholders})", book_ids).fetchall()
+    return [os.path.join(library_dir, row[0]) for row in rows if row[0]]
+
+
+def fix_touched_ownership(library_dir: str, metadata_db: str, book_ids, owner_ids: tuple[int, int] | None = None) -> tuple[int, int]:
+    """chown metadata.db and the folders of the given books (not the rest of the library).
+
+    Returns (changed, failed) path counts.  Paths that already have the right owner
+    are left untouched.
+    """
+    owner_ids = owner_ids or _library_owner_ids()
+    if owner_ids is None:
+        return 0, 0
+    uid, gid = owner_ids
+
+    targets = [library_dir]
+    targets += [metadata_db + suffix for suffix in METADATA_DB_SIDECARS]
+    for book_dir in get_book_dirs(metadata_db, library_dir, book_ids):
+        targets.append(os.path.dirname(book_dir))  # author folder, may be new
+        targets.append(book_dir)
+        for root, dirs, files in os.walk(book_dir):
+            targets += [os.path.join(root, name) for name in dirs + files]
+
+    changed = failed = 0
+    for path in dict.fromkeys(targets):
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            continue
+        if st.st_uid == uid and st.st_gid == gid:
+            continue
+        try:
+            os.lchown(path, uid, gid)
+            changed += 1
+        except OSError:
+            failed += 1
+    return changed, failed
+
+
+def repair_library_ownership(library_dir: str, metadata_db: str | None = None) -> None:
+    """Recursive chown of the whole library.  Raises subprocess.CalledProcessError on failure.
+
+    With a split library metadata.db lives outside library_dir; its folder and its
+    files (not the rest of that folder) are chowned as well.
+    """
+    owner = f"{LIBRARY_OWNER}:{LIBRARY_OWNER}"
+    subprocess.run(["chown", "-R", owner, library_dir], check=True)
+    if not metadata_db:
+        return
+    real_library = os.path.realpath(library_dir)
+    metadata_dir = os.path.realpath(os.path.dirname(metadata_db))
+    if os.path.commonpath([real_library, metadata_dir]) == real_library:
+        return
+    targets = [os.path.dirname(metadata_db)]
+    targets += [metadata_db + suffix for suffix in METADATA_DB_SIDECARS if os.path.lexists(metadata_db + suffix)]
+    subprocess.run(["chown", owner] + targets, check=True)
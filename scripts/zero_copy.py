@@ -0,0 +1,97 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+"""Place a copy of a file without rewriting its bytes when the filesystem allows it.
+
+Tried in order: a hardlink, a reflink (FICLONE, btrfs/XFS/bcachefs), an in-kernel
+copy_file_range (server-side on NFS 4.2 and SMB), and finally a regular copy.
+The destination is always written under a temporary name and renamed into
+place, so an existing destination is replaced rather than truncated - which
+matters when it is itself a hardlink of some other file.
+"""
+
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+import uuid
+
+FICLONE = 0x40049409
+
+# Errors that mean "this method is not possible here", as opposed to a real I/O failure
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EACCES, errno.EOPNOTSUPP, errno.ENOTSUP,
+    errno.EINVAL, errno.ENOSYS, errno.EMLINK, errno.ENOTTY, errno.EBADF,
+}
+
+
+def _clone(src: str, dst: str) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_range(src: str, dst: str) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, 1 << 30))
+            if copied == 0:
+                break
+            remaining -= copied
+        if remaining > 0:
+            raise OSError(errno.EIO, "copy_file_range stopped early", src)
+
+
+def place_file(src: str, dst: str, allow_link: bool = True) -> str:
+    """Make dst a copy of src (dst may be a directory) and return the method used.
+
+    allow_link=False skips the hardlink step, for callers that may later modify
+    either file in place.  Raises OSError only if the plain copy fails too.
+    """
+    src = os.fspath(src)
+    dst = os.fspath(dst)
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    methods = []
+    if allow_link:
+        methods.append(("hardlink", None))
+    methods.append(("reflink", _clone))
+    if hasattr(os, "copy_file_range"):
+        methods.append(("copy_file_range", _copy_range))
+
+    dst_dir = os.path.dirname(dst) or "."
+    for name, method in methods:
+        tmp_path = os.path.join(dst_dir, f".tmp_{uuid.uuid4().hex}")
+        try:
+            if method is None:
+                os.link(src, tmp_path)
+            else:
+                method(src, tmp_path)
+                shutil.copystat(src, tmp_path)
+            os.replace(tmp_path, dst)
+            return name
+        except OSError as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=dst_dir)
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return "copy"
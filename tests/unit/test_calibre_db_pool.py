@@ -0,0 +1,186 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from cps import db
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def engine(tmp_path):
+    metadata_db = tmp_path / "metadata.db"
+    app_db = tmp_path / "app.db"
+    conn = sqlite3.connect(metadata_db)
+    conn.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.commit()
+    conn.close()
+    sqlite3.connect(app_db).close()
+
+    engine = db.CalibreDB._create_engine(str(metadata_db), str(app_db))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def writer(engine, tmp_path):
+    writer = db.CalibreDB._create_engine(str(tmp_path / "metadata.db"), str(tmp_path / "app.db"), writer=True)
+    yield writer
+    writer.dispose()
+
+
+def test_pooled_connections_are_attached_with_functions_and_read_only(engine):
+    with engine.connect() as first, engine.connect() as second:
+        assert first.connection.driver_connection is not second.connection.driver_connection
+        for conn in (first, second):
+            names = {row[1] for row in conn.exec_driver_sql("PRAGMA database_list")}
+            assert {"calibre", "app_settings"} <= names
+            assert conn.exec_driver_sql("SELECT lower('ÄB'), title_sort('The Book')").one()[0] == "ab"
+        with pytest.raises(OperationalError):
+            first.exec_driver_sql("INSERT INTO calibre.books (title) VALUES ('read only')")
+
+
+def test_writer_connection_is_handed_out_once_at_a_time(writer, monkeypatch):
+    monkeypatch.setattr(db, "_WRITER_TIMEOUT", 0.2)
+    with writer.connect() as conn:
+        conn.exec_driver_sql("INSERT INTO calibre.books (title) VALUES ('one')")
+
+        errors = []
+        blocked = threading.Thread(target=lambda: errors.append(pytest.raises(OperationalError, writer.connect)))
+        blocked.start()
+        blocked.join()
+        assert "timed out" in str(errors[0].value)
+
+        # A second checkout by the holder would wait for itself, it fails at once instead
+        with pytest.raises(OperationalError, match="already held"):
+            writer.connect()
+        conn.commit()
+
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(writer.connect().close()))
+    thread.start()
+    thread.join()
+    assert acquired == [None]
+
+
+def test_session_reads_from_pool_and_writes_through_writer(engine, writer):
+    session = db._CalibreSession(bind=engine, writer=writer)
+    assert session.execute(text("SELECT count(*) FROM calibre.books")).scalar() == 0
+    assert session.get_bind() is engine
+
+    session.execute(text("INSERT INTO calibre.books (title) VALUES ('two')"))
+    # The rest of the transaction stays on the writer and sees its own insert
+    assert session.get_bind() is writer
+    assert session.execute(text("SELECT count(*) FROM calibre.books")).scalar() == 1
+    session.commit()
+
+    assert session.get_bind() is engine
+    with writer.connect():
+        pass  # given back with the commit
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM calibre.books").scalar() == 1
+    session.close()
+
+
+def test_greenlets_sharing_a_session_do_not_interleave_while_waiting_for_the_writer(engine, writer):
+    gevent = pytest.importorskip("gevent")
+    session = db._CalibreSession(bind=engine, writer=writer)
+    order = []
+    held = threading.Event()
+
+    def hold_writer():
+        with writer.connect():
+            held.set()
+            time.sleep(0.2)
+            order.append("thread done")
+
+    def write():
+        session.execute(text("INSERT INTO calibre.books (title) VALUES ('three')"))
+        order.append("written")
+        session.commit()
+
+    def read():
+        order.append(("read", session.execute(text("SELECT count(*) FROM calibre.books")).scalar()))
+        session.commit()
+
+    holder = threading.Thread(target=hold_writer)
+    holder.start()
+    held.wait()
+    # The writing greenlet blocks for the writer, the reading one only runs once it committed
+    gevent.joinall([gevent.spawn(write), gevent.spawn(read)], raise_error=True)
+    holder.join()
+    assert order == ["thread done", "written", ("read", 1)]
+    session.close()
+
+
+def test_second_greenlet_of_the_writer_thread_fails_at_once(writer, monkeypatch):
+    gevent = pytest.importorskip("gevent")
+    monkeypatch.setattr(db, "_WRITER_TIMEOUT", 5)
+
+    def hold_writer():
+        with writer.connect():
+            gevent.sleep(0.1)
+
+    holder = gevent.spawn(hold_writer)
+    gevent.sleep(0)
+    started = time.monotonic()
+    with pytest.raises(OperationalError, match="already held"):
+        writer.connect()
+    assert time.monotonic() - started < 1
+    holder.join()
+    with writer.connect():
+        pass
+
+
+def test_library_stamp_ignores_row_changes_but_not_schema_or_replacement(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(db.CalibreDB, "engine", engine)
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("CREATE TABLE library_id (id INTEGER PRIMARY KEY, uuid TEXT)")
+    conn.execute("INSERT INTO library_id (uuid) VALUES ('lib-1')")
+    conn.commit()
+    conn.close()
+    stamp = db.CalibreDB._read_library_stamp(str(tmp_path))
+    assert stamp[-1] == "lib-1"
+
+    writer = db.CalibreDB._create_engine(str(tmp_path / "metadata.db"), str(tmp_path / "app.db"), writer=True)
+    with writer.connect() as conn:
+        conn.exec_driver_sql("INSERT INTO calibre.books (title) VALUES ('row change')")
+        conn.commit()
+    writer.dispose()
+    assert db.CalibreDB._read_library_stamp(str(tmp_path)) == stamp
+
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("CREATE TABLE custom_column_1 (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.commit()
+    conn.close()
+    schema_stamp = db.CalibreDB._read_library_stamp(str(tmp_path))
+    assert schema_stamp != stamp
+
+    # Another library in a file that kept the inode and the schema version
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("UPDATE library_id SET uuid = 'lib-2'")
+    conn.commit()
+    conn.close()
+    other_library_stamp = db.CalibreDB._read_library_stamp(str(tmp_path))
+    assert other_library_stamp[:4] == schema_stamp[:4]
+    assert other_library_stamp != schema_stamp
+
+    replacement = tmp_path / "replacement.db"
+    conn = sqlite3.connect(replacement)
+    conn.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.commit()
+    conn.close()
+    replacement.replace(tmp_path / "metadata.db")
+    assert db.CalibreDB._read_library_stamp(str(tmp_path))[2] != schema_stamp[2]
+    assert db.CalibreDB._read_library_stamp(str(tmp_path / "missing")) is None
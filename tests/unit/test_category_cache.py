@@ -0,0 +1,75 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, func, select
+from sqlalchemy.orm import Session, declarative_base
+
+from cps import category_cache
+
+
+pytestmark = pytest.mark.unit
+
+Base = declarative_base()
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    state = {"generation": 1, "user": "alice"}
+    monkeypatch.setattr(category_cache, "_entries", category_cache.OrderedDict())
+    monkeypatch.setattr(category_cache, "_generation", None)
+    monkeypatch.setattr(category_cache.library_changes, "generation", lambda: state["generation"])
+    monkeypatch.setattr(category_cache, "get_locale", lambda: "en")
+    monkeypatch.setattr(category_cache, "_visibility_key", lambda: (state["user"],))
+    return state
+
+
+def test_rows_and_mapped_objects_are_detached():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Tag(id=1, name="Fantasy"))
+        session.commit()
+        rows = session.execute(select(Tag, func.count(Tag.id).label("count")).group_by(Tag.id)).all()
+        detached = category_cache._detach((rows, 3))
+
+    entries, extra = detached
+    assert extra == 3
+    assert entries[0][0].name == "Fantasy" and entries[0][0].id == 1
+    assert not hasattr(entries[0][0], "_sa_instance_state")
+    assert entries[0].count == 1 and entries[0][1] == 1
+    with pytest.raises(AttributeError):
+        entries[0].format
+
+
+def test_entries_are_kept_per_user_until_the_library_changes(cache):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return [len(calls)]
+
+    assert category_cache.get("tags", build) == [1]
+    assert category_cache.get("tags", build) == [1]
+    cache["user"] = "bob"
+    assert category_cache.get("tags", build) == [2]
+    cache["generation"] = 2
+    cache["user"] = "alice"
+    assert category_cache.get("tags", build) == [3]
+
+
+def test_nothing_is_cached_without_a_library_generation(cache):
+    cache["generation"] = None
+    calls = []
+    category_cache.get("tags", lambda: calls.append(1))
+    category_cache.get("tags", lambda: calls.append(1))
+    assert len(calls) == 2
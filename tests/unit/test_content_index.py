@@ -0,0 +1,123 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sqlite3
+import zipfile
+
+import pytest
+from sqlalchemy import event
+
+from cps import db, search_index
+from cps.tasks import content_index
+
+
+pytestmark = pytest.mark.unit
+
+CONTAINER = """<?xml version="1.0"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+OPF = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0">
+  <manifest>
+    <item id="one" href="text/one.xhtml" media-type="application/xhtml+xml"/>
+    <item id="two" href="text/two.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine><itemref idref="two"/><itemref idref="one"/></spine>
+</package>"""
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    metadata_db = tmp_path / "metadata.db"
+    sqlite3.connect(metadata_db).close()
+    app_db = tmp_path / "app.db"
+    sqlite3.connect(app_db).close()
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(search_index, "_unavailable", False)
+
+    engine = db.CalibreDB._create_engine(str(metadata_db), str(app_db), writer=True)
+    yield engine
+    engine.dispose()
+
+
+def test_chunk_text_cuts_at_whitespace_and_keeps_offsets():
+    content = "alpha  beta\ngamma delta epsilon"
+    chunks = content_index.chunk_text(content, size=12)
+
+    normalized = "alpha beta gamma delta epsilon"
+    assert [chunk for __, chunk in chunks] == ["alpha beta", "gamma delta", "epsilon"]
+    for offset, chunk in chunks:
+        assert normalized[offset:offset + len(chunk)] == chunk
+
+
+def test_epub_text_follows_spine_order(tmp_path):
+    path = tmp_path / "book.epub"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr("META-INF/container.xml", CONTAINER)
+        archive.writestr("OEBPS/content.opf", OPF)
+        archive.writestr("OEBPS/text/one.xhtml", "<html><body><p>Second chapter</p></body></html>")
+        archive.writestr("OEBPS/text/two.xhtml",
+                         "<html><head><style>p {}</style></head><body><p>First chapter</p></body></html>")
+
+    text = content_index.extract_text(str(path), "epub")
+    assert text.index("First chapter") < text.index("Second chapter")
+    assert "p {}" not in text
+
+
+def test_content_hits_return_best_chunk_with_escaped_snippet(engine):
+    assert search_index.ensure_schema(engine)
+    with engine.connect() as conn:
+        search_index.store_book_content(conn, 1, "EPUB", 1.0, 10, [
+            (0, "The <whale> swam far away"),
+            (30, "whale whale whale in the deep sea"),
+        ])
+        search_index.store_book_content(conn, 2, "TXT", 1.0, 10, [(0, "A story about whalers")])
+        search_index.store_book_content(conn, 3, "PDF", 1.0, 10, [])
+        conn.commit()
+
+        assert search_index.indexed_content_files(conn) == {
+            1: ("EPUB", 1.0, 10), 2: ("TXT", 1.0, 10), 3: ("PDF", 1.0, 10)}
+
+        hits = search_index.content_hits(search_index.build_content_match_query("Whale"))
+        rows = conn.execute(hits.select().order_by(hits.c.score)).fetchall()
+        assert [row.book_id for row in rows] == [1, 2]
+        assert rows[0].char_offset == 30
+        assert "<mark>whale</mark>" in search_index.render_snippet(rows[0].snippet)
+        assert search_index.render_snippet("a <b>\x02x\x03") == "a &lt;b&gt;<mark>x</mark>"
+
+        search_index.drop_book_content(conn, [1])
+        conn.commit()
+        assert [row.book_id for row in conn.execute(hits.select())] == [2]
+
+
+def test_index_writes_each_batch_in_its_own_short_transaction(engine, monkeypatch):
+    assert search_index.ensure_schema(engine)
+    monkeypatch.setattr(content_index, "COMMIT_EVERY", 2)
+    task = content_index.TaskIndexBookContent.__new__(content_index.TaskIndexBookContent)
+    task.indexed = 0
+    checkouts = []
+    writer_held = []
+
+    def extracted(jobs):
+        for job in jobs:
+            # Extraction runs while nobody holds the writer connection
+            writer_held.append(engine.pool.checkedout())
+            yield job, [(0, "text of book {}".format(job[0]))]
+
+    monkeypatch.setattr(task, "_extracted", extracted)
+    event.listen(engine, "checkout", lambda *args: checkouts.append(1))
+    jobs = [(book_id, "/books/{}.epub".format(book_id), "EPUB", 1.0, 10) for book_id in (1, 2, 3)]
+
+    task._index(engine, jobs)
+
+    assert writer_held == [0, 0, 0]
+    assert len(checkouts) == 2
+    assert task.indexed == 3 and task.progress == 1
+    with engine.connect() as conn:
+        assert sorted(search_index.indexed_content_files(conn)) == [1, 2, 3]
@@ -0,0 +1,78 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import os
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def conversion_cache(monkeypatch):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    import conversion_cache as module
+    return module
+
+
+def test_put_then_get_round_trips_the_output(conversion_cache, tmp_path):
+    cache = conversion_cache.ConversionCache(1, cache_dir=str(tmp_path / "cache"))
+    output = tmp_path / "book.epub"
+    output.write_bytes(b"converted")
+    key = cache.make_key("abc", "epub", {"converter": "ebook-convert"})
+
+    assert cache.get(key, str(tmp_path / "miss.epub")) is False
+    cache.put(key, str(output))
+
+    restored = tmp_path / "restored.epub"
+    assert cache.get(key, str(restored)) is True
+    assert restored.read_bytes() == b"converted"
+
+
+def test_key_depends_on_source_format_and_options(conversion_cache):
+    make_key = conversion_cache.ConversionCache.make_key
+    base = make_key("abc", "epub", {"calibre": "7.0", "args": ["--inplace"]})
+
+    assert base == make_key("abc", "EPUB", {"args": ["--inplace"], "calibre": "7.0"})
+    assert base != make_key("abd", "epub", {"calibre": "7.0", "args": ["--inplace"]})
+    assert base != make_key("abc", "kepub", {"calibre": "7.0", "args": ["--inplace"]})
+    assert base != make_key("abc", "epub", {"calibre": "7.1", "args": ["--inplace"]})
+
+
+def test_least_recently_used_entries_are_evicted_over_budget(conversion_cache, tmp_path):
+    cache = conversion_cache.ConversionCache(1, cache_dir=str(tmp_path / "cache"))
+    payload = tmp_path / "payload"
+    payload.write_bytes(b"x" * 400 * 1024)
+
+    cache.put("aa" * 32, str(payload))
+    cache.put("bb" * 32, str(payload))
+    os.utime(cache._entry_path("aa" * 32), (1, 1))
+    os.utime(cache._entry_path("bb" * 32), (2, 2))
+    cache.get("aa" * 32, str(tmp_path / "touch"))  # a hit makes "aa" the most recent entry
+    cache.put("cc" * 32, str(payload))
+
+    assert os.path.exists(cache._entry_path("aa" * 32))
+    assert not os.path.exists(cache._entry_path("bb" * 32))
+    assert os.path.exists(cache._entry_path("cc" * 32))
+
+
+def test_disabled_cache_stores_nothing(conversion_cache, tmp_path):
+    cache = conversion_cache.ConversionCache(0, cache_dir=str(tmp_path / "cache"))
+    output = tmp_path / "book.epub"
+    output.write_bytes(b"converted")
+
+    cache.put("aa" * 32, str(output))
+
+    assert not cache.enabled
+    assert not (tmp_path / "cache").exists()
+
+
+def test_size_setting_defaults_to_the_schema_default(conversion_cache):
+    assert conversion_cache.ConversionCache.from_settings({}).max_bytes == 1024 * 1024 * 1024
+    assert not conversion_cache.ConversionCache.from_settings({"conversion_cache_max_mb": 0}).enabled
@@ -11,6 +11,7 @@ These tests verify the CWA_DB class functions correctly in isolation.
 """
 
 import pytest
+import sqlite3
 import sys
 from pathlib import Path
 
@@ -18,7 +19,7 @@ from pathlib import Path
 scripts_dir = Path(__file__).parent.parent.parent / "scripts"
 sys.path.insert(0, str(scripts_dir))
 
-from cwa_db import CWA_DB
+from cwa_db import CWA_DB, ActivitySink, flush_activity_log
 
 
 @pytest.mark.unit
@@ -90,6 +91,22 @@ class TestCWADBSettings:
         settings2 = temp_cwa_db.get_cwa_settings()
         assert settings1['auto_convert_target_format'] == settings2['auto_convert_target_format'] == 'mobi'
 
+    def test_new_instances_share_connection_and_settings_snapshot(self, temp_cwa_db, monkeypatch):
+        """Later instances skip schema reconciliation and see settings written by update_cwa_settings"""
+        def reconcile(self):
+            pytest.fail("schema reconciled again")
+        monkeypatch.setattr(CWA_DB, "ensure_settings_schema_match", reconcile)
+
+        other = CWA_DB()
+        assert other.con is temp_cwa_db.con
+        assert other.cur is not temp_cwa_db.cur
+
+        other.cwa_settings['auto_convert_target_format'] = 'changed locally'
+        assert CWA_DB().cwa_settings['auto_convert_target_format'] != 'changed locally'
+
+        temp_cwa_db.update_cwa_settings({'auto_convert_target_format': 'azw3'})
+        assert CWA_DB().cwa_settings['auto_convert_target_format'] == 'azw3'
+
 
 @pytest.mark.unit  
 class TestCWADBEnforcementLogging:
@@ -193,6 +210,119 @@ class TestCWADBImportLogging:
         assert result[3] == "false"  # original_backed_up
 
 
+@pytest.mark.unit
+class TestCWADBIngestHashes:
+    """Test the content-hash index used to skip identical re-imports."""
+
+    def test_hash_round_trip(self, temp_cwa_db):
+        """Verify a recorded hash maps back to its book and can be removed."""
+        digest = "ab" * 32
+        assert temp_cwa_db.ingest_hash_lookup(digest, 10) is None
+
+        temp_cwa_db.ingest_hash_add(digest, 10, 42, "book.epub")
+        assert temp_cwa_db.ingest_hash_lookup(digest, 10) == 42
+        assert temp_cwa_db.ingest_hash_lookup(digest, 11) is None
+
+        temp_cwa_db.ingest_hash_add(digest, 10, 43, "book.epub")
+        assert temp_cwa_db.ingest_hash_lookup(digest, 10) == 43
+
+        temp_cwa_db.ingest_hash_remove(digest, 10)
+        assert temp_cwa_db.ingest_hash_lookup(digest, 10) is None
+
+
+@pytest.mark.unit
+class TestCWADBIngestJobs:
+    """Test the durable ingest job queue."""
+
+    @pytest.fixture(autouse=True)
+    def empty_queue(self, temp_cwa_db):
+        temp_cwa_db.cur.execute("DELETE FROM cwa_ingest_jobs")
+        temp_cwa_db.con.commit()
+        yield
+        temp_cwa_db.cur.execute("DELETE FROM cwa_ingest_jobs")
+        temp_cwa_db.con.commit()
+
+    def test_duplicates_are_merged_by_path_and_hash(self, temp_cwa_db):
+        """Verify re-queuing an active file reuses its job and keeps the higher priority."""
+        first = temp_cwa_db.ingest_job_enqueue("/ingest/a.epub", sha256="aa")
+        assert temp_cwa_db.ingest_job_enqueue("/ingest/a.epub", priority=10, sha256="aa") == first
+
+        job = temp_cwa_db.ingest_job_lease(600)
+        assert (job["id"], job["priority"]) == (first, 10)
+        # Same path with new content while the old job runs gets a job of its own,
+        # which then absorbs further events for that path
+        second = temp_cwa_db.ingest_job_enqueue("/ingest/a.epub", sha256="bb")
+        assert second != first
+        assert temp_cwa_db.ingest_job_enqueue("/ingest/a.epub", sha256="cc") == second
+
+    def test_lease_order_and_expired_leases(self, temp_cwa_db):
+        """Verify higher priority leases first and expired leases are handed out again."""
+        low = temp_cwa_db.ingest_job_enqueue("/ingest/low.epub")
+        high = temp_cwa_db.ingest_job_enqueue("/ingest/high.epub", priority=10, source="upload")
+
+        assert temp_cwa_db.ingest_job_lease(-1)["id"] == high  # lease already expired
+        assert temp_cwa_db.ingest_job_lease(600)["id"] == high
+        assert temp_cwa_db.ingest_job_lease(600)["id"] == low
+        assert temp_cwa_db.ingest_job_lease(600) is None
+
+        temp_cwa_db.ingest_job_finish(high, 0)
+        temp_cwa_db.ingest_job_finish(low, 1, "conversion failed")
+        assert temp_cwa_db.ingest_job_counts() == {"done": 1, "failed": 1}
+
+    def test_deferred_jobs_wait_and_recovery_gives_up_eventually(self, temp_cwa_db):
+        """Verify deferral delays a job and repeatedly interrupted jobs are failed on recovery."""
+        job_id = temp_cwa_db.ingest_job_enqueue("/ingest/a.epub")
+        temp_cwa_db.ingest_job_lease(600)
+        temp_cwa_db.ingest_job_defer(job_id, 60, "ingest lock busy")
+        assert temp_cwa_db.ingest_job_lease(600) is None
+
+        other = temp_cwa_db.ingest_job_enqueue("/ingest/b.epub")
+        for _ in range(3):
+            assert temp_cwa_db.ingest_job_lease(600)["id"] == other
+            assert temp_cwa_db.ingest_job_recover(3) in ((1, 0), (0, 1))
+        assert temp_cwa_db.ingest_job_counts() == {"queued": 1, "failed": 1}
+
+
+@pytest.mark.unit
+class TestCWADBIngestTimings:
+    """Test per-file ingest stage timing records."""
+
+    def test_timing_is_recorded(self, temp_cwa_db):
+        """Verify a stage duration is stored with its file and stage name."""
+        temp_cwa_db.ingest_timing_add("book.epub", "readiness_wait", 0.25)
+
+        row = temp_cwa_db.cur.execute("SELECT filename, stage, seconds, size_bytes FROM cwa_ingest_timings").fetchone()
+        assert row == ("book.epub", "readiness_wait", 0.25, 0)
+
+    def test_performance_summary(self, temp_cwa_db):
+        """Verify throughput counts overlapping files once and stages get percentiles."""
+        temp_cwa_db.cur.execute("DELETE FROM cwa_ingest_timings")
+        rows = [
+            # Two files processed side by side between 12:00:00 and 12:01:00, then one alone
+            ("2026-01-05 12:01:00", "a.epub", "total", 60.0, 30 * 1024 * 1024),
+            ("2026-01-05 12:00:50", "b.epub", "total", 40.0, 30 * 1024 * 1024),
+            ("2026-01-05 13:00:30", "c.epub", "total", 30.0, 30 * 1024 * 1024),
+            ("2026-01-05 12:00:40", "a.epub", "convert", 30.0, 1024),
+            ("2026-01-05 12:00:20", "b.epub", "convert", 10.0, 1024),
+        ]
+        temp_cwa_db.cur.executemany(
+            "INSERT INTO cwa_ingest_timings(timestamp, filename, stage, seconds, size_bytes) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        temp_cwa_db.con.commit()
+
+        performance = temp_cwa_db.get_ingest_performance()
+
+        assert performance["summary"] == {"files": 3, "total_mb": 90.0, "books_per_min": 2.0, "mb_per_s": 1.0}
+        assert [stage["stage"] for stage in performance["stages"]] == ["convert", "total"]
+        assert performance["stages"][0]["p50"] == 10.0
+        assert performance["stages"][1]["p95"] == 60.0
+        assert performance["daily"] == [
+            {"date": "2026-01-05", "files": 3, "books_per_min": 2.0, "mb_per_s": 1.0, "p50": 40.0, "p95": 60.0}
+        ]
+        temp_cwa_db.cur.execute("DELETE FROM cwa_ingest_timings")
+        temp_cwa_db.con.commit()
+
+
 @pytest.mark.unit
 class TestCWADBConversionLogging:
     """Test format conversion logging."""
@@ -246,6 +376,7 @@ class TestCWADBUserFilters:
         # Insert activity for two users
         temp_cwa_db.log_activity(100, "User A", "LOGIN")
         temp_cwa_db.log_activity(101, "User B", "LOGIN")
+        assert flush_activity_log()
 
         stats = temp_cwa_db.get_dashboard_stats(days=1, user_id=[100, 101])
 
@@ -255,6 +386,47 @@ class TestCWADBUserFilters:
         assert stats["totals"]["active_users"] == 0
 
 
+@pytest.mark.unit
+class TestActivitySink:
+    """Test the batched user activity writer."""
+
+    @pytest.fixture
+    def activity_db(self, tmp_path):
+        db_file = str(tmp_path / "activity.db")
+        con = sqlite3.connect(db_file)
+        con.execute("CREATE TABLE cwa_user_activity (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, "
+                    "user_name TEXT, event_type TEXT, item_id INTEGER, item_title TEXT, extra_data TEXT, "
+                    "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        con.commit()
+        yield db_file, con
+        con.close()
+
+    def test_events_are_written_in_batches(self, activity_db):
+        db_file, con = activity_db
+        sink = ActivitySink(db_file, batch_size=3, interval=5)
+        for user_id in range(7):
+            assert sink.put((user_id, "user", "OPDS_ACCESS", None, None, None, "2026-01-01 10:00:00"))
+        assert sink.flush()
+
+        assert con.execute("SELECT COUNT(*), MIN(timestamp) FROM cwa_user_activity").fetchone() == \
+            (7, "2026-01-01 10:00:00")
+        assert sink.stats["written"] == 7
+        assert sink.stats["batches"] >= 3
+        sink.close()
+
+    def test_full_queue_drops_and_counts(self, activity_db, monkeypatch):
+        db_file, con = activity_db
+        sink = ActivitySink(db_file, max_queue=1)
+        monkeypatch.setattr(sink, "_start", lambda: None)
+        assert sink.put((1, "user", "LOGIN", None, None, None, "2026-01-01 10:00:00"))
+        assert not sink.put((2, "user", "LOGIN", None, None, None, "2026-01-01 10:00:00"))
+        assert sink.stats["dropped"] == 1
+
+        monkeypatch.undo()
+        assert sink.close()
+        assert con.execute("SELECT user_id FROM cwa_user_activity").fetchall() == [(1,)]
+
+
 @pytest.mark.unit
 class TestCWADBStatistics:
     """Test statistics aggregation functions."""
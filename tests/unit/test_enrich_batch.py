@@ -0,0 +1,167 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import column, create_engine, event
+
+from cps.progress_syncing import checksums
+from cps.services.worker import STAT_FINISH_SUCCESS
+from cps.tasks import enrich_batch
+
+
+pytestmark = pytest.mark.unit
+
+# Kept while collecting: some unit tests replace the cps and sqlalchemy modules with stubs, and
+# the task imports its helpers lazily and logs through the module of the calling frame
+_MODULES = {name: module for name, module in sys.modules.items()
+            if name.split(".")[0] in ("cps", "cwa_db", "flask", "flask_babel", "sqlalchemy", "werkzeug")}
+
+
+class FakeThumbnail:
+    # Core columns, so the filters of the existing thumbnail query can be built
+    type = column("type")
+    entity_id = column("entity_id")
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+        self.filename = None
+
+
+class FakeAppSession:
+    def __init__(self, events, existing):
+        self.events = events
+        self.existing = existing
+        self.added = []
+        self.deleted = []
+
+    def query(self, entity):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def __iter__(self):
+        return iter(self.existing)
+
+    def add(self, thumbnail):
+        self.added.append(thumbnail)
+
+    def flush(self):
+        for thumbnail in self.added:
+            thumbnail.filename = f"book_{thumbnail.entity_id}_r{thumbnail.resolution}.{thumbnail.format}"
+
+    def delete(self, thumbnail):
+        self.deleted.append(thumbnail)
+
+    def commit(self):
+        self.events.append(("app.db commit", len(self.added) - len(self.deleted)))
+
+    def rollback(self):
+        pass
+
+    def remove(self):
+        pass
+
+
+class FakeCover:
+    def __init__(self, events, blob=None):
+        self.events = events
+        self.width = 600
+        self.height = 900
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def clone(self):
+        return FakeCover(self.events)
+
+    def resize(self, width, height, filter):
+        self.width, self.height = width, height
+
+    def save(self, filename):
+        self.events.append(("render", self.format))
+        with open(filename, "wb") as image:
+            image.write(self.format.encode())
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    for name, module in _MODULES.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    events = []
+    library = tmp_path / "library"
+    for book_id in (1, 2):
+        (library / f"Author/Book {book_id}").mkdir(parents=True)
+        (library / f"Author/Book {book_id}/book.epub").write_bytes(b"epub %d" % book_id)
+        (library / f"Author/Book {book_id}/cover.jpg").write_bytes(b"cover")
+    books = [SimpleNamespace(id=book_id, path=f"Author/Book {book_id}", has_cover=True,
+                             data=[SimpleNamespace(name="book", format="EPUB")]) for book_id in (1, 2)]
+
+    engine = create_engine("sqlite://")
+    event.listen(engine, "commit", lambda conn: events.append(("metadata.db commit", None)))
+    stored = []
+
+    def store_checksum(book_id, book_format, checksum, version, db_connection=None, commit=True):
+        assert commit is False
+        db_connection.exec_driver_sql("SELECT 1")
+        stored.append((book_id, book_format))
+        return True
+
+    # Book 2 already has its small WEBP thumbnail
+    existing = [FakeThumbnail(entity_id=2, resolution=enrich_batch.constants.COVER_THUMBNAIL_SMALL, format="webp")]
+    app_session = FakeAppSession(events, existing)
+    keys = []
+    monkeypatch.setattr(checksums, "store_checksum", store_checksum)
+    monkeypatch.setattr(enrich_batch, "use_IM", True)
+    monkeypatch.setattr(enrich_batch, "Image", lambda blob: FakeCover(events, blob), raising=False)
+    monkeypatch.setattr(enrich_batch, "ub", SimpleNamespace(
+        Thumbnail=FakeThumbnail, init_db_thread=lambda: None, get_new_session_instance=lambda: app_session))
+    monkeypatch.setattr(enrich_batch, "calibre_db", SimpleNamespace(
+        writer_engine=engine, ensure_session=lambda: None, session=SimpleNamespace(expire_all=lambda: None)))
+    monkeypatch.setattr(enrich_batch, "CWA_DB", lambda: SimpleNamespace(
+        cwa_settings={}, ingest_timing_add=lambda *args: None))
+    monkeypatch.setattr(enrich_batch, "_load_books_by_ids", lambda book_ids: books)
+    monkeypatch.setattr(enrich_batch, "upsert_book_keys", lambda book_ids, settings, books: (
+        keys.append(([book.id for book in books], list(book_ids))), events.append(("cwa.db upsert", None))))
+    monkeypatch.setattr(enrich_batch.config, "get_book_path", lambda: str(library))
+    monkeypatch.setattr(enrich_batch.config, "config_use_google_drive", False, raising=False)
+
+    thumbnails = tmp_path / "thumbnails"
+    thumbnails.mkdir()
+    task = enrich_batch.TaskEnrichBatch([1, "2", 2, None])
+    task.cache = SimpleNamespace(get_cache_dir=lambda cache_type: str(thumbnails),
+                                 get_cache_file_path=lambda name, cache_type: str(thumbnails / name))
+    yield SimpleNamespace(task=task, events=events, stored=stored, keys=keys,
+                          app_session=app_session, thumbnails=thumbnails)
+    engine.dispose()
+
+
+def test_batch_is_written_once_per_database_after_all_files_were_read(batch):
+    batch.task.run(None)
+
+    assert batch.task.stat == STAT_FINISH_SUCCESS
+    assert batch.stored == [(1, "EPUB"), (2, "EPUB")]
+    assert batch.task.checksums_stored == 2
+
+    # Three sizes in two formats for book 1, one of them already exists for book 2
+    assert batch.task.thumbnails_generated == 11
+    assert ("book_2_r%d.webp" % enrich_batch.constants.COVER_THUMBNAIL_SMALL) not in \
+        {thumbnail.filename for thumbnail in batch.app_session.added}
+    assert sorted(path.name for path in batch.thumbnails.iterdir()) == \
+        sorted(thumbnail.filename for thumbnail in batch.app_session.added)
+    assert batch.keys == [([1, 2], [1, 2])]
+
+    writes = [name for name, __ in batch.events if name != "render"]
+    assert writes == ["metadata.db commit", "app.db commit", "cwa.db upsert"]
+    last_render = max(index for index, (name, __) in enumerate(batch.events) if name == "render")
+    assert last_render < batch.events.index(("metadata.db commit", None))
+    assert ("app.db commit", 11) in batch.events
@@ -0,0 +1,138 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def file_readiness(monkeypatch):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    import file_readiness as module
+    return module
+
+
+def write_slowly(path, chunks, delay):
+    with open(path, "ab") as f:
+        for _ in range(chunks):
+            f.write(b"x" * 1024)
+            f.flush()
+            time.sleep(delay)
+
+
+def test_file_untouched_for_the_settle_window_is_ready_at_once(file_readiness, tmp_path):
+    book = tmp_path / "book.epub"
+    book.write_bytes(b"epub")
+    os.utime(book, (time.time() - 60, time.time() - 60))
+
+    result = file_readiness.wait_until_ready(str(book), timeout=5, settle=0.5)
+
+    assert result.ready
+    assert result.waited < 0.2
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_growing_file_is_ready_only_after_writes_stop(file_readiness, tmp_path, monkeypatch, use_inotify):
+    if not use_inotify:
+        monkeypatch.setattr(file_readiness, "_InotifyWatch", lambda path: (_ for _ in ()).throw(OSError("no inotify")))
+    book = tmp_path / "book.pdf"
+    book.write_bytes(b"")
+    writer = threading.Thread(target=write_slowly, args=(book, 8, 0.1))
+    writer.start()
+
+    result = file_readiness.wait_until_ready(str(book), timeout=10, settle=0.3)
+    writer.join()
+
+    assert result.ready
+    assert book.stat().st_size == 8 * 1024
+    assert result.waited >= 0.7
+    assert result.method == ("inotify" if use_inotify else "stat")
+
+
+def test_times_out_while_the_file_keeps_changing(file_readiness, tmp_path):
+    book = tmp_path / "book.pdf"
+    book.write_bytes(b"")
+    writer = threading.Thread(target=write_slowly, args=(book, 15, 0.05))
+    writer.start()
+
+    result = file_readiness.wait_until_ready(str(book), timeout=0.4, settle=0.3)
+    writer.join()
+
+    assert not result.ready
+
+
+def test_vanished_file_is_not_ready(file_readiness, tmp_path):
+    book = tmp_path / "book.epub"
+    book.write_bytes(b"epub")
+    threading.Timer(0.1, book.unlink).start()
+
+    result = file_readiness.wait_until_ready(str(book), timeout=5, settle=1.0)
+
+    assert not result.ready
+    assert result.waited < 1.0
+    assert not file_readiness.wait_until_ready(str(tmp_path / "missing.epub"), timeout=1).ready
+
+
+def test_paused_writer_keeps_the_file_waiting_until_it_closes_it(file_readiness, tmp_path):
+    book = tmp_path / "book.epub"
+    book.write_bytes(b"")
+
+    def pausing_writer():
+        with open(book, "ab") as f:
+            f.write(b"x" * 1024)
+            f.flush()
+            # Longer than any settle window: only the close tells the file is complete
+            time.sleep(1.0)
+            f.write(b"y" * 1024)
+
+    writer = threading.Thread(target=pausing_writer)
+    writer.start()
+    time.sleep(0.05)
+    result = file_readiness.wait_until_ready(str(book), timeout=10)
+    writer.join()
+
+    assert result.ready
+    assert result.method == "inotify"
+    assert result.waited >= 0.9
+    assert book.stat().st_size == 2048
+
+
+def test_file_moved_over_the_one_being_written_is_ready(file_readiness, tmp_path):
+    book = tmp_path / "book.epub"
+    partial = open(book, "wb")
+    partial.write(b"partial")
+    partial.flush()
+    complete = tmp_path / "book.epub.tmp"
+    complete.write_bytes(b"complete")
+    threading.Timer(0.3, os.replace, (complete, book)).start()
+
+    try:
+        result = file_readiness.wait_until_ready(str(book), timeout=5)
+    finally:
+        partial.close()
+
+    assert result.ready
+    assert result.method == "inotify"
+    assert book.read_bytes() == b"complete"
+
+
+def test_network_shares_use_the_settle_window(file_readiness, tmp_path):
+    book = tmp_path / "book.epub"
+    book.write_bytes(b"epub")
+
+    result = file_readiness.wait_until_ready(str(book), timeout=5, settle=0.3, use_inotify=False)
+
+    assert result.ready
+    assert result.method == "stat"
+    assert file_readiness.DEFAULT_SETTLE_SECONDS >= 1.5
@@ -0,0 +1,139 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sqlite3
+import subprocess
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def ingest_processor(monkeypatch):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    import ingest_processor as module
+
+    monkeypatch.setattr(module, "_active_jobs", 0)
+    monkeypatch.setattr(module, "gdrive_sync_if_enabled", lambda: None)
+    return module
+
+
+def build_processor(ingest_processor, tmp_path, automerge="new_record"):
+    processor = object.__new__(ingest_processor.NewBookProcessor)
+    processor.cwa_settings = {"auto_ingest_automerge": automerge}
+    processor.metadata_db = str(tmp_path / "metadata.db")
+    processor.library_dir = str(tmp_path / "library")
+    processor.calibre_env = {}
+    processor.last_added_book_id = None
+    processor.last_added_book_ids = []
+    processor.filename = "book.epub"
+    processor.timings = []
+    processor.db = SimpleNamespace(ingest_timing_add=lambda filename, stage, seconds, size:
+                                   processor.timings.append((stage, size)))
+    return processor
+
+
+def staged_files(tmp_path, *contents):
+    paths = []
+    for index, payload in enumerate(contents):
+        job_dir = tmp_path / f"job_{index}"
+        job_dir.mkdir()
+        path = job_dir / f"book{index}.epub"
+        path.write_bytes(payload)
+        paths.append(path)
+    return paths
+
+
+def test_parse_batch_book_ids_separates_added_and_merged(ingest_processor):
+    output = "Added book ids: 12, 13\nMerged book ids: 4\n"
+    assert ingest_processor.NewBookProcessor._parse_batch_book_ids(output) == ([12, 13], [4])
+
+
+def test_batch_ids_map_in_order_when_every_file_was_added(ingest_processor, tmp_path):
+    processor = build_processor(ingest_processor, tmp_path)
+    paths = staged_files(tmp_path, b"a", b"bb", b"ccc")
+
+    mapping = processor._map_batch_book_ids(paths, [22, 20, 21], [])
+
+    assert mapping == {str(paths[0]): [20], str(paths[1]): [21], str(paths[2]): [22]}
+
+
+def test_batch_ids_map_by_size_when_files_were_skipped_or_merged(ingest_processor, tmp_path):
+    processor = build_processor(ingest_processor, tmp_path, automerge="overwrite")
+    paths = staged_files(tmp_path, b"a", b"bb", b"ccc")
+    with sqlite3.connect(processor.metadata_db) as con:
+        con.execute("CREATE TABLE data (book INTEGER, format TEXT, uncompressed_size INTEGER)")
+        con.executemany(
+            "INSERT INTO data VALUES (?, ?, ?)",
+            [(4, "EPUB", 3), (4, "PDF", 2), (30, "EPUB", 1), (99, "EPUB", 2)],
+        )
+
+    mapping = processor._map_batch_book_ids(paths, [30], [4])
+
+    assert mapping == {str(paths[0]): [30], str(paths[1]): [], str(paths[2]): [4]}
+
+
+def test_concurrent_jobs_share_one_calibredb_add(ingest_processor, monkeypatch, tmp_path):
+    processor = build_processor(ingest_processor, tmp_path)
+    paths = staged_files(tmp_path, b"a", b"bb", b"ccc")
+    monkeypatch.setenv("CWA_INGEST_BATCH_QUIET_SECONDS", "5")
+    monkeypatch.setattr(ingest_processor, "_active_jobs", len(paths))
+    monkeypatch.setattr(processor, "_get_pre_import_max_timestamp", lambda: None)
+    monkeypatch.setattr(processor, "_update_import_timestamps", lambda *args: None)
+    calls = []
+
+    def fake_run(command, **kwargs):
+        calls.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout="Added book ids: 7, 8, 9\n", stderr="")
+
+    monkeypatch.setattr(ingest_processor.subprocess, "run", fake_run)
+    batcher = ingest_processor.CalibredbAddBatcher()
+    results = {}
+
+    def job(path):
+        results[path.name] = batcher.add(processor, path)
+
+    threads = [threading.Thread(target=job, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(calls) == 1
+    assert sorted(calls[0][2:5]) == sorted(str(path) for path in paths)
+    assert sorted(results.values()) == [[7], [8], [9]]
+    # Every job records its wait, the calibredb run is recorded once for all files
+    assert sorted(processor.timings) == [("calibredb_add", 6), ("calibredb_batch_wait", 1),
+                                         ("calibredb_batch_wait", 2), ("calibredb_batch_wait", 3)]
+
+
+def test_single_file_and_failed_batches_fall_back_to_per_file_add(ingest_processor, monkeypatch, tmp_path):
+    processor = build_processor(ingest_processor, tmp_path)
+    paths = staged_files(tmp_path, b"a", b"bb")
+    monkeypatch.setattr(ingest_processor, "_active_jobs", 1)
+    batcher = ingest_processor.CalibredbAddBatcher()
+
+    assert batcher.add(processor, paths[0]) is None
+
+    def failing_batch(staged_paths):
+        raise subprocess.CalledProcessError(1, ["calibredb"])
+
+    monkeypatch.setattr(processor, "_run_calibredb_add_batch", failing_batch)
+    monkeypatch.setattr(ingest_processor, "_active_jobs", 2)
+    results = []
+    threads = [threading.Thread(target=lambda p=path: results.append(batcher.add(processor, p))) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert results == [None, None]
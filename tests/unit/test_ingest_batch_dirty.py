@@ -36,8 +36,13 @@ def build_processor(ingest_processor, tmp_path):
     processor.library_dir = str(tmp_path / "library")
     processor.last_added_book_id = None
     processor.last_added_book_ids = []
+    processor.touched_book_ids = set()
+    processor.library_written = False
+    processor.source_sha256 = None
+    processor.source_size = None
     processor.db = StubImportDb()
     processor.filepath = str(tmp_path / "source.epub")
+    processor.filename = "source.epub"
     processor.tmp_conversion_dir = str(tmp_path / "conversion")
     Path(processor.staging_dir).mkdir()
     Path(processor.library_dir).mkdir()
@@ -68,13 +73,12 @@ def test_successful_import_marks_batch_dirty_without_hot_loop_http_calls(monkeyp
 
     with mock.patch.object(ingest_processor.subprocess, "run", return_value=result) as run_mock, \
         mock.patch.object(ingest_processor, "gdrive_sync_if_enabled"), \
-        mock.patch.object(processor, "fetch_metadata_if_enabled"), \
-        mock.patch.object(processor, "trigger_auto_send_if_enabled"), \
-        mock.patch.object(processor, "generate_book_checksums"):
+        mock.patch.object(processor, "auto_send_requests", return_value=[]):
         processor.add_book_to_library(str(source))
 
     assert run_mock.call_args.args[0][:2] == ["calibredb", "add"]
     assert (tmp_path / "batch_dirty").exists()
+    assert ingest_processor.read_ingest_batch_book_ids(str(tmp_path / "batch_dirty")) == [7]
     assert processor.db.entries == [("source", "False")]
 
     called_urls = [call.args[0] for call in requests_mock.post.call_args_list if call.args]
@@ -134,3 +138,43 @@ def test_successful_add_format_marks_batch_dirty(monkeypatch, tmp_path):
 
     assert run_mock.call_args.args[0][:3] == ["calibredb", "add_format", "7"]
     assert (tmp_path / "batch_dirty").exists()
+
+
+def test_post_batch_follow_up_enriches_marked_books(monkeypatch, tmp_path):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    monkeypatch.setenv("CWA_INGEST_BATCH_DIRTY_FILE", str(tmp_path / "batch_dirty"))
+
+    import ingest_processor
+
+    auto_send = {"book_id": 8, "user_id": 2, "delay_minutes": 5, "username": "reader", "title": "Book"}
+    ingest_processor.mark_ingest_batch_dirty([7, 8])
+    ingest_processor.mark_ingest_batch_dirty([7], [auto_send])
+    (tmp_path / "batch_dirty").rename(tmp_path / "batch_dirty.running")
+
+    with mock.patch.object(ingest_processor, "_post_internal_endpoint", return_value=True) as post_mock:
+        assert ingest_processor.run_post_batch_follow_up() == 0
+
+    calls = [call.args for call in post_mock.call_args_list]
+    assert calls[0] == ("/cwa-internal/reconnect-db",)
+    assert calls[1] == ("/cwa-internal/enrich-batch", {"book_ids": [7, 8]})
+    assert calls[-1] == ("/cwa-internal/schedule-auto-send", auto_send)
+
+
+def test_post_batch_follow_up_keeps_auto_sends_for_the_retry(monkeypatch, tmp_path):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    monkeypatch.setenv("CWA_INGEST_BATCH_DIRTY_FILE", str(tmp_path / "batch_dirty"))
+
+    import ingest_processor
+
+    ingest_processor.mark_ingest_batch_dirty([8], [{"book_id": 8, "user_id": 2}])
+    (tmp_path / "batch_dirty").rename(tmp_path / "batch_dirty.running")
+
+    def post(path, payload=None):
+        return path != "/cwa-internal/enrich-batch"
+
+    with mock.patch.object(ingest_processor, "_post_internal_endpoint", side_effect=post) as post_mock:
+        assert ingest_processor.run_post_batch_follow_up() == 1
+
+    assert all(call.args[0] != "/cwa-internal/schedule-auto-send" for call in post_mock.call_args_list)
@@ -0,0 +1,392 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import socket
+import sys
+import time
+import threading
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def ingest_processor(monkeypatch, tmp_path):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    import ingest_processor as module
+
+    monkeypatch.setattr(module, "_ensure_processed_books_dirs", lambda: None)
+    monkeypatch.setattr(module, "_load_backup_destinations", lambda: None)
+    monkeypatch.setattr(module, "_daemon_mode", False)
+    monkeypatch.setattr(module, "_daemon_state", threading.local())
+    monkeypatch.setattr(module, "_active_jobs", 0)
+    monkeypatch.setattr(module, "_conversion_slots", None)
+    return module
+
+
+class StubLock:
+    acquired_count = 0
+    released_count = 0
+    available = True
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def acquire(self, timeout=5):
+        if not StubLock.available:
+            return False
+        StubLock.acquired_count += 1
+        return True
+
+    def release(self):
+        StubLock.released_count += 1
+
+
+@pytest.fixture
+def stub_lock(ingest_processor, monkeypatch):
+    StubLock.acquired_count = 0
+    StubLock.released_count = 0
+    StubLock.available = True
+    monkeypatch.setattr(ingest_processor, "ProcessLock", StubLock)
+    return StubLock
+
+
+def test_ping(ingest_processor, tmp_path):
+    assert ingest_processor._handle_daemon_command("PING\n", str(tmp_path)) == "PONG"
+
+
+def test_ingest_outside_watch_root_is_refused(ingest_processor, monkeypatch, tmp_path, stub_lock):
+    calls = []
+    monkeypatch.setattr(ingest_processor, "main", lambda path: calls.append(path))
+    watch = tmp_path / "watch"
+    watch.mkdir()
+
+    reply = ingest_processor._handle_daemon_command(f"INGEST {tmp_path / 'elsewhere.epub'}\n", str(watch))
+    assert reply == "EXIT 1"
+    reply = ingest_processor._handle_daemon_command(f"INGEST {watch}/../escape.epub\n", str(watch))
+    assert reply == "EXIT 1"
+    assert calls == []
+    assert stub_lock.acquired_count == 0
+
+
+def test_ingest_runs_main_under_lock_and_reports_exit_code(ingest_processor, monkeypatch, tmp_path, stub_lock):
+    watch = tmp_path / "watch"
+    watch.mkdir()
+    seen = []
+
+    def fake_main(path):
+        seen.append((path, ingest_processor._runtime_initialized, ingest_processor.process_lock is not None))
+        return 0
+
+    monkeypatch.setattr(ingest_processor, "main", fake_main)
+    target = str(watch / "odd name [1].epub")
+
+    assert ingest_processor._handle_daemon_command(f"INGEST {target}\n", str(watch)) == "EXIT 0"
+    assert seen == [(target, True, True)]
+    assert stub_lock.acquired_count == 1
+    assert stub_lock.released_count == 1
+    assert ingest_processor._runtime_initialized is False
+    assert ingest_processor.process_lock is None
+
+
+def test_busy_lock_and_failures_keep_one_shot_exit_codes(ingest_processor, monkeypatch, tmp_path, stub_lock):
+    watch = tmp_path / "watch"
+    watch.mkdir()
+
+    stub_lock.available = False
+    assert ingest_processor._handle_daemon_command(f"INGEST {watch}/a.epub", str(watch)) == "EXIT 2"
+
+    stub_lock.available = True
+
+    def broken_main(path):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ingest_processor, "main", broken_main)
+    assert ingest_processor._handle_daemon_command(f"INGEST {watch}/a.epub", str(watch)) == "EXIT 1"
+    assert stub_lock.released_count == 1
+
+
+def test_daemon_reuses_cwa_db_and_refreshes_settings(ingest_processor, monkeypatch):
+    created = []
+
+    class StubCWADB:
+        def __init__(self):
+            created.append(self)
+            self.reads = 0
+            self.cwa_settings = {"reads": 0}
+
+        def get_cwa_settings(self):
+            self.reads += 1
+            return {"reads": self.reads}
+
+    monkeypatch.setattr(ingest_processor, "CWA_DB", StubCWADB)
+
+    first = ingest_processor._get_cwa_db()
+    second = ingest_processor._get_cwa_db()
+    assert first is not second
+
+    monkeypatch.setattr(ingest_processor, "_daemon_mode", True)
+    warm = ingest_processor._get_cwa_db()
+    again = ingest_processor._get_cwa_db()
+    assert warm is again
+    assert again.cwa_settings == {"reads": 1}
+    assert len(created) == 3
+
+
+def test_connection_roundtrip(ingest_processor, monkeypatch, tmp_path, stub_lock):
+    watch = tmp_path / "watch"
+    watch.mkdir()
+    monkeypatch.setattr(ingest_processor, "main", lambda path: 0)
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve_once():
+        conn, _ = server.accept()
+        ingest_processor._serve_daemon_connection(conn, str(watch), "c0ffee")
+
+    worker = threading.Thread(target=serve_once)
+    worker.start()
+    with socket.create_connection(server.getsockname(), timeout=5) as client:
+        client.sendall(f"AUTH c0ffee\nINGEST {watch}/book.epub\n".encode())
+        reply = client.makefile("r").readline()
+    worker.join(timeout=5)
+    server.close()
+
+    assert reply == "EXIT 0\n"
+
+
+def test_overlapping_jobs_share_one_lock(ingest_processor, monkeypatch, tmp_path, stub_lock):
+    watch = tmp_path / "watch"
+    watch.mkdir()
+    first_started = threading.Event()
+    release_first = threading.Event()
+    replies = {}
+
+    def fake_main(path):
+        if path.endswith("first.epub"):
+            first_started.set()
+            release_first.wait(timeout=5)
+        return 0
+
+    monkeypatch.setattr(ingest_processor, "main", fake_main)
+
+    def run(name):
+        replies[name] = ingest_processor._handle_daemon_command(f"INGEST {watch}/{name}", str(watch))
+
+    first = threading.Thread(target=run, args=("first.epub",))
+    first.start()
+    assert first_started.wait(timeout=5)
+    run("second.epub")
+    assert ingest_processor._runtime_initialized is True
+    release_first.set()
+    first.join(timeout=5)
+
+    assert replies == {"first.epub": "EXIT 0", "second.epub": "EXIT 0"}
+    assert stub_lock.acquired_count == 1
+    assert stub_lock.released_count == 1
+    assert ingest_processor._runtime_initialized is False
+
+
+def test_conversion_stage_is_bounded_by_worker_setting(ingest_processor, monkeypatch):
+    monkeypatch.setattr(ingest_processor, "_daemon_mode", True)
+    settings = {"ingest_conversion_workers": 2}
+    assert ingest_processor.get_ingest_worker_count(settings) == 2
+    assert ingest_processor.get_ingest_worker_count({"ingest_conversion_workers": 0}) >= 1
+
+    running = 0
+    peak = 0
+    counter_lock = threading.Lock()
+    gate = threading.Barrier(2, timeout=5)
+
+    def convert():
+        nonlocal running, peak
+        with ingest_processor.conversion_stage(settings):
+            with counter_lock:
+                running += 1
+                peak = max(peak, running)
+            try:
+                gate.wait()
+            except threading.BrokenBarrierError:
+                pass
+            with counter_lock:
+                running -= 1
+
+    workers = [threading.Thread(target=convert) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert peak == 2
+
+
+def test_stage_pool_runs_inline_outside_daemon(ingest_processor):
+    assert ingest_processor.run_in_stage_pool({}, lambda a, b: a + b, 2, 3) == 5
+
+
+@pytest.fixture
+def job_queue(ingest_processor, monkeypatch):
+    """Daemon-mode CWA_DB per thread, with an empty cwa_ingest_jobs table."""
+    # Other test modules leave a stub cwa_db in sys.modules; load the real one
+    monkeypatch.delitem(sys.modules, "cwa_db", raising=False)
+    from cwa_db import CWA_DB
+
+    temp_cwa_db = CWA_DB()
+    temp_cwa_db.cur.execute("DELETE FROM cwa_ingest_jobs")
+    temp_cwa_db.con.commit()
+    monkeypatch.setattr(ingest_processor, "CWA_DB", CWA_DB)
+    monkeypatch.setattr(ingest_processor, "_daemon_mode", True)
+    monkeypatch.setattr(ingest_processor, "JOB_POLL_SECONDS", 0.05)
+    dispatchers = []
+
+    def make_dispatcher(max_jobs, watch):
+        dispatcher = ingest_processor.IngestJobDispatcher(max_jobs, str(watch))
+        dispatchers.append(dispatcher)
+        dispatcher.start()
+        return dispatcher
+
+    temp_cwa_db.make_dispatcher = make_dispatcher
+    yield temp_cwa_db
+    for dispatcher in dispatchers:
+        dispatcher.shutdown()
+    temp_cwa_db.cur.execute("DELETE FROM cwa_ingest_jobs")
+    temp_cwa_db.con.commit()
+    temp_cwa_db.con.close()
+
+
+def test_web_uploads_run_ahead_of_folder_jobs(ingest_processor, monkeypatch, tmp_path, stub_lock, job_queue):
+    watch = tmp_path / "watch"
+    order = []
+    first_started = threading.Event()
+    release_first = threading.Event()
+
+    def fake_main(path):
+        order.append(Path(path).name)
+        first_started.set()
+        release_first.wait(timeout=5)
+        return 0
+
+    monkeypatch.setattr(ingest_processor, "main", fake_main)
+    dump_ids = [job_queue.ingest_job_enqueue(f"{watch}/{name}") for name in ("dump1.epub", "dump2.epub", "dump3.epub")]
+    job_queue.ingest_job_enqueue(f"{watch}/upload.epub", priority=10, source="upload")
+
+    dispatcher = job_queue.make_dispatcher(1, watch)
+    assert first_started.wait(timeout=5)
+    assert dispatcher.submit(f"{watch}/dump3.epub") == dump_ids[2]  # duplicate of a queued job
+    release_first.set()
+    assert dispatcher.wait(dump_ids[2]) == 0
+
+    assert order == ["upload.epub", "dump1.epub", "dump2.epub", "dump3.epub"]
+    assert job_queue.ingest_job_counts() == {"done": 4}
+
+
+def test_interrupted_jobs_resume_after_restart(ingest_processor, monkeypatch, tmp_path, stub_lock, job_queue):
+    watch = tmp_path / "watch"
+    monkeypatch.setattr(ingest_processor, "main", lambda path: 0)
+    job_id = job_queue.ingest_job_enqueue(f"{watch}/crashed.epub")
+    assert job_queue.ingest_job_lease(600)["id"] == job_id  # the previous daemon died holding it
+
+    dispatcher = job_queue.make_dispatcher(2, watch)
+
+    assert dispatcher.wait(job_id) == 0
+    assert job_queue.ingest_job_counts() == {"done": 1}
+
+
+def test_busy_lock_defers_job_in_queue(ingest_processor, monkeypatch, tmp_path, stub_lock, job_queue):
+    watch = tmp_path / "watch"
+    stub_lock.available = False
+    dispatcher = job_queue.make_dispatcher(1, watch)
+    monkeypatch.setattr(ingest_processor, "_job_dispatcher", dispatcher)
+
+    reply = ingest_processor._handle_daemon_command(f"INGEST {watch}/busy.epub", str(watch))
+
+    job_id = int(reply.split()[1])
+    assert reply == f"QUEUED {job_id}"
+    row = job_queue.cur.execute(
+        "SELECT state, attempts, deferrals, not_before FROM cwa_ingest_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    assert row[:3] == ("queued", 0, 1)
+    assert row[3] > time.time()
+
+
+def test_cancel_kills_only_that_jobs_converter(ingest_processor, monkeypatch, tmp_path, stub_lock, job_queue):
+    watch = tmp_path / "watch"
+    started = threading.Event()
+    outcomes = {}
+
+    def fake_main(path):
+        if path.endswith("slow.epub"):
+            started.set()
+            try:
+                ingest_processor.run_job_subprocess([sys.executable, "-c", "import time; time.sleep(60)"], check=True)
+            except ingest_processor.IngestJobCancelled:
+                outcomes["slow"] = "cancelled"
+                return ingest_processor.EXIT_TIMEOUT
+            return 0
+        assert started.wait(timeout=5)
+        return 0
+
+    monkeypatch.setattr(ingest_processor, "main", fake_main)
+    dispatcher = job_queue.make_dispatcher(2, watch)
+    monkeypatch.setattr(ingest_processor, "_job_dispatcher", dispatcher)
+    slow_id = dispatcher.submit(f"{watch}/slow.epub")
+    fast_id = dispatcher.submit(f"{watch}/fast.epub")
+    assert started.wait(timeout=5)
+
+    began = time.monotonic()
+    assert ingest_processor._handle_daemon_command(f"CANCEL {slow_id}", str(watch)) == "EXIT 124"
+    assert time.monotonic() - began < 10
+    assert dispatcher.wait(fast_id, timeout=5) == 0
+    assert outcomes == {"slow": "cancelled"}
+    assert ingest_processor._handle_daemon_command(f"CANCEL {slow_id}", str(watch)) == f"UNKNOWN {slow_id}"
+    rows = dict(job_queue.cur.execute("SELECT id, state FROM cwa_ingest_jobs").fetchall())
+    assert rows == {slow_id: "failed", fast_id: "done"}
+
+
+def test_queued_job_can_be_cancelled_and_overdue_jobs_are_stopped(ingest_processor, monkeypatch, tmp_path, stub_lock, job_queue):
+    watch = tmp_path / "watch"
+    monkeypatch.setattr(ingest_processor.IngestJobDispatcher, "_lease_seconds", lambda self, db: 0.5)
+
+    def stuck_main(path):
+        ingest_processor.run_job_subprocess([sys.executable, "-c", "import time; time.sleep(60)"])
+        return 0
+
+    monkeypatch.setattr(ingest_processor, "main", stuck_main)
+    dispatcher = job_queue.make_dispatcher(1, watch)
+    stuck_id = dispatcher.submit(f"{watch}/stuck.epub")
+    waiting_id = dispatcher.submit(f"{watch}/waiting.epub")
+
+    assert dispatcher.cancel(waiting_id)
+    assert dispatcher.wait(waiting_id, timeout=1) == ingest_processor.EXIT_TIMEOUT
+    # The watchdog cancels the stuck job once it is past its deadline
+    assert dispatcher.wait(stuck_id, timeout=10) == ingest_processor.EXIT_TIMEOUT
+    assert job_queue.ingest_job_counts() == {"failed": 2}
+
+
+def test_connection_without_the_port_file_token_is_refused(ingest_processor, monkeypatch, tmp_path):
+    handled = []
+    monkeypatch.setattr(ingest_processor, "_handle_daemon_command",
+                        lambda line, watch_root, send_progress=None: handled.append(line) or "PONG")
+
+    def request(payload):
+        server, client = socket.socketpair()
+        with client:
+            client.sendall(payload)
+            ingest_processor._serve_daemon_connection(server, str(tmp_path), "c0ffee")
+            return client.makefile("r").read()
+
+    assert request(b"PING\n") == "ERROR unauthorized\n"
+    assert request(b"AUTH c0ffe\nPING\n") == "ERROR unauthorized\n"
+    assert handled == []
+    assert request(b"AUTH c0ffee\nPING\n") == "PONG\n"
+    assert handled == ["PING\n"]
@@ -0,0 +1,109 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+class StubHashDb:
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self.removed = []
+
+    def ingest_hash_lookup(self, sha256, size):
+        return self.known.get((sha256, size))
+
+    def ingest_hash_add(self, sha256, size, book_id, filename):
+        self.known[(sha256, size)] = book_id
+
+    def ingest_hash_remove(self, sha256, size):
+        self.removed.append((sha256, size))
+        self.known.pop((sha256, size), None)
+
+
+@pytest.fixture
+def ingest_processor(monkeypatch):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    import ingest_processor as module
+    return module
+
+
+def build_processor(ingest_processor, tmp_path, known=None, enabled=True):
+    source = tmp_path / "book.epub"
+    source.write_bytes(b"same bytes")
+    metadata_db = tmp_path / "metadata.db"
+    with sqlite3.connect(metadata_db) as con:
+        con.execute("CREATE TABLE IF NOT EXISTS books (id INTEGER PRIMARY KEY)")
+        con.execute("INSERT OR IGNORE INTO books (id) VALUES (7)")
+
+    processor = object.__new__(ingest_processor.NewBookProcessor)
+    processor.filepath = str(source)
+    processor.filename = source.name
+    processor.metadata_db = str(metadata_db)
+    processor.cwa_settings = {"ingest_skip_identical_files": enabled}
+    processor.db = StubHashDb(known)
+    processor.source_sha256 = None
+    processor.source_size = None
+    processor.last_added_book_id = None
+    return processor
+
+
+def test_identical_file_of_existing_book_is_detected(ingest_processor, tmp_path):
+    key = (hashlib.sha256(b"same bytes").hexdigest(), len(b"same bytes"))
+    processor = build_processor(ingest_processor, tmp_path, known={key: 7})
+
+    assert processor.find_identical_import() == 7
+
+
+def test_deleted_book_and_disabled_setting_let_the_file_through(ingest_processor, tmp_path):
+    key = (hashlib.sha256(b"same bytes").hexdigest(), len(b"same bytes"))
+    processor = build_processor(ingest_processor, tmp_path, known={key: 99})
+    assert processor.find_identical_import() is None
+    assert processor.db.removed == [key]
+
+    processor = build_processor(ingest_processor, tmp_path, known={key: 7}, enabled=False)
+    assert processor.find_identical_import() is None
+    assert (processor.source_sha256, processor.source_size) == key
+
+    processor = build_processor(ingest_processor, tmp_path, known={key: 7})
+    processor.cwa_settings["auto_ingest_automerge"] = "new_record"
+    assert processor.find_identical_import() is None
+
+
+def test_successful_import_records_hash(ingest_processor, tmp_path):
+    processor = build_processor(ingest_processor, tmp_path)
+    assert processor.find_identical_import() is None
+
+    processor.last_added_book_id = 7
+    processor.record_import_hash()
+
+    assert processor.find_identical_import() == 7
+
+
+def test_daemon_job_reuses_the_hash_taken_on_submit(ingest_processor, tmp_path, monkeypatch):
+    key = (hashlib.sha256(b"same bytes").hexdigest(), len(b"same bytes"))
+    processor = build_processor(ingest_processor, tmp_path, known={key: 7})
+    stat = Path(processor.filepath).stat()
+    hashed = []
+    file_sha256 = ingest_processor.file_sha256
+    monkeypatch.setattr(ingest_processor, "file_sha256", lambda path: hashed.append(path) or file_sha256(path))
+
+    control = ingest_processor._JobControl(1, 0, (key[0], stat.st_size, stat.st_mtime_ns))
+    monkeypatch.setattr(ingest_processor._daemon_state, "job", control, raising=False)
+    assert processor.find_identical_import() == 7
+    assert hashed == []
+
+    # Changed since the submit: hashed again
+    Path(processor.filepath).write_bytes(b"other bytes")
+    assert processor.find_identical_import() is None
+    assert hashed == [processor.filepath]
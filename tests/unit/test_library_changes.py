@@ -0,0 +1,150 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from cps import db, library_changes, search_index
+
+
+pytestmark = pytest.mark.unit
+
+SCHEMA = """
+CREATE TABLE library_id (id INTEGER PRIMARY KEY, uuid TEXT);
+CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, last_modified TEXT);
+CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_authors_link (id INTEGER PRIMARY KEY, book INTEGER, author INTEGER);
+CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_tags_link (id INTEGER PRIMARY KEY, book INTEGER, tag INTEGER);
+CREATE TABLE series (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_series_link (id INTEGER PRIMARY KEY, book INTEGER, series INTEGER);
+CREATE TABLE publishers (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_publishers_link (id INTEGER PRIMARY KEY, book INTEGER, publisher INTEGER);
+INSERT INTO library_id (uuid) VALUES ('lib-1');
+INSERT INTO books VALUES (1, 'One', '2026-01-01 10:00:00+00:00');
+INSERT INTO books VALUES (2, 'Two', '2026-01-01 10:00:00+00:00');
+INSERT INTO authors VALUES (1, 'Ann Author'), (2, 'Bob Writer');
+INSERT INTO books_authors_link (book, author) VALUES (1, 1), (2, 2);
+"""
+
+
+@pytest.fixture
+def engines(tmp_path, monkeypatch):
+    metadata_db = tmp_path / "metadata.db"
+    conn = sqlite3.connect(metadata_db)
+    conn.executescript(SCHEMA)
+    conn.close()
+    app_db = tmp_path / "app.db"
+    sqlite3.connect(app_db).close()
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(search_index, "_unavailable", False)
+    monkeypatch.setattr(library_changes, "_generation", None)
+    monkeypatch.setattr(library_changes, "_subscribers", [])
+
+    engines = (db.CalibreDB._create_engine(str(metadata_db), str(app_db)),
+               db.CalibreDB._create_engine(str(metadata_db), str(app_db), writer=True))
+    yield engines
+    for engine in engines:
+        engine.dispose()
+
+
+def _metadata(tmp_path, *statements):
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def test_first_poll_starts_history_without_reporting_existing_books(engines):
+    received = []
+    library_changes.subscribe(received.append)
+
+    start = library_changes.poll(*engines)
+
+    assert start == 1
+    assert [change.kind for change in received[0]] == [library_changes.KIND_RESET]
+    assert library_changes.changes_since(engines[0], start) == []
+    assert library_changes.changes_since(engines[0], start - 1) is None
+    assert library_changes.poll(*engines) == start
+    assert len(received) == 1
+
+
+def test_poll_records_added_modified_and_deleted_books(engines, tmp_path):
+    start = library_changes.poll(*engines)
+    received = []
+    library_changes.subscribe(received.append)
+
+    _metadata(tmp_path,
+              "INSERT INTO books VALUES (3, 'Three', '2026-02-01 10:00:00+00:00')",
+              "UPDATE books SET title = 'Uno', last_modified = '2026-02-02 10:00:00+00:00' WHERE id = 1",
+              "DELETE FROM books WHERE id = 2")
+    generation = library_changes.poll(*engines)
+
+    changes = library_changes.changes_since(engines[0], start)
+    assert generation == start + 3
+    assert sorted((change.book_id, change.kind) for change in changes) == [
+        (1, library_changes.KIND_MODIFIED), (2, library_changes.KIND_DELETED), (3, library_changes.KIND_ADDED)]
+    assert received == [changes]
+    assert library_changes.changes_since(engines[0], generation) == []
+
+
+def test_renamed_names_report_their_books(engines, tmp_path):
+    start = library_changes.poll(*engines)
+    # Same length, and no book's last_modified moves
+    _metadata(tmp_path, "UPDATE authors SET name = 'Ann Autor!' WHERE id = 1",
+              "INSERT INTO tags (id, name) VALUES (1, 'Unused')")
+
+    generation = library_changes.poll(*engines)
+
+    changes = library_changes.changes_since(engines[0], start)
+    assert [(change.book_id, change.kind) for change in changes] == [
+        (1, library_changes.KIND_MODIFIED), (None, library_changes.KIND_NAMES)]
+    assert generation == start + 2
+    assert library_changes.poll(*engines) == generation
+
+
+def test_switching_library_restarts_history(engines, tmp_path):
+    start = library_changes.poll(*engines)
+    _metadata(tmp_path, "UPDATE library_id SET uuid = 'lib-2'")
+
+    generation = library_changes.poll(*engines)
+
+    assert generation == start + 1
+    assert library_changes.changes_since(engines[0], start) is None
+    assert library_changes.changes_since(engines[0], generation) == []
+
+
+def test_poller_takes_the_writer_only_when_the_library_changed(engines, tmp_path, monkeypatch):
+    monkeypatch.setattr(library_changes, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(library_changes, "_poller", None)
+    monkeypatch.setattr(library_changes, "_engines", None)
+    checkouts = []
+    event.listen(engines[1], "checkout", lambda *args: checkouts.append(threading.current_thread()))
+
+    def wait_for(generation):
+        deadline = time.monotonic() + 5
+        while library_changes.generation() != generation and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return library_changes.generation()
+
+    library_changes.watch(*engines)
+    library_changes.start_poller()
+    assert wait_for(1) == 1
+    # Schema setup and the first poll wrote from the poller thread, never from this one
+    assert checkouts and threading.current_thread() not in checkouts
+
+    del checkouts[:]
+    time.sleep(0.3)
+    assert checkouts == []
+
+    _metadata(tmp_path, "INSERT INTO books VALUES (3, 'Three', '2026-02-01 10:00:00+00:00')")
+    assert wait_for(2) == 2
+    assert len(checkouts) == 1
@@ -0,0 +1,96 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import os
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def library_permissions(monkeypatch):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    import library_permissions as module
+    return module
+
+
+@pytest.fixture
+def library(tmp_path):
+    library_dir = tmp_path / "library"
+    for book_path in ("Author A/Book One (1)", "Author A/Book Two (2)", "Author B/Book Three (3)"):
+        book_dir = library_dir / book_path
+        book_dir.mkdir(parents=True)
+        (book_dir / "book.epub").write_bytes(b"epub")
+        (book_dir / "cover.jpg").write_bytes(b"jpg")
+    metadata_db = library_dir / "metadata.db"
+    with sqlite3.connect(metadata_db) as con:
+        con.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, path TEXT)")
+        con.executemany(
+            "INSERT INTO books VALUES (?, ?)",
+            [(1, "Author A/Book One (1)"), (2, "Author A/Book Two (2)"), (3, "Author B/Book Three (3)")],
+        )
+    return library_dir, metadata_db
+
+
+def test_only_touched_book_folders_and_metadata_db_are_chowned(library_permissions, library, monkeypatch):
+    library_dir, metadata_db = library
+    chowned = []
+    monkeypatch.setattr(library_permissions.os, "lchown", lambda path, uid, gid: chowned.append(path))
+
+    changed, failed = library_permissions.fix_touched_ownership(
+        str(library_dir), str(metadata_db), ["3"], owner_ids=(os.getuid() + 1, os.getgid())
+    )
+
+    book_dir = library_dir / "Author B" / "Book Three (3)"
+    assert sorted(chowned) == sorted(str(p) for p in (
+        library_dir, metadata_db, library_dir / "Author B", book_dir,
+        book_dir / "book.epub", book_dir / "cover.jpg",
+    ))
+    assert (changed, failed) == (6, 0)
+
+
+def test_correctly_owned_paths_are_skipped_and_failures_counted(library_permissions, library, monkeypatch):
+    library_dir, metadata_db = library
+    owner = (os.getuid(), os.getgid())
+    calls = []
+    monkeypatch.setattr(library_permissions.os, "lchown", lambda *args: calls.append(args))
+
+    assert library_permissions.fix_touched_ownership(str(library_dir), str(metadata_db), [1, 2], owner_ids=owner) == (0, 0)
+    assert calls == []
+
+    def deny(path, uid, gid):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(library_permissions.os, "lchown", deny)
+    changed, failed = library_permissions.fix_touched_ownership(
+        str(library_dir), str(metadata_db), [], owner_ids=(os.getuid() + 1, os.getgid())
+    )
+    assert (changed, failed) == (0, 2)
+
+
+def test_full_repair_also_chowns_metadata_db_of_a_split_library(library_permissions, tmp_path, monkeypatch):
+    library_dir = tmp_path / "books"
+    library_dir.mkdir()
+    metadata_dir = tmp_path / "calibre"
+    metadata_dir.mkdir()
+    for name in ("metadata.db", "metadata.db-wal", "app.db"):
+        (metadata_dir / name).write_bytes(b"")
+    commands = []
+    monkeypatch.setattr(library_permissions.subprocess, "run", lambda command, check: commands.append(command))
+
+    library_permissions.repair_library_ownership(str(library_dir), str(metadata_dir / "metadata.db"))
+    library_permissions.repair_library_ownership(str(library_dir), str(library_dir / "metadata.db"))
+
+    assert commands == [
+        ["chown", "-R", "abc:abc", str(library_dir)],
+        ["chown", "abc:abc", str(metadata_dir), str(metadata_dir / "metadata.db"), str(metadata_dir / "metadata.db-wal")],
+        ["chown", "-R", "abc:abc", str(library_dir)],
+    ]
@@ -14,7 +14,7 @@ Algorithm must match LuaJIT's bit.lshift behavior exactly.
 import pytest
 import hashlib
 
-from cps.progress_syncing.checksums import calculate_koreader_partial_md5
+from cps.progress_syncing.checksums import calculate_koreader_partial_md5, calculate_koreader_partial_md5_from_file
 
 
 @pytest.mark.unit
@@ -63,6 +63,13 @@ class TestCalculatePartialMD5:
     def test_empty_string_returns_none(self):
         assert calculate_koreader_partial_md5("") is None
 
+    def test_open_file_matches_path(self, tmp_path):
+        file = tmp_path / "test.bin"
+        file.write_bytes(bytes(range(256)) * 8192)
+
+        with open(file, "rb") as handle:
+            assert calculate_koreader_partial_md5_from_file(handle) == calculate_koreader_partial_md5(str(file))
+
 
 @pytest.mark.unit
 class TestKOReaderCompatibility:
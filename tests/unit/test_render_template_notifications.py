@@ -0,0 +1,69 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import pytest
+
+from cps import render_template
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def notification_state(monkeypatch):
+    monkeypatch.setattr(render_template, "_translation_gaps", {})
+    monkeypatch.setattr(render_template, "_notice_dates", {})
+    monkeypatch.setattr(render_template, "_duplicate_state", {})
+
+
+def test_translation_gaps_are_counted_once_per_locale(tmp_path, monkeypatch):
+    po_dir = tmp_path / "cps" / "translations" / "xx" / "LC_MESSAGES"
+    po_dir.mkdir(parents=True)
+    (po_dir / "messages.po").write_text(
+        'msgid ""\nmsgstr ""\n"Content-Type: text/plain; charset=UTF-8\\n"\n\n'
+        'msgid "Books"\nmsgstr "Bücher"\n\nmsgid "Shelves"\nmsgstr ""\n\nmsgid "Series"\nmsgstr ""\n',
+        encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    parsed = []
+    pofile = render_template.polib.pofile
+    monkeypatch.setattr(render_template.polib, "pofile", lambda path: parsed.append(path) or pofile(path))
+
+    assert render_template.translation_gap_count("xx") == 2
+    assert render_template.translation_gap_count("xx") == 2
+    assert render_template.translation_gap_count("yy") == 0
+    assert len(parsed) == 1
+
+
+def test_notice_dates_are_read_once_and_kept_when_written(tmp_path):
+    notice_file = str(tmp_path / "notice")
+    assert render_template._notice_date(notice_file) is None
+
+    render_template._set_notice_date(notice_file, "2026-01-01")
+    with open(notice_file, "w") as f:
+        f.write("2026-02-02")
+    assert render_template._notice_date(notice_file) == "2026-01-01"
+
+
+def test_duplicate_cache_is_deserialized_only_after_it_changed():
+    class FakeCwaDB:
+        marker = ("2026-01-01T10:00:00", 1, 0, 5, 20)
+        loads = 0
+
+        def get_duplicate_cache_marker(self):
+            return self.marker
+
+        def get_duplicate_cache(self):
+            self.loads += 1
+            return {"duplicate_groups": [], "scan_pending": False}
+
+    cwa_db = FakeCwaDB()
+    render_template._cached_duplicate_cache(cwa_db)
+    render_template._cached_duplicate_cache(cwa_db)
+    assert cwa_db.loads == 1
+
+    cwa_db.marker = ("2026-01-01T10:00:00", 1, 1, 5, 20)
+    render_template._cached_duplicate_cache(cwa_db)
+    assert cwa_db.loads == 2
@@ -0,0 +1,205 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sqlite3
+
+import pytest
+from sqlalchemy import column, event, select, table
+
+from cps import db, library_changes, search_index
+
+
+pytestmark = pytest.mark.unit
+
+SCHEMA = """
+CREATE TABLE library_id (id INTEGER PRIMARY KEY, uuid TEXT);
+CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, last_modified TEXT);
+CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_authors_link (id INTEGER PRIMARY KEY, book INTEGER, author INTEGER);
+CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_tags_link (id INTEGER PRIMARY KEY, book INTEGER, tag INTEGER);
+CREATE TABLE series (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_series_link (id INTEGER PRIMARY KEY, book INTEGER, series INTEGER);
+CREATE TABLE publishers (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE books_publishers_link (id INTEGER PRIMARY KEY, book INTEGER, publisher INTEGER);
+CREATE TABLE custom_column_1 (id INTEGER PRIMARY KEY, value TEXT);
+CREATE TABLE books_custom_column_1_link (id INTEGER PRIMARY KEY, book INTEGER, value INTEGER);
+INSERT INTO library_id (uuid) VALUES ('lib-1');
+INSERT INTO books VALUES (1, 'Der Zauberberg', '2026-01-01 10:00:00+00:00');
+INSERT INTO books VALUES (2, 'Harry Potter and the Stone', '2026-01-01 10:00:00+00:00');
+INSERT INTO authors VALUES (1, 'Thomas Mann'), (2, 'J. K. Rowling');
+INSERT INTO books_authors_link (book, author) VALUES (1, 1), (2, 2);
+INSERT INTO tags VALUES (1, 'Klassiker');
+INSERT INTO books_tags_link (book, tag) VALUES (1, 1);
+INSERT INTO custom_column_1 VALUES (1, 'Érdekes');
+INSERT INTO books_custom_column_1_link (book, value) VALUES (2, 1);
+"""
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    metadata_db = tmp_path / "metadata.db"
+    conn = sqlite3.connect(metadata_db)
+    conn.executescript(SCHEMA)
+    conn.close()
+    app_db = tmp_path / "app.db"
+    sqlite3.connect(app_db).close()
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(search_index, "_unavailable", False)
+    monkeypatch.setattr(library_changes, "_generation", None)
+    monkeypatch.setattr(library_changes, "_subscribers", [])
+
+    engine = db.CalibreDB._create_engine(str(metadata_db), str(app_db), writer=True)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def reader(engine, tmp_path):
+    reader = db.CalibreDB._create_engine(str(tmp_path / "metadata.db"), str(tmp_path / "app.db"))
+    yield reader
+    reader.dispose()
+
+
+def _search(engine, term):
+    match_query = search_index.build_match_query(term, db.lcase)
+    with engine.connect() as conn:
+        return sorted(row[0] for row in conn.execute(search_index.matching_book_ids(match_query)))
+
+
+def test_build_match_query_uses_normalized_prefix_tokens():
+    assert search_index.build_match_query("Zäuber-Berg", db.lcase) == \
+        '("zauber"* + "berg"*) OR authors : ("zauber"* AND "berg"*)'
+    assert search_index.build_match_query(" ++ ", db.lcase) is None
+
+
+def test_refresh_builds_index_over_metadata_fields(engine, reader):
+    assert search_index.refresh(reader, engine, [(1, "text"), (2, "datetime")])
+
+    assert _search(engine, "zauber") == [1]
+    assert _search(engine, "harry pot") == [2]
+    assert _search(engine, "rowling j") == [2]
+    assert _search(engine, "klassik") == [1]
+    assert _search(engine, "erdekes") == [2]
+    assert _search(engine, "potter harry") == []
+
+
+def test_refresh_picks_up_the_books_in_the_change_log(engine, reader, tmp_path):
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh(reader, engine, [])
+
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("UPDATE books SET title = 'Buddenbrooks', last_modified = '2026-02-01 10:00:00+00:00' "
+                 "WHERE id = 1")
+    conn.execute("DELETE FROM books WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh(reader, engine, [])
+    assert _search(engine, "buddenbrooks") == [1]
+    assert _search(engine, "zauberberg") == []
+    assert _search(engine, "harry") == []
+
+
+def test_refresh_follows_author_renames_and_leaves_the_writer_alone_while_current(engine, reader, tmp_path):
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh(reader, engine, [])
+    checkouts = []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(args))
+    assert search_index.refresh(reader, engine, [])
+    assert checkouts == []
+
+    # Renaming the author does not touch the book's last_modified
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("UPDATE authors SET name = 'Heinrich Mann' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh(reader, engine, [])
+    assert _search(engine, "heinrich") == [1]
+    assert _search(engine, "thomas") == []
+
+
+def _names(engine, kind, term):
+    with engine.connect() as conn:
+        return sorted(row[0] for row in conn.execute(
+            search_index.matching_name_ids(kind, db.normalize_name(term))))
+
+
+def test_normalized_names_follow_renames_and_deletes(engine, reader, tmp_path):
+    assert db.normalize_name("  J.  K.\tRówling ") == "j. k. rowling"
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh_names(reader, engine, db.normalize_name)
+
+    assert _names(engine, "authors", "ROWLING") == [2]
+    assert _names(engine, "authors", "k. row") == [2]
+    assert _names(engine, "tags", "klass") == [1]
+    assert _names(engine, "series", "x") == []
+
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("UPDATE authors SET name = 'Heinrich Männ' WHERE id = 1")
+    conn.execute("DELETE FROM authors WHERE id = 2")
+    # Same length as before, only the change log can tell
+    conn.execute("UPDATE tags SET name = 'Klassikar' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh_names(reader, engine, db.normalize_name)
+    assert _names(engine, "authors", "manns") == []
+    assert _names(engine, "authors", "heinrich mann") == [1]
+    assert _names(engine, "authors", "rowling") == []
+    assert _names(engine, "tags", "klassikar") == [1]
+
+
+def test_names_are_checked_without_the_writer_while_current(engine, reader):
+    assert library_changes.poll(reader, engine)
+    assert search_index.refresh_names(reader, engine, db.normalize_name)
+
+    checkouts = []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(args))
+    assert search_index.refresh_names(reader, engine, db.normalize_name)
+    assert checkouts == []
+
+
+def test_visible_books_set_is_rebuilt_for_new_fingerprint(engine, reader, tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "_visible_sets", {})
+    books = table("books", column("id"), column("title"))
+    book_ids = select(books.c.id).where(books.c.title.like("%Potter%"))
+    set_key = search_index.visible_set_key(["all", ["Fantasy"], [""], 0, [""], [""]])
+
+    def visible():
+        with engine.connect() as conn:
+            return sorted(row[0] for row in conn.execute(search_index.visible_book_ids(set_key)))
+
+    assert search_index.materialize_visible_books(reader, engine, set_key, "fp-1", book_ids)
+    assert visible() == [2]
+
+    conn = sqlite3.connect(tmp_path / "metadata.db")
+    conn.execute("INSERT INTO books VALUES (3, 'Potter Again', '2026-03-01 10:00:00+00:00')")
+    conn.commit()
+    conn.close()
+
+    assert search_index.materialize_visible_books(reader, engine, set_key, "fp-1", book_ids)
+    assert visible() == [2]
+    assert search_index.materialize_visible_books(reader, engine, set_key, "fp-2", book_ids)
+    assert visible() == [2, 3]
+
+
+def test_stored_visible_set_is_found_without_the_writer(engine, reader, monkeypatch):
+    monkeypatch.setattr(search_index, "_visible_sets", {})
+    books = table("books", column("id"))
+    set_key = search_index.visible_set_key(["de", [""], [""], 0, [""], [""]])
+    assert search_index.materialize_visible_books(reader, engine, set_key, "fp-1", select(books.c.id))
+
+    # Stored before a restart: the in-process cache is empty, the stored set only has to be read
+    search_index._visible_sets.clear()
+    checkouts = []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(args))
+    assert search_index.materialize_visible_books(reader, engine, set_key, "fp-1", select(books.c.id))
+    assert checkouts == []
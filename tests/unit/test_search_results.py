@@ -0,0 +1,121 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import sqlite3
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event, true
+from sqlalchemy.orm import Session, configure_mappers
+
+from cps import db, search, search_index, ub
+
+
+pytestmark = pytest.mark.unit
+
+# Configured while collecting: some unit tests swap out the sqlalchemy modules, and a mapper
+# that first configures during such a test stays broken for the rest of the run
+configure_mappers()
+_SQLALCHEMY_MODULES = {name: module for name, module in sys.modules.items()
+                       if name == "sqlalchemy" or name.startswith("sqlalchemy.")}
+
+TITLES = ["Alpha Book", "Beta Book", "Gamma Book", "Delta Book", "Epsilon Book", "Unrelated"]
+
+
+@pytest.fixture
+def calibre(tmp_path, monkeypatch):
+    for name, module in _SQLALCHEMY_MODULES.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    metadata_db = tmp_path / "metadata.db"
+    app_db = tmp_path / "app.db"
+    sqlite3.connect(metadata_db).close()
+    with create_engine(f"sqlite:///{app_db}").begin() as conn:
+        ub.ReadBook.__table__.create(conn)
+        ub.ArchivedBook.__table__.create(conn)
+        ub.Shelf.__table__.create(conn)
+        ub.BookShelf.__table__.create(conn)
+        # Book 2 is finished for user 1, so advanced search for unread books has to leave it out
+        conn.execute(ub.ReadBook.__table__.insert(),
+                     [{"book_id": 2, "user_id": 1, "read_status": ub.ReadBook.STATUS_FINISHED}])
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(search_index, "_unavailable", False)
+
+    engine = db.CalibreDB._create_engine(str(metadata_db), str(app_db), writer=True)
+    with engine.begin() as conn:
+        db.Base.metadata.create_all(conn)
+        conn.execute(db.Authors.__table__.insert(), [{"id": 1, "name": "Author", "sort": "Author", "link": ""}])
+        conn.execute(db.Books.__table__.insert(), [
+            {"id": book_id, "title": title, "sort": title, "author_sort": "Author", "path": f"Author/{book_id}",
+             "has_cover": 0, "uuid": f"uuid-{book_id}"} for book_id, title in enumerate(TITLES, start=1)])
+        conn.execute(db.books_authors_link.insert(),
+                     [{"book": book_id, "author": 1} for book_id in range(1, len(TITLES) + 1)])
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    user = SimpleNamespace(id=1, filter_language=lambda: "all")
+    calibre_db = db.CalibreDB.__new__(db.CalibreDB)
+    calibre_db.session = Session(engine)
+    calibre_db.writer_engine = None
+    monkeypatch.setattr(calibre_db, "ensure_session", lambda: None, raising=False)
+    monkeypatch.setattr(calibre_db, "create_functions", lambda config=None: None, raising=False)
+    monkeypatch.setattr(calibre_db, "common_filters", lambda *args, **kwargs: true(), raising=False)
+    monkeypatch.setattr(search_index, "build_match_query", lambda term, lcase: None)
+    monkeypatch.setattr(db, "current_user", user)
+    monkeypatch.setattr(ub, "current_user", user)
+    monkeypatch.setattr(ub, "searched_ids", {})
+    config = SimpleNamespace(config_read_column=0, config_columns_to_ignore="")
+    yield SimpleNamespace(db=calibre_db, config=config, user=user, statements=statements)
+    calibre_db.session.close()
+    engine.dispose()
+
+
+def test_search_pages_in_sql_and_stores_all_hit_ids(calibre):
+    entries, count, pagination = calibre.db.get_search_results(
+        "book", calibre.config, 2, [[db.Books.sort]], 2)
+
+    assert count == 5
+    assert [entry.Books.title for entry in entries] == ["Delta Book", "Epsilon Book"]
+    assert [author.name for author in entries[0].Books.authors] == ["Author"]
+    assert pagination.total_count == 5
+    assert ub.searched_ids[1] == [1, 2, 4, 5, 3]
+    assert any("count(DISTINCT books.id)" in statement for statement in calibre.statements)
+    assert any("LIMIT" in statement and "OFFSET" in statement for statement in calibre.statements)
+
+
+def test_search_joined_on_tags_counts_and_stores_each_book_once(calibre):
+    with calibre.db.session.get_bind().begin() as conn:
+        conn.execute(db.Tags.__table__.insert(), [{"id": 1, "name": "One"}, {"id": 2, "name": "Two"}])
+        conn.execute(db.books_tags_link.insert(), [{"book": 1, "tag": 1}, {"book": 1, "tag": 2}])
+
+    __, count, pagination = calibre.db.get_search_results(
+        "book", calibre.config, 0, [[db.Books.sort]], 2,
+        db.books_tags_link, db.Books.id == db.books_tags_link.c.book, db.Tags)
+
+    assert count == 5
+    assert pagination.total_count == 5
+    assert ub.searched_ids[1] == [1, 2, 4, 5, 3]
+
+
+def test_advanced_search_with_read_status_counts_ids_and_pages(calibre, monkeypatch):
+    monkeypatch.setattr(search, "calibre_db", calibre.db)
+    monkeypatch.setattr(search, "config", calibre.config)
+    monkeypatch.setattr(search, "current_user", calibre.user)
+    monkeypatch.setattr(search, "flask_session", {})
+    monkeypatch.setattr(search, "render_title_template", lambda template, **values: values)
+    monkeypatch.setattr(search, "_", lambda message, **values: message % values)
+    term = {"authors": "", "title": "book", "publisher": "", "read_status": "False"}
+    for element in ['tag', 'serie', 'shelf', 'language', 'extension']:
+        term['include_' + element] = term['exclude_' + element] = []
+
+    page = search.render_adv_search_results(term, 1, [[db.Books.sort], "stored"], 2)
+
+    assert page["result_count"] == 4
+    assert [entry.Books.title for entry in page["entries"]] == ["Delta Book", "Epsilon Book"]
+    assert page["pagination"].total_count == 4
+    assert ub.searched_ids[1] == [1, 4, 5, 3]
+    assert any(statement.startswith("SELECT DISTINCT books.id AS books_id \nFROM") for statement in calibre.statements)
@@ -0,0 +1,72 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+
+from cps import ub
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def app_db(monkeypatch):
+    engine = create_engine("sqlite://")
+    ub.User_Sessions.__table__.create(engine)
+    conn = engine.connect()
+    monkeypatch.setattr(ub, "session", conn)
+    monkeypatch.setattr(ub, "_valid_sessions", ub.OrderedDict())
+    monkeypatch.setattr(ub, "_pending_expiry", {})
+    # A flush is due SESSION_EXPIRY_FLUSH_INTERVAL after the last one, not counted from import
+    monkeypatch.setattr(ub, "_last_expiry_flush", time.monotonic())
+    yield conn
+    conn.close()
+    engine.dispose()
+
+
+def _row(row_id, session_key, days):
+    return SimpleNamespace(id=row_id, session_key=session_key,
+                           expiry=int((datetime.now() + timedelta(days=days)).timestamp()))
+
+
+def test_validated_sessions_are_cached_until_forgotten(app_db):
+    ub.remember_session(1, "key", "rnd", _row(5, "key", 31))
+    ub.remember_session(1, "", "other", _row(6, "key", 31))
+    ub.remember_session(2, "key2", "rnd2", _row(7, "key2", 31))
+
+    assert ub.cached_session_valid("1", "key", "rnd")
+    assert not ub.cached_session_valid(1, "key", "wrong")
+
+    ub.forget_user_sessions(1, "key")
+    assert not ub.cached_session_valid(1, "key", "rnd")
+    assert not ub.cached_session_valid(1, "", "other")
+    assert ub.cached_session_valid(2, "key2", "rnd2")
+
+    ub.forget_user_sessions(2)
+    assert not ub.cached_session_valid(2, "key2", "rnd2")
+
+
+def test_expiry_extensions_are_written_in_one_batch(app_db):
+    table = ub.User_Sessions.__table__
+    app_db.execute(table.insert(), [{"id": 5, "user_id": 1, "session_key": "a", "random": "r1", "expiry": 1},
+                                    {"id": 6, "user_id": 2, "session_key": "b", "random": "r2", "expiry": 1}])
+    app_db.commit()
+
+    ub.remember_session(1, "a", "r1", _row(5, "a", 2))
+    ub.remember_session(2, "b", "r2", _row(6, "b", 2))
+    ub.remember_session(2, "c", "r3", _row(7, "c", 31))
+    assert sorted(ub._pending_expiry) == [5, 6]
+    assert app_db.execute(table.select().where(table.c.expiry == 1)).fetchall() != []
+
+    ub.flush_session_expiry(force=True)
+    expiries = dict(app_db.execute(table.select().with_only_columns(table.c.id, table.c.expiry)).fetchall())
+    assert min(expiries.values()) > (datetime.now() + timedelta(days=30)).timestamp()
+    assert ub._pending_expiry == {}
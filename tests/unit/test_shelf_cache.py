@@ -0,0 +1,82 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+from types import SimpleNamespace
+
+import pytest
+
+from cps import shelf_cache, ub
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    monkeypatch.setattr(shelf_cache, "_shelves", {})
+    monkeypatch.setattr(shelf_cache, "_magic_shelves", {})
+    calls = []
+
+    def build(user_id):
+        calls.append(user_id)
+        return [SimpleNamespace(id=1, name="Public", is_public=1, user_id=1, book_count=len(calls))]
+
+    monkeypatch.setattr(shelf_cache, "_build_shelves", build)
+    return calls
+
+
+def _session(*changes):
+    # Instances without running the mapped __init__, only their type matters to the listeners
+    return SimpleNamespace(new=[change.__new__(change) for change in changes], dirty=[], deleted=[], info={})
+
+
+def test_shelves_are_built_once_per_user_and_handed_out_as_copies(builds):
+    shelves = shelf_cache.shelves_for_user(2)
+    shelves[0].book_count = 99
+    shelves.pop()
+
+    assert [shelf.book_count for shelf in shelf_cache.shelves_for_user("2")] == [1]
+    shelf_cache.shelves_for_user(3)
+    assert builds == [2, 3]
+
+
+def test_cache_is_cleared_only_after_committing_a_shelf_change(builds):
+    shelf_cache.shelves_for_user(2)
+
+    unrelated = _session(ub.Downloads)
+    shelf_cache._note_flushed_changes(unrelated, None)
+    shelf_cache._clear_after_commit(unrelated)
+    assert shelf_cache._shelves
+
+    rolled_back = _session(ub.BookShelf)
+    shelf_cache._note_flushed_changes(rolled_back, None)
+    assert shelf_cache._shelves
+    shelf_cache._forget_rolled_back_changes(rolled_back, None)
+    shelf_cache._clear_after_commit(rolled_back)
+    assert shelf_cache._shelves
+
+    committed = _session(ub.HiddenMagicShelfTemplate)
+    shelf_cache._note_flushed_changes(committed, None)
+    shelf_cache._clear_after_commit(committed)
+    assert not shelf_cache._shelves
+    assert shelf_cache.shelves_for_user(2)[0].book_count == 2
+
+
+def test_build_overlapping_a_clear_is_not_stored(builds, monkeypatch):
+    build = shelf_cache._build_shelves
+
+    def build_during_commit(user_id):
+        shelves = build(user_id)
+        shelf_cache.clear()
+        return shelves
+
+    monkeypatch.setattr(shelf_cache, "_build_shelves", build_during_commit)
+    assert shelf_cache.shelves_for_user(2)[0].book_count == 1
+    assert not shelf_cache._shelves
+
+    monkeypatch.setattr(shelf_cache, "_build_shelves", build)
+    assert shelf_cache.shelves_for_user(2)[0].book_count == 2
+    assert shelf_cache.shelves_for_user(2)[0].book_count == 2
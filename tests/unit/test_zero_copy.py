@@ -0,0 +1,77 @@
+# Calibre-Web Automated – fork of Calibre-Web
+# Copyright (C) 2018-2026 Calibre-Web contributors
+# Copyright (C) 2024-2026 Calibre-Web Automated contributors
+# SPDX-License-Identifier: GPL-3.0-or-later
+# See CONTRIBUTORS for full list of authors.
+
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def zero_copy(monkeypatch):
+    scripts_dir = Path(__file__).resolve().parents[2] / "scripts"
+    monkeypatch.syspath_prepend(str(scripts_dir))
+    import zero_copy as module
+    return module
+
+
+def test_same_filesystem_uses_a_hardlink(zero_copy, tmp_path):
+    src = tmp_path / "book.pdf"
+    src.write_bytes(b"pdf")
+    dest_dir = tmp_path / "staging"
+    dest_dir.mkdir()
+
+    assert zero_copy.place_file(src, dest_dir) == "hardlink"
+    assert os.path.samefile(src, dest_dir / "book.pdf")
+
+
+def test_existing_destination_is_replaced_not_truncated(zero_copy, tmp_path):
+    other = tmp_path / "other.epub"
+    other.write_bytes(b"keep me")
+    dst = tmp_path / "backup.epub"
+    os.link(other, dst)
+    src = tmp_path / "new.epub"
+    src.write_bytes(b"new")
+
+    zero_copy.place_file(src, dst, allow_link=False)
+
+    assert dst.read_bytes() == b"new"
+    assert other.read_bytes() == b"keep me"
+
+
+def test_cross_device_falls_back_to_a_copy(zero_copy, tmp_path, monkeypatch):
+    src = tmp_path / "book.m4b"
+    src.write_bytes(b"audio" * 1000)
+    os.utime(src, (1000, 1000))
+
+    def unsupported(*args, **kwargs):
+        raise OSError(errno.EXDEV, "cross-device")
+
+    monkeypatch.setattr(zero_copy.os, "link", unsupported)
+    monkeypatch.setattr(zero_copy, "_clone", unsupported)
+    monkeypatch.setattr(zero_copy, "_copy_range", unsupported)
+    dst = tmp_path / "copy.m4b"
+
+    assert zero_copy.place_file(src, dst) == "copy"
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mtime == 1000
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp_")]
+
+
+def test_real_io_errors_are_raised(zero_copy, tmp_path, monkeypatch):
+    src = tmp_path / "book.epub"
+    src.write_bytes(b"epub")
+
+    def failing(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "no space")
+
+    monkeypatch.setattr(zero_copy.os, "link", failing)
+    with pytest.raises(OSError):
+        zero_copy.place_file(src, tmp_path / "dst.epub")